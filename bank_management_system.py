@@ -1,10 +1,37 @@
+import bisect
+import collections
+import contextlib
+import csv
+import functools
+import heapq
+import itertools
+import json
+import math
+import mmap
+import os
+import queue
 import random
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; ColumnarAccountStore falls back to the array module.
+    np = None
 
 class BankUtility:
     """
     A utility class providing various helper methods related to banking operations.
     """
 
+    TWO_DECIMAL_COLUMN = re.compile(r"[0-9]+\.[0-9]{2}(?:\n[0-9]+\.[0-9]{2})*")
+    DIGIT_WEIGHTS = np.array([0] + [10 ** power for power in range(18)], dtype=np.int64) if np is not None else None
+
     @staticmethod
     def isNumeric(str):
         """
@@ -79,6 +106,118 @@ class BankUtility:
         """
         return int(round(dollars * 100))
 
+    @staticmethod
+    def parseCents(text):
+        """
+        Convert an amount written in dollars, such as "1234567.89", to cents using integer arithmetic only, so
+        amounts of any size convert exactly. A leading "-" or "$" and up to two decimal places are accepted.
+
+        :param text: The amount as a string.
+        :return: The amount in cents.
+        :raises ValueError: If the text is not a dollar amount with at most two decimal places.
+
+        >>> BankUtility.parseCents("1234567.89")
+        123456789
+        >>> BankUtility.parseCents("$2.5"), BankUtility.parseCents("-0.07"), BankUtility.parseCents("100")
+        (250, -7, 10000)
+        >>> BankUtility.parseCents("90071992547409.93")  # Beyond float precision
+        9007199254740993
+        >>> BankUtility.parseCents("0.004")
+        Traceback (most recent call last):
+            ...
+        ValueError: Invalid amount: '0.004'
+        """
+        amount = text.strip()
+        sign = 1
+        if amount[:1] == "-":
+            sign = -1
+            amount = amount[1:]
+        if amount[:1] == "$":
+            amount = amount[1:]
+        whole, dot, fraction = amount.partition(".")
+        if (whole.isdecimal() and whole.isascii() and len(fraction) <= 2
+                and (not fraction or fraction.isdecimal() and fraction.isascii())):
+            return sign * int(whole + fraction.ljust(2, "0"))
+        raise ValueError(f"Invalid amount: {text!r}")
+
+    @staticmethod
+    def parseCentsBatch(texts):
+        """
+        Convert a column of dollar amounts to cents, for bulk inputs such as files. Nothing is printed.
+
+        :param texts: An iterable of amount strings (see parseCents).
+        :return: A (cents, invalid) tuple: an array of the amounts in cents, with 0 for invalid entries, and a
+                 dict mapping the position of each invalid entry to its text.
+
+        >>> cents, invalid = BankUtility.parseCentsBatch(["2.57", "10", "1.234", "", "0.5"])
+        >>> list(cents), invalid
+        ([257, 1000, 0, 0, 50], {2: '1.234', 3: ''})
+        >>> cents, invalid = BankUtility.parseCentsBatch(["1.00", "2.00\\n3.00"])
+        >>> list(cents), invalid
+        ([100, 0], {1: '2.00\\n3.00'})
+        """
+        texts = list(texts)
+        if texts:
+            cents = BankUtility._parseTwoDecimalColumn("\n".join(texts))
+            if cents is not None and len(cents) == len(texts):  # An entry holding a newline splits into several.
+                return cents, {}
+        cents = array("q")
+        invalid = {}
+        for position, text in enumerate(texts):
+            try:
+                cents.append(BankUtility.parseCents(text))
+            except ValueError:
+                cents.append(0)
+                invalid[position] = text
+        return cents, invalid
+
+    @staticmethod
+    def _parseTwoDecimalColumn(column):
+        """
+        Convert a newline-separated column of amounts to cents in one pass, if every amount looks like "123.45".
+        With NumPy the digits are combined with vectorized arithmetic; otherwise the points are dropped and each
+        line goes through int().
+
+        :return: An array of the amounts in cents, or None if any amount has another form.
+        """
+        if np is None:
+            if BankUtility.TWO_DECIMAL_COLUMN.fullmatch(column):
+                return array("q", map(int, column.replace(".", "").split("\n")))
+            return None
+        data = np.frombuffer((column + "\n").encode("ascii", "replace"), dtype=np.uint8)
+        ends = np.flatnonzero(data == 10)
+        lengths = np.diff(ends, prepend=-1) - 1
+        # Each line is 1 to 16 digits, a point, then exactly two digits.
+        if lengths.min() < 4 or lengths.max() > 19 or (data[ends - 3] != 46).any():
+            return None
+        digits = np.delete(data, ends - 3)
+        ends -= np.arange(1, len(ends) + 1)
+        if ((digits < 48) | (digits > 57)).sum() != len(ends):
+            return None  # Something other than the newlines is not a digit.
+        # Weight each digit by 10 ** (its distance from the end of its line); newlines get weight 0.
+        weights = np.repeat(ends, lengths) - np.arange(len(digits))
+        values = (digits.astype(np.int64) - 48) * BankUtility.DIGIT_WEIGHTS[weights]
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        return array("q", np.add.reduceat(values, starts).astype(np.int64).tobytes())
+
+    @staticmethod
+    def promptUserForPositiveCents(prompt):
+        """
+        Prompt the user for a positive amount in dollars and cents.
+
+        :param prompt: The prompt message to display to the user.
+        :return: The amount in cents.
+        """
+        while True:
+            try:
+                cents = BankUtility.parseCents(input(prompt))
+                if cents > 0:
+                    return cents
+                else:
+                    print("Amount must be positive. Try again.")
+            except ValueError:
+                print("Invalid input, please enter an amount in dollars and cents (at most two decimal places).")
+
     @staticmethod
     def generateRandomInteger(min, max):
         """
@@ -104,6 +243,11 @@ class CoinCollector:
     A class that handles the parsing and conversion of various coin types into their respective values in cents.
     """
 
+    COIN_VALUES = {'P': 1, 'N': 5, 'D': 10, 'Q': 25, 'H': 50, 'W': 100}
+    BYTE_COIN_VALUES = {coin.encode(): value for coin, value in COIN_VALUES.items()}
+    VALID_COINS = {ord(coin): None for coin in COIN_VALUES}  # str.translate table that deletes valid coins.
+    VALID_COIN_BYTES = "".join(COIN_VALUES).encode()
+
     @staticmethod
     def parseChange(coins):
         """
@@ -141,7 +285,7 @@ class CoinCollector:
         Invalid coin: ^
         0
         """
-        coin_values = {'P': 1, 'N': 5, 'D': 10, 'Q': 25, 'H': 50, 'W': 100}
+        coin_values = CoinCollector.COIN_VALUES
         total_cents = 0
         for coin in coins.upper():
             if coin in coin_values:
@@ -150,12 +294,43 @@ class CoinCollector:
                 print(f"Invalid coin: {coin}")
         return total_cents
 
+    @staticmethod
+    def parseChangeBatch(batch):
+        """
+        Parse many coin strings at once without printing. Coins are counted per type with str.count/bytes.count
+        instead of a Python loop over characters. Raw counter feeds can be passed as bytes, e.g. feed.split(b"\\n").
+
+        :param batch: An iterable of coin strings (str or bytes), one per deposit.
+        :return: A (totals, invalidCoins) tuple: the value in cents of each entry, in order, and a dict mapping
+                 each invalid coin character to how often it appeared across the batch.
+
+        >>> CoinCollector.parseChangeBatch(["QPDNNDHW", "QQQXXXWWP", "QQQpnnDdhhww", "", "A1$%^"])
+        ([206, 276, 406, 0, 0], {'X': 3, 'A': 1, '1': 1, '$': 1, '%': 1, '^': 1})
+        >>> CoinCollector.parseChangeBatch(b"QPDNNDHW\\nqqqxw".split(b"\\n"))
+        ([206, 175], {'X': 1})
+        """
+        totals = []
+        invalidCoins = {}
+        for coins in batch:
+            if isinstance(coins, bytes):
+                coins = coins.upper()
+                totals.append(sum(coins.count(coin) * value for coin, value in CoinCollector.BYTE_COIN_VALUES.items()))
+                invalid = coins.translate(None, CoinCollector.VALID_COIN_BYTES).decode("latin-1")
+            else:
+                coins = coins.upper()
+                totals.append(sum(coins.count(coin) * value for coin, value in CoinCollector.COIN_VALUES.items()))
+                invalid = coins.translate(CoinCollector.VALID_COINS)
+            for coin in invalid:
+                invalidCoins[coin] = invalidCoins.get(coin, 0) + 1
+        return totals, invalidCoins
+
 class Account:
     """
     A class representing a bank account with functionalities to manage deposits, withdrawals, and other account-related operations.
     """
 
     ATM_WITHDRAWAL_FEE = 250  # A fixed fee in cents for ATM withdrawals.
+    bank = None  # The Bank holding this account, notified of every change. Set by Bank.addAccountToBank.
 
     def __init__(self, firstName, lastName, ssn, accountNumber=None):
         """
@@ -206,6 +381,8 @@ class Account:
         :param firstName: The new first name.
         """
         self.ownerFirstName = firstName
+        if self.bank is not None:
+            self.bank.accountEvent("setOwner", self)
 
     def getOwnerLastName(self):
         """
@@ -222,6 +399,8 @@ class Account:
         :param lastName: The new last name.
         """
         self.ownerLastName = lastName
+        if self.bank is not None:
+            self.bank.accountEvent("setOwner", self)
 
     def getSocialSecurityNumber(self):
         """
@@ -238,6 +417,8 @@ class Account:
         :param ssn: The new Social Security Number.
         """
         self.socialSecurityNumber = ssn
+        if self.bank is not None:
+            self.bank.accountEvent("setOwner", self)
 
     def getPIN(self):
         """
@@ -254,6 +435,8 @@ class Account:
         :param pin: The new PIN.
         """
         self.PIN = pin
+        if self.bank is not None:
+            self.bank.accountEvent("setPIN", self)
 
     def getBalance(self):
         """
@@ -270,12 +453,15 @@ class Account:
         :param balance: The new balance in cents.
         """
         self.balance = balance
+        if self.bank is not None:
+            self.bank.accountEvent("setBalance", self, balance)
 
-    def deposit(self, amount):
+    def deposit(self, amount, kind="deposit"):
         """
         Deposit a specified amount into the account.
 
         :param amount: The amount to deposit in cents.
+        :param kind: The kind of change reported to the bank's listeners, e.g. "transferIn" or "coinDeposit".
         :return: The new balance after the deposit in cents.
 
         >>> account = Account("John", "Doe", "999123456", accountNumber=999123456)
@@ -294,13 +480,16 @@ class Account:
             print("Deposit amount must be positive.")
             return self.balance
         self.balance += amount
+        if self.bank is not None:
+            self.bank.accountEvent(kind, self, amount)
         return self.balance
 
-    def withdraw(self, amount):
+    def withdraw(self, amount, kind="withdraw"):
         """
         Withdraw a specified amount from the account.
 
         :param amount: The amount to withdraw in cents.
+        :param kind: The kind of change reported to the bank's listeners, e.g. "transferOut".
         :return: The new balance after the withdrawal in cents.
 
         >>> account = Account("John", "Doe", "999123456", accountNumber=999123456)
@@ -322,7 +511,14 @@ class Account:
             print("Withdrawal amount must be positive.")
             return self.balance
         if self.balance >= amount:
+            if kind == "withdraw" and self.bank is not None and self.bank.velocityLimits is not None:
+                refusal = self.bank.velocityLimits.allow(self, amount)
+                if refusal is not None:
+                    print(refusal)
+                    return self.balance
             self.balance -= amount
+            if self.bank is not None:
+                self.bank.accountEvent(kind, self, amount)
             return self.balance
         else:
             print(f"Insufficient funds in account {self.accountNumber}")
@@ -343,8 +539,16 @@ class Account:
         if self.balance < total_amount:
             print(f"Insufficient funds in account {self.accountNumber}")
             return self.balance
-        
-        return self.withdraw(total_amount)
+        if self.bank is not None and self.bank.velocityLimits is not None:
+            refusal = self.bank.velocityLimits.allow(self, amount)
+            if refusal is not None:
+                print(refusal)
+                return self.balance
+
+        self.balance -= total_amount
+        if self.bank is not None:
+            self.bank.accountEvent("atmWithdraw", self, amount)
+        return self.balance
 
     def isValidPIN(self, pin):
         """
@@ -379,18 +583,570 @@ class Account:
         return (f"\nAccount Number: {self.accountNumber}\nOwner First Name: {self.ownerFirstName}\nOwner Last Name: {self.ownerLastName}\n"
                 f"Owner SSN: {masked_ssn}\nPIN: {self.PIN}\nBalance: ${self.balance / 100:.2f}")
 
+class CompactAccount:
+    """
+    A memory-compact account with the same API as Account. Attributes live in __slots__ instead of a
+    per-instance __dict__, the SSN and PIN are packed into a single integer, and owner names are interned
+    so that accounts sharing a name share one string object.
+    """
+
+    __slots__ = ("accountNumber", "ownerFirstName", "ownerLastName", "packedSSNAndPIN", "balance", "bank")
+
+    ATM_WITHDRAWAL_FEE = Account.ATM_WITHDRAWAL_FEE
+
+    def __init__(self, firstName, lastName, ssn, accountNumber=None):
+        """
+        Initialize a new compact account. Generates a random account number and PIN if not provided.
+
+        :param firstName: The first name of the account owner.
+        :param lastName: The last name of the account owner.
+        :param ssn: The 9-digit Social Security Number of the account owner.
+        :param accountNumber: Optional account number. If not provided, a random one is generated.
+
+        >>> account = CompactAccount("John", "Doe", "012345678", accountNumber=11111111)
+        >>> account.getSocialSecurityNumber()
+        '012345678'
+        >>> len(account.getPIN())
+        4
+        >>> account.setPIN("0042")
+        >>> account.isValidPIN("0042"), account.isValidPIN("42")
+        (True, False)
+        >>> account.deposit(1000)
+        1000
+        >>> account.atmWithdraw(500)
+        250
+        >>> hasattr(account, "__dict__")
+        False
+        >>> CompactAccount("John", "Roe", "999123457").getOwnerFirstName() is account.getOwnerFirstName()
+        True
+        """
+        self.accountNumber = accountNumber if accountNumber else self.generate_account_number()
+        self.ownerFirstName = sys.intern(firstName)
+        self.ownerLastName = sys.intern(lastName)
+        self.packedSSNAndPIN = int(ssn) * 10000 + random.randint(0, 9999)
+        self.balance = 0
+        self.bank = None
+
+    generate_account_number = staticmethod(Account.generate_account_number)
+    generate_pin = staticmethod(Account.generate_pin)
+
+    @property
+    def socialSecurityNumber(self):
+        """
+        The Social Security Number as a 9-digit string, unpacked from packedSSNAndPIN.
+        """
+        return f"{self.packedSSNAndPIN // 10000:09}"
+
+    @socialSecurityNumber.setter
+    def socialSecurityNumber(self, ssn):
+        self.packedSSNAndPIN = int(ssn) * 10000 + self.packedSSNAndPIN % 10000
+
+    @property
+    def PIN(self):
+        """
+        The PIN as a 4-digit string, unpacked from packedSSNAndPIN.
+        """
+        return f"{self.packedSSNAndPIN % 10000:04}"
+
+    @PIN.setter
+    def PIN(self, pin):
+        self.packedSSNAndPIN = self.packedSSNAndPIN - self.packedSSNAndPIN % 10000 + int(pin)
+
+    def setOwnerFirstName(self, firstName):
+        """
+        Set a new first name for the account owner.
+
+        :param firstName: The new first name.
+        """
+        self.ownerFirstName = sys.intern(firstName)
+        if self.bank is not None:
+            self.bank.accountEvent("setOwner", self)
+
+    def setOwnerLastName(self, lastName):
+        """
+        Set a new last name for the account owner.
+
+        :param lastName: The new last name.
+        """
+        self.ownerLastName = sys.intern(lastName)
+        if self.bank is not None:
+            self.bank.accountEvent("setOwner", self)
+
+    def isValidPIN(self, pin):
+        """
+        Compares the input PIN with the account's PIN and returns True if they match, False otherwise.
+
+        :param pin: The PIN to compare.
+        :return: True if the PIN matches, False otherwise.
+
+        >>> account = CompactAccount("John", "Doe", "999123456", accountNumber=11111111)
+        >>> account.setPIN("0042")
+        >>> account.isValidPIN("0042"), account.isValidPIN("42"), account.isValidPIN("\u0660\u0660\u0664\u0662")
+        (True, False, False)
+        """
+        return pin == "%04d" % (self.packedSSNAndPIN % 10000)
+
+    getOwnerFirstName = Account.getOwnerFirstName
+    getOwnerLastName = Account.getOwnerLastName
+    getSocialSecurityNumber = Account.getSocialSecurityNumber
+    setSocialSecurityNumber = Account.setSocialSecurityNumber
+    getPIN = Account.getPIN
+    setPIN = Account.setPIN
+    getBalance = Account.getBalance
+    setBalance = Account.setBalance
+    deposit = Account.deposit
+    withdraw = Account.withdraw
+    atmWithdraw = Account.atmWithdraw
+    __str__ = Account.__str__
+
+class AccountRegistry:
+    """
+    A class that indexes accounts by account number and tracks free storage slots so that
+    lookups, inserts and removals take constant time regardless of how many accounts are held.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty registry with no slots allocated.
+        """
+        self.slots = []        # Account storage; closed accounts leave a None hole for reuse.
+        self.index = {}        # Maps an account number to its slot in self.slots.
+        self.freeSlots = []    # Stack of slot numbers that are currently None.
+
+    def add(self, account):
+        """
+        Add an account to the registry, reusing a free slot when one is available.
+
+        :param account: The account to add.
+        :return: The slot the account was stored in, or None if the account number is already registered.
+
+        >>> registry = AccountRegistry()
+        >>> registry.add(Account("John", "Doe", "999123456", accountNumber=11111111))
+        0
+        >>> registry.add(Account("Jane", "Doe", "999123457", accountNumber=22222222))
+        1
+        >>> registry.add(Account("Jack", "Doe", "999123458", accountNumber=11111111)) is None  # Edge case: duplicate number
+        True
+        >>> len(registry)
+        2
+        """
+        accountNumber = account.accountNumber
+        if accountNumber in self.index:
+            return None
+        if self.freeSlots:
+            slot = self.freeSlots.pop()
+            self.slots[slot] = account
+        else:
+            slot = len(self.slots)
+            self.slots.append(account)
+        self.index[accountNumber] = slot
+        return slot
+
+    def remove(self, account):
+        """
+        Remove an account from the registry and release its slot for reuse.
+
+        :param account: The account to remove.
+        :return: The slot the account occupied, or None if the account is not registered.
+
+        >>> registry = AccountRegistry()
+        >>> account = Account("John", "Doe", "999123456", accountNumber=11111111)
+        >>> registry.add(account)
+        0
+        >>> registry.remove(account)
+        0
+        >>> registry.remove(account) is None  # Edge case: removing twice
+        True
+        >>> registry.add(Account("Jane", "Doe", "999123457", accountNumber=22222222))  # Reuses the freed slot
+        0
+        """
+        slot = self.index.get(account.accountNumber)
+        if slot is None or self.slots[slot] is not account:
+            return None
+        del self.index[account.accountNumber]
+        self.slots[slot] = None
+        self.freeSlots.append(slot)
+        return slot
+
+    def find(self, accountNumber):
+        """
+        Find an account by account number.
+
+        :param accountNumber: The account number to search for.
+        :return: The account if found, None otherwise.
+        """
+        slot = self.index.get(accountNumber)
+        if slot is None:
+            return None
+        return self.slots[slot]
+
+    def peekSlot(self):
+        """
+        Get the slot the next add will use.
+
+        :return: The slot number.
+        """
+        return self.freeSlots[-1] if self.freeSlots else len(self.slots)
+
+    def slotOf(self, accountNumber):
+        """
+        Get the slot that holds an account number.
+
+        :param accountNumber: The account number to search for.
+        :return: The slot number if found, None otherwise.
+        """
+        return self.index.get(accountNumber)
+
+    def __len__(self):
+        """
+        Return the number of accounts currently registered.
+        """
+        return len(self.index)
+
+    def __iter__(self):
+        """
+        Iterate over the registered accounts in slot order, skipping free slots.
+        """
+        for account in self.slots:
+            if account is not None:
+                yield account
+
+class AccountNumberAllocator:
+    """
+    A class that hands out unique 8-digit account numbers in constant time. Numbers are produced by a keyed
+    permutation of the 90,000,000-number space (a 4-round Feistel network over 28 bits, cycle-walked back into
+    range) applied to a counter, so every counter value maps to a different, unpredictable-looking number and no
+    retry loop is needed however full the space gets.
+
+    If a path is given, the key and counter survive restarts. The counter is reserved in blocks, so the state file
+    is only rewritten once per blockSize allocations; numbers reserved but not issued before a restart are skipped.
+    """
+
+    FIRST = 10000000
+    SPACE = 90000000  # 10000000 through 99999999.
+    HALF_BITS = 14
+    HALF_MASK = (1 << HALF_BITS) - 1
+    ROUNDS = 4
+
+    def __init__(self, path=None, key=None, blockSize=4096):
+        """
+        Initialize an allocator, resuming from the state file if it exists.
+
+        :param path: Optional path of the state file.
+        :param key: Optional integer key for a new allocator. If not provided, a random one is drawn.
+        :param blockSize: How many counter values to reserve per state file write.
+
+        >>> import os, tempfile
+        >>> temporary = tempfile.TemporaryDirectory()
+        >>> path = os.path.join(temporary.name, "allocator.json")
+        >>> allocator = AccountNumberAllocator(path, blockSize=10)
+        >>> issued = [allocator.allocate() for _ in range(25)]
+        >>> all(10000000 <= number <= 99999999 for number in issued), len(set(issued))
+        (True, 25)
+        >>> resumed = AccountNumberAllocator(path)  # After a restart, earlier numbers are never reissued
+        >>> len(set(issued) | {resumed.allocate() for _ in range(1000)})
+        1025
+        >>> temporary.cleanup()
+        """
+        self.path = path
+        self.blockSize = blockSize
+        self.counter = 0
+        self.reservedUpTo = 0
+        state = None
+        if path is not None and os.path.exists(path):
+            with open(path) as stateFile:
+                state = json.load(stateFile)
+        if state is not None:
+            key = state["key"]
+            self.counter = self.reservedUpTo = state["reservedUpTo"]
+        elif key is None:
+            key = random.SystemRandom().getrandbits(64)
+        self.key = key
+        self.roundKeys = [(key >> (16 * i)) & 0xFFFF for i in range(self.ROUNDS)]
+
+    def _permute(self, value):
+        """
+        Apply the Feistel network to a 28-bit value.
+        """
+        left = value >> self.HALF_BITS
+        right = value & self.HALF_MASK
+        for roundKey in self.roundKeys:
+            mixed = (right * 0x9E3779B1 + roundKey) & 0xFFFFFFFF
+            mixed ^= mixed >> 15
+            left, right = right, left ^ (mixed & self.HALF_MASK)
+        return (left << self.HALF_BITS) | right
+
+    def numberFor(self, index):
+        """
+        Map a counter value to its account number.
+
+        :param index: A counter value in [0, SPACE).
+        :return: The account number.
+        """
+        value = self._permute(index)
+        while value >= self.SPACE:  # Cycle-walk: stays a permutation of [0, SPACE).
+            value = self._permute(value)
+        return self.FIRST + value
+
+    def allocate(self):
+        """
+        Issue the next account number.
+
+        :return: An 8-digit account number that this allocator has never issued before.
+        """
+        if self.counter >= self.SPACE:
+            raise RuntimeError("Account number space exhausted.")
+        if self.counter >= self.reservedUpTo:
+            self.reservedUpTo = min(self.counter + self.blockSize, self.SPACE)
+            self._save()
+        number = self.numberFor(self.counter)
+        self.counter += 1
+        return number
+
+    def _save(self):
+        """
+        Durably record the key and the reserved counter range.
+        """
+        if self.path is None:
+            return
+        with open(self.path + ".tmp", "w") as stateFile:
+            json.dump({"key": self.key, "reservedUpTo": self.reservedUpTo}, stateFile)
+            stateFile.flush()
+            os.fsync(stateFile.fileno())
+        os.replace(self.path + ".tmp", self.path)
+
+class VelocityLimits:
+    """
+    Per-account limits on cash withdrawals over a rolling window, e.g. at most $2000 and 10 withdrawals a day.
+    Account.withdraw and Account.atmWithdraw consult them for accounts in the bank; transfers are not limited.
+
+    Each account's window is kept as a ring of buckets (24 hourly buckets for a day by default) plus running
+    totals, in one small fixed-size list, so a check is O(1) amortized and memory per account is fixed. The window slides
+    a bucket at a time, so a withdrawal stops counting between window - window / buckets and window seconds
+    after it was made.
+    """
+
+    def __init__(self, bank, maxAmount=None, maxCount=None, window=86400, buckets=24, clock=time.time):
+        """
+        Attach limits to a bank, replacing any it had.
+
+        :param bank: The bank whose accounts are limited.
+        :param maxAmount: The most that may be withdrawn per window in cents, or None for no amount limit.
+        :param maxCount: The most withdrawals per window, or None for no count limit.
+        :param window: The window length in seconds.
+        :param buckets: The number of buckets the window is split into.
+        :param clock: A callable returning the current time in seconds.
+        """
+        self.maxAmount = maxAmount
+        self.maxCount = maxCount
+        self.bucketSeconds = window / buckets
+        self.buckets = buckets
+        self.clock = clock
+        self.windows = {}  # Account number -> [current bucket, amount, count, bucket amounts..., bucket counts...].
+        self.refusals = 0  # Withdrawals refused by allow, so callers can tell a refusal from other failures.
+        self.bank = bank
+        bank.velocityLimits = self
+        bank.addListener(self)
+
+    def _window(self, accountNumber):
+        """
+        Get an account's window, slid forward to the current bucket.
+        """
+        now = int(self.clock() // self.bucketSeconds)
+        window = self.windows.get(accountNumber)
+        if window is None:
+            window = self.windows[accountNumber] = [now] + [0] * (2 + 2 * self.buckets)
+            return window
+        if now != window[0]:
+            elapsed = now - window[0]
+            if elapsed >= self.buckets:
+                window[1:] = [0] * (len(window) - 1)
+            else:
+                for bucket in range(window[0] + 1, now + 1):
+                    slot = 3 + bucket % self.buckets
+                    window[1] -= window[slot]
+                    window[2] -= window[slot + self.buckets]
+                    window[slot] = window[slot + self.buckets] = 0
+            window[0] = now
+        return window
+
+    def check(self, account, amount, count=1):
+        """
+        Check whether withdrawals would stay within the limits, without recording them.
+
+        :param account: The account.
+        :param amount: The total amount of the withdrawals in cents.
+        :param count: The number of withdrawals.
+        :return: None if they are allowed, otherwise the reason they are not.
+        """
+        return self._refusal(self._window(account.accountNumber), account, amount, count)
+
+    def _refusal(self, window, account, amount, count):
+        """
+        Get the reason withdrawals would exceed the limits given an account's window, or None if they would not.
+        """
+        if self.maxAmount is not None and window[1] + amount > self.maxAmount:
+            return f"Withdrawal amount limit reached for account {account.accountNumber}"
+        if self.maxCount is not None and window[2] + count > self.maxCount:
+            return f"Withdrawal count limit reached for account {account.accountNumber}"
+        return None
+
+    def allow(self, account, amount):
+        """
+        Check a withdrawal against the limits and record it if it is allowed.
+
+        :param account: The account.
+        :param amount: The amount in cents.
+        :return: None if the withdrawal is allowed, otherwise the reason it is not.
+
+        >>> ticks = [0]
+        >>> bank = Bank()
+        >>> limits = VelocityLimits(bank, maxAmount=60000, maxCount=3, clock=lambda: ticks[0])
+        >>> account = Account("John", "Doe", "999123456", accountNumber=11111111)
+        >>> _ = bank.addAccountToBank(account)
+        >>> account.deposit(100000)
+        100000
+        >>> account.withdraw(30000)
+        70000
+        >>> account.atmWithdraw(35000)
+        Withdrawal amount limit reached for account 11111111
+        70000
+        >>> ticks[0] = 3600 * 12
+        >>> account.withdraw(10000), account.withdraw(10000)
+        (60000, 50000)
+        >>> account.withdraw(100)
+        Withdrawal count limit reached for account 11111111
+        50000
+        >>> bank.transfer(account, Account("Jane", "Doe", "999123457", 22222222), 100)  # Transfers are not limited
+        (49900, 100)
+        >>> ticks[0] = 86400  # The first withdrawal has left the window
+        >>> account.atmWithdraw(20000)
+        29650
+        """
+        window = self._window(account.accountNumber)
+        refusal = self._refusal(window, account, amount, 1)
+        if refusal is not None:
+            self.refusals += 1
+            return refusal
+        slot = 3 + window[0] % self.buckets
+        window[1] += amount
+        window[2] += 1
+        window[slot] += amount
+        window[slot + self.buckets] += 1
+        return None
+
+    def __call__(self, kind, account, amount):
+        """
+        Forget the window of a closed account. Called by the bank for every change.
+        """
+        if kind == "close":
+            self.windows.pop(account.accountNumber, None)
+
+    def close(self):
+        """
+        Detach the limits from the bank.
+        """
+        self.bank.velocityLimits = None
+        self.bank.removeListener(self)
+
 class Bank:
     """
     A class representing a bank that can hold and manage multiple accounts.
     """
 
-    NUM_ACCOUNTS = 100  # The maximum number of accounts the bank can hold.
+    def __init__(self, registry=None):
+        """
+        Initialize a new bank.
 
-    def __init__(self):
+        :param registry: Optional storage backend for the accounts. If not provided, an in-memory AccountRegistry
+                         is used. A backend provides add(account) (returning None if the number is taken),
+                         remove(account) (returning None if the account is not stored), find(accountNumber), len()
+                         and iteration, and may provide addMany(accounts) for bulk inserts; see SQLiteAccountStore
+                         for one that persists accounts.
+        """
+        self.registry = registry if registry is not None else AccountRegistry()
+        self.listeners = []
+        self.allocator = None  # Optional AccountNumberAllocator used by newAccountNumber.
+        self.velocityLimits = None  # Optional VelocityLimits on cash withdrawals.
+
+    def newAccountNumber(self):
+        """
+        Get an account number that no account in the bank uses. Numbers come from the allocator if one is set;
+        numbers it issues that are already taken (e.g. by accounts opened before it was set) are skipped.
+        Without an allocator a random number is drawn until a free one is found.
+
+        :return: A free 8-digit account number.
+
+        >>> bank = Bank()
+        >>> bank.allocator = AccountNumberAllocator(key=42)
+        >>> taken = AccountNumberAllocator(key=42).allocate()
+        >>> bank.addAccountToBank(Account("John", "Doe", "999123456", accountNumber=taken))
+        True
+        >>> bank.newAccountNumber() != taken
+        True
+        """
+        while True:
+            number = self.allocator.allocate() if self.allocator is not None else Account.generate_account_number()
+            if self.findAccount(number) is None:
+                return number
+
+    def addListener(self, listener):
+        """
+        Register a callable to be notified of every account change in the bank.
+
+        Listeners are called as listener(kind, account, amount) after the change has been applied, where kind is
+        one of "open", "close", "deposit", "withdraw", "atmWithdraw", "transferIn", "transferOut", "coinDeposit",
+        "interest", "monthlyFee", "setPIN", "setOwner", "setBalance" or "monthlyInterest". addMonthlyInterest reports
+        an "interest" event for every account it credits, and a bulk fee sweep (ColumnarBank.applyMonthlyFee) a
+        "monthlyFee" event for every account it charges, so listeners never need to scan the bank. "monthlyInterest"
+        is only reported by AccruingBank, for a posting it has recorded but not yet applied: the account is None
+        and the amount is the annual rate.
+
+        :param listener: The callable to register.
+        """
+        self.listeners.append(listener)
+
+    def removeListener(self, listener):
+        """
+        Unregister a listener added with addListener.
+
+        :param listener: The callable to unregister.
         """
-        Initialize a new bank with an array of accounts.
+        self.listeners.remove(listener)
+
+    def accountEvent(self, kind, account, amount=None):
+        """
+        Notify the registered listeners of an account change.
+
+        :param kind: The kind of change (see addListener).
+        :param account: The account that changed, or None for bank-wide changes.
+        :param amount: The amount involved in cents, if any.
+
+        >>> bank = Bank()
+        >>> events = []
+        >>> bank.addListener(lambda kind, account, amount: events.append((kind, amount)))
+        >>> account = Account("John", "Doe", "999123456", accountNumber=11111111)
+        >>> bank.addAccountToBank(account)
+        True
+        >>> account.deposit(1000)
+        1000
+        >>> account.atmWithdraw(500)
+        250
+        >>> bank.removeAccountFromBank(account)
+        >>> account.deposit(100)  # Closed accounts are no longer reported
+        350
+        >>> events
+        [('open', None), ('deposit', 1000), ('atmWithdraw', 500), ('close', None)]
+        """
+        for listener in self.listeners:
+            listener(kind, account, amount)
+
+    @property
+    def accounts(self):
         """
-        self.accounts = [None] * Bank.NUM_ACCOUNTS
+        The accounts held by the bank, as a list. Works with any registry backend.
+        """
+        return list(self.registry)
 
     def addAccountToBank(self, account):
         """
@@ -403,22 +1159,52 @@ class Bank:
         >>> account1 = Account("John", "Doe", "999123456")
         >>> bank.addAccountToBank(account1)
         True
-        >>> account2 = Account("Jane", "Doe", "999123457")
+        >>> account2 = Account("Jane", "Doe", "999123457", accountNumber=account1.accountNumber + 1)
         >>> bank.addAccountToBank(account2)
         True
-        >>> len([acc for acc in bank.accounts if acc is not None])
-        2
-        >>> bank.addAccountToBank(account1)  # Edge case: adding the same account twice
-        True
-        >>> [acc for acc in bank.accounts if acc is not None].count(account1)  # Check if the same account is added twice
+        >>> len(bank.accounts)
         2
+        >>> bank.addAccountToBank(account1)  # doctest: +ELLIPSIS
+        Account number ... is already in use.
+        False
+        >>> bank.accounts.count(account1)  # Check the same account is held once
+        1
+        """
+        if self.registry.add(account) is None:
+            print(f"Account number {account.accountNumber} is already in use.")
+            return False
+        account.bank = self
+        self.accountEvent("open", account)
+        return True
+
+    def addAccountsToBank(self, accounts):
+        """
+        Add several accounts to the bank. A registry backend with a bulk insert (addMany, e.g. SQLiteAccountStore)
+        stores them in one go; otherwise they are added one at a time with addAccountToBank.
+
+        :param accounts: A list of the accounts to add.
+        :return: A list of the accounts that were added. Accounts whose number is already in use are skipped.
+
+        >>> bank = Bank()
+        >>> added = bank.addAccountsToBank([Account("John", "Doe", "999123456", accountNumber=11111111),
+        ...                                 Account("Jane", "Doe", "999123457", accountNumber=11111111)])
+        Account number 11111111 is already in use.
+        >>> [account.getOwnerFirstName() for account in added], len(bank)
+        (['John'], 1)
         """
-        for i in range(len(self.accounts)):
-            if self.accounts[i] is None:
-                self.accounts[i] = account
-                return True
-        print("No more accounts available.")
-        return False
+        addMany = getattr(self.registry, "addMany", None)
+        if addMany is None:
+            return [account for account in accounts if self.addAccountToBank(account)]
+        added = addMany(accounts)
+        if len(added) < len(accounts):
+            addedIds = {id(account) for account in added}
+            for account in accounts:
+                if id(account) not in addedIds:
+                    print(f"Account number {account.accountNumber} is already in use.")
+        for account in added:
+            account.bank = self
+            self.accountEvent("open", account)
+        return added
 
     def removeAccountFromBank(self, account):
         """
@@ -437,9 +1223,9 @@ class Bank:
         >>> bank.findAccount(account.accountNumber) is None
         True
         """
-        for i in range(len(self.accounts)):
-            if self.accounts[i] == account:
-                self.accounts[i] = None
+        if self.registry.remove(account) is not None:
+            account.bank = None
+            self.accountEvent("close", account)
 
     def findAccount(self, accountNumber):
         """
@@ -460,18 +1246,202 @@ class Bank:
         >>> bank.findAccount(-1) is None  # Edge case: invalid account number
         True
         """
-        for account in self.accounts:
-            if account and account.accountNumber == accountNumber:
-                return account
-        return None
+        return self.registry.find(accountNumber)
 
-    def addMonthlyInterest(self, annualInterestRate):
+    def __iter__(self):
         """
-        Add monthly interest to all accounts in the bank.
+        Iterate over the accounts held by the bank.
+        """
+        return iter(self.registry)
 
-        :param annualInterestRate: The annual interest rate as a decimal.
+    def __len__(self):
+        """
+        Return the number of accounts held by the bank.
+        """
+        return len(self.registry)
 
-        >>> bank = Bank()
+    def deposit(self, account, amount, kind="deposit"):
+        """
+        Deposit into an account held by the bank. Subclasses that serve several threads override this to lock
+        the account; callers that may share the bank should go through these methods rather than the Account.
+
+        :param account: The account to deposit into.
+        :param amount: The amount to deposit in cents.
+        :param kind: The kind of change reported to listeners (see Account.deposit).
+        :return: The new balance after the deposit in cents.
+        """
+        return account.deposit(amount, kind)
+
+    def withdraw(self, account, amount):
+        """
+        Withdraw from an account held by the bank.
+
+        :param account: The account to withdraw from.
+        :param amount: The amount to withdraw in cents.
+        :return: The new balance after the withdrawal in cents.
+        """
+        return account.withdraw(amount)
+
+    def atmWithdraw(self, account, amount):
+        """
+        Withdraw from an account held by the bank via an ATM, including the ATM fee.
+
+        :param account: The account to withdraw from.
+        :param amount: The amount to withdraw in cents.
+        :return: The new balance after the withdrawal in cents.
+        """
+        return account.atmWithdraw(amount)
+
+    def transfer(self, fromAccount, toAccount, amount):
+        """
+        Move money from one account to another.
+
+        :param fromAccount: The account to withdraw from.
+        :param toAccount: The account to deposit into.
+        :param amount: The amount to transfer in cents.
+        :return: A (fromBalance, toBalance) tuple of the new balances, or None if the withdrawal was refused.
+
+        >>> bank = Bank()
+        >>> source, target = Account("John", "Doe", "999123456", 11111111), Account("Jane", "Doe", "999123457", 22222222)
+        >>> source.deposit(1000)
+        1000
+        >>> bank.transfer(source, target, 400)
+        (600, 400)
+        >>> bank.transfer(source, target, 700) is None
+        Insufficient funds in account 11111111
+        True
+        """
+        balanceBefore = fromAccount.getBalance()
+        fromBalance = fromAccount.withdraw(amount, "transferOut")
+        if fromBalance == balanceBefore:
+            return None
+        return fromBalance, toAccount.deposit(amount, "transferIn")
+
+    def applyBatch(self, operations):
+        """
+        Validate and apply a batch of money movements with all-or-nothing semantics.
+
+        Each operation is a tuple (kind, accountNumber, amount) where kind is "deposit", "withdraw" or
+        "atmWithdraw", or ("transfer", fromAccountNumber, toAccountNumber, amount). Amounts are in cents. The whole
+        batch is validated first, in order, against running balances; if every operation is valid they are all
+        applied, otherwise none are. Nothing is printed.
+
+        :param operations: An iterable of operation tuples.
+        :return: A list with one result dict per operation: {"status": "applied" | "rejected" | "skipped",
+                 "reason": the rejection reason or None, "balance": the account's (or transfer source's) resulting
+                 balance, or None}. "skipped" marks valid operations that were not applied because another one in
+                 the batch was rejected.
+
+        >>> bank = Bank()
+        >>> for number in (11111111, 22222222):
+        ...     bank.addAccountToBank(Account("John", "Doe", "999123456", accountNumber=number))
+        True
+        True
+        >>> results = bank.applyBatch([("deposit", 11111111, 10000), ("transfer", 11111111, 22222222, 4000),
+        ...                            ("atmWithdraw", 22222222, 2000)])
+        >>> [(result["status"], result["balance"]) for result in results]
+        [('applied', 10000), ('applied', 6000), ('applied', 1750)]
+        >>> results = bank.applyBatch([("withdraw", 11111111, 6000), ("withdraw", 11111111, 1), ("deposit", 33333333, 5)])
+        >>> [(result["status"], result["reason"]) for result in results]
+        [('skipped', None), ('rejected', 'Insufficient funds'), ('rejected', 'Account not found')]
+        >>> bank.findAccount(11111111).getBalance()  # Nothing from the rejected batch was applied
+        6000
+        >>> bank.applyBatch([("deposit", 11111111, True)])[0]["reason"]  # Edge case: a bool is not an amount
+        'Amount must be a positive number of cents'
+        """
+        accounts = {}
+        balances = {}
+        cashOut = {}  # Account number -> cash withdrawn by the batch so far, for the velocity limits.
+        cashCount = {}
+        results = []
+        plan = []
+        failed = False
+
+        def resolve(accountNumber):
+            account = accounts.get(accountNumber)
+            if account is None:
+                account = self.findAccount(accountNumber)
+                if account is None:
+                    return None
+                accounts[accountNumber] = account
+                balances[accountNumber] = account.getBalance()
+            return account
+
+        for operation in operations:
+            kind = operation[0]
+            reason = None
+            balance = None
+            if kind == "transfer" and len(operation) == 4:
+                _, fromNumber, toNumber, amount = operation
+                numbers = (fromNumber, toNumber)
+                charge = amount
+            elif kind in ("deposit", "withdraw", "atmWithdraw") and len(operation) == 3:
+                _, fromNumber, amount = operation
+                numbers = (fromNumber,)
+                charge = 0 if kind == "deposit" else amount
+            else:
+                results.append({"status": "rejected", "reason": "Unknown operation", "balance": None})
+                failed = True
+                continue
+            if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+                reason = "Amount must be a positive number of cents"
+            elif any(resolve(number) is None for number in numbers):
+                reason = "Account not found"
+            else:
+                if kind == "atmWithdraw":
+                    charge += accounts[fromNumber].ATM_WITHDRAWAL_FEE
+                if balances[fromNumber] < charge:
+                    reason = "Insufficient funds"
+                elif kind in ("withdraw", "atmWithdraw") and self.velocityLimits is not None and (
+                        self.velocityLimits.check(accounts[fromNumber], cashOut.get(fromNumber, 0) + amount,
+                                                  cashCount.get(fromNumber, 0) + 1) is not None):
+                    reason = "Withdrawal limit reached"
+                else:
+                    if kind in ("withdraw", "atmWithdraw"):
+                        cashOut[fromNumber] = cashOut.get(fromNumber, 0) + amount
+                        cashCount[fromNumber] = cashCount.get(fromNumber, 0) + 1
+                    if kind == "deposit":
+                        balances[fromNumber] += amount
+                    else:
+                        balances[fromNumber] -= charge
+                    if kind == "transfer":
+                        balances[toNumber] += amount
+                    balance = balances[fromNumber]
+                    plan.append((kind, numbers, amount))
+            if reason is not None:
+                failed = True
+                results.append({"status": "rejected", "reason": reason, "balance": None})
+            else:
+                results.append({"status": "applied", "reason": None, "balance": balance})
+
+        if failed:
+            for result in results:
+                if result["status"] == "applied":
+                    result["status"] = "skipped"
+                    result["balance"] = None
+            return results
+
+        for kind, numbers, amount in plan:
+            account = accounts[numbers[0]]
+            if kind == "deposit":
+                account.deposit(amount)
+            elif kind == "withdraw":
+                account.withdraw(amount)
+            elif kind == "atmWithdraw":
+                account.atmWithdraw(amount)
+            else:
+                account.withdraw(amount, "transferOut")
+                accounts[numbers[1]].deposit(amount, "transferIn")
+        return results
+
+    def addMonthlyInterest(self, annualInterestRate):
+        """
+        Add monthly interest to all accounts in the bank.
+
+        :param annualInterestRate: The annual interest rate as a decimal.
+        :return: The total interest credited in cents.
+
+        >>> bank = Bank()
         >>> account1 = Account("John", "Doe", "999123456")
         >>> account2 = Account("Jane", "Doe", "999123457")
         >>> account1.deposit(10000)
@@ -480,30 +1450,3349 @@ class Bank:
         20000
         >>> bank.addAccountToBank(account1)
         True
-        >>> bank.addAccountToBank(account2)
+        >>> bank.addAccountToBank(account2)
+        True
+        >>> bank.addMonthlyInterest(1.25)
+        30
+        >>> account1.getBalance()
+        10010
+        >>> account2.getBalance()
+        20020
+        """
+        monthlyRate = annualInterestRate / 12 / 100
+        total = 0
+        report = bool(self.listeners)
+        for account in self.registry:
+            interest = int(account.getBalance() * monthlyRate)
+            if interest > 0:
+                account.balance += interest
+                total += interest
+                if report:
+                    self.accountEvent("interest", account, interest)
+        return total
+
+class ConcurrentBank(Bank):
+    """
+    A bank that can be shared by several threads (e.g. several ATM sessions in one process). Each account is
+    guarded by one of a fixed pool of striped locks chosen by account number, so operations on different accounts
+    rarely contend and no global lock serializes the bank. Transfers take both stripe locks in stripe order,
+    which rules out deadlocks between opposite transfers. Go through the bank's deposit, withdraw, atmWithdraw,
+    transfer and applyBatch methods; calling Account methods directly bypasses the locks.
+    """
+
+    def __init__(self, stripes=256):
+        """
+        Initialize a new concurrent bank.
+
+        :param stripes: The number of account locks. More stripes mean less contention between unrelated accounts.
+        """
+        super().__init__()
+        self.locks = [threading.Lock() for _ in range(stripes)]
+        self.registryLock = threading.Lock()
+
+    def stripeOf(self, account):
+        """
+        Get the index of the lock that guards an account.
+
+        :param account: The account.
+        :return: The stripe index.
+        """
+        return hash(account.accountNumber) % len(self.locks)
+
+    def addAccountToBank(self, account):
+        """
+        Add an account to the bank.
+
+        :param account: The account to add.
+        :return: True if the account was added, False otherwise.
+        """
+        with self.registryLock:
+            return super().addAccountToBank(account)
+
+    def removeAccountFromBank(self, account):
+        """
+        Remove an account from the bank, waiting for any operation in progress on it.
+
+        :param account: The account to remove.
+        """
+        with self.registryLock, self.locks[self.stripeOf(account)]:
+            super().removeAccountFromBank(account)
+
+    def findAccount(self, accountNumber):
+        """
+        Find an account without taking a lock. The result is checked against the requested number because a
+        concurrent close may free the slot and a concurrent open may reuse it between the index and slot reads.
+
+        :param accountNumber: The account number to search for.
+        :return: The account if found, None otherwise.
+        """
+        account = self.registry.find(accountNumber)
+        if account is None or account.accountNumber != accountNumber:
+            return None
+        return account
+
+    def deposit(self, account, amount, kind="deposit"):
+        """
+        Deposit into an account while holding its stripe lock.
+
+        :param account: The account.
+        :param amount: The amount in cents.
+        :param kind: The kind of change reported to listeners.
+        :return: The new balance in cents.
+        """
+        with self.locks[self.stripeOf(account)]:
+            return account.deposit(amount, kind)
+
+    def withdraw(self, account, amount):
+        """
+        Withdraw from an account while holding its stripe lock.
+
+        :param account: The account.
+        :param amount: The amount in cents.
+        :return: The new balance in cents.
+        """
+        with self.locks[self.stripeOf(account)]:
+            return account.withdraw(amount)
+
+    def atmWithdraw(self, account, amount):
+        """
+        Withdraw via an ATM from an account while holding its stripe lock.
+
+        :param account: The account.
+        :param amount: The amount in cents.
+        :return: The new balance in cents.
+        """
+        with self.locks[self.stripeOf(account)]:
+            return account.atmWithdraw(amount)
+
+    def transfer(self, fromAccount, toAccount, amount):
+        """
+        Move money between two accounts atomically. Both stripe locks are held for the withdrawal and the deposit,
+        always acquired lower stripe first.
+
+        :param fromAccount: The account to withdraw from.
+        :param toAccount: The account to deposit into.
+        :param amount: The amount to transfer in cents.
+        :return: A (fromBalance, toBalance) tuple of the new balances, or None if the withdrawal was refused.
+
+        >>> bank = ConcurrentBank(stripes=8)
+        >>> accounts = [Account("John", "Doe", "999123456", accountNumber=11111111 + i) for i in range(4)]
+        >>> for account in accounts:
+        ...     account.setBalance(100000)
+        ...     _ = bank.addAccountToBank(account)
+        >>> def worker(seed):
+        ...     for i in range(2000):
+        ...         bank.transfer(accounts[(seed + i) % 4], accounts[(seed + 3 * i + 1) % 4], 7)
+        >>> threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(4)]
+        >>> for thread in threads:
+        ...     thread.start()
+        >>> for thread in threads:
+        ...     thread.join()
+        >>> sum(account.getBalance() for account in accounts)  # Money is neither created nor lost
+        400000
+        """
+        first = self.stripeOf(fromAccount)
+        second = self.stripeOf(toAccount)
+        if first == second:
+            with self.locks[first]:
+                return super().transfer(fromAccount, toAccount, amount)
+        with self.locks[min(first, second)], self.locks[max(first, second)]:
+            return super().transfer(fromAccount, toAccount, amount)
+
+    def _acquireAll(self):
+        """
+        Acquire every stripe lock in stripe order.
+        """
+        for lock in self.locks:
+            lock.acquire()
+
+    def _releaseAll(self):
+        """
+        Release every stripe lock.
+        """
+        for lock in reversed(self.locks):
+            lock.release()
+
+    def applyBatch(self, operations):
+        """
+        Validate and apply a batch atomically with respect to every other operation on the bank. See
+        Bank.applyBatch.
+
+        :param operations: An iterable of operation tuples.
+        :return: A list with one result dict per operation.
+        """
+        self._acquireAll()
+        try:
+            return super().applyBatch(operations)
+        finally:
+            self._releaseAll()
+
+    def addMonthlyInterest(self, annualInterestRate):
+        """
+        Add monthly interest to all accounts while holding every stripe lock.
+
+        :param annualInterestRate: The annual interest rate as a decimal.
+        :return: The total interest credited in cents.
+        """
+        self._acquireAll()
+        try:
+            return super().addMonthlyInterest(annualInterestRate)
+        finally:
+            self._releaseAll()
+
+class AccruingBank(Bank):
+    """
+    A bank that posts monthly interest lazily. addMonthlyInterest only appends the month's rate to a bank-wide
+    posting history, which is O(1) however many accounts there are. Each account slot remembers how many postings
+    it has received, and an account catches up on the postings it missed the next time it is looked up, iterated,
+    or moved through one of the bank's methods. Catching up replays each missed posting with the same
+    int(balance * monthlyRate) truncation as the eager loop, so materialized balances match it to the cent.
+
+    Go through findAccount (or iterate the bank) to read a balance; a reference kept from before a posting does
+    not see the interest until the account is looked up again. Call settle() to bring every account up to date,
+    e.g. before producing statements.
+
+    Listeners get a "monthlyInterest" event when a posting is recorded, then an "interest" event for each account
+    as it catches up, with the interest it received.
+    """
+
+    def __init__(self):
+        """
+        Initialize a new bank with an empty posting history.
+        """
+        super().__init__()
+        self.monthlyRates = []
+        self.postingsApplied = array("l")  # Per registry slot: how many entries of monthlyRates it has received.
+
+    def _accrue(self, account):
+        """
+        Apply the postings an account has missed.
+
+        :param account: An account held by the bank.
+        :return: The account.
+        """
+        slot = self.registry.slotOf(account.accountNumber)
+        applied = self.postingsApplied[slot]
+        posted = len(self.monthlyRates)
+        if applied < posted:
+            self.postingsApplied[slot] = posted
+            balance = account.balance
+            if balance > 0:
+                for index in range(applied, posted):
+                    interest = int(balance * self.monthlyRates[index])
+                    if interest > 0:
+                        balance += interest
+                if balance != account.balance:
+                    interest = balance - account.balance
+                    account.balance = balance
+                    self.accountEvent("interest", account, interest)
+        return account
+
+    def addAccountToBank(self, account):
+        """
+        Add an account to the bank. New accounts do not receive interest posted before they were added.
+
+        :param account: The account to add.
+        :return: True if the account was added, False otherwise.
+        """
+        slot = self.registry.peekSlot()  # Set up before the "open" event, so listeners can look the account up.
+        while len(self.postingsApplied) <= slot:
+            self.postingsApplied.append(0)
+        self.postingsApplied[slot] = len(self.monthlyRates)
+        return super().addAccountToBank(account)
+
+    def removeAccountFromBank(self, account):
+        """
+        Bring an account up to date, then remove it from the bank.
+
+        :param account: The account to remove.
+        """
+        if self.registry.find(account.accountNumber) is account:
+            self._accrue(account)
+        super().removeAccountFromBank(account)
+
+    def findAccount(self, accountNumber):
+        """
+        Find an account and bring its balance up to date.
+
+        :param accountNumber: The account number to search for.
+        :return: The account if found, None otherwise.
+        """
+        account = self.registry.find(accountNumber)
+        return self._accrue(account) if account is not None else None
+
+    def __iter__(self):
+        """
+        Iterate over the accounts, bringing each up to date as it is reached.
+        """
+        for account in self.registry:
+            yield self._accrue(account)
+
+    def deposit(self, account, amount, kind="deposit"):
+        """
+        Bring an account up to date, then deposit into it. See Bank.deposit.
+        """
+        return super().deposit(self._accrue(account), amount, kind)
+
+    def withdraw(self, account, amount):
+        """
+        Bring an account up to date, then withdraw from it. See Bank.withdraw.
+        """
+        return super().withdraw(self._accrue(account), amount)
+
+    def atmWithdraw(self, account, amount):
+        """
+        Bring an account up to date, then withdraw from it via an ATM. See Bank.atmWithdraw.
+        """
+        return super().atmWithdraw(self._accrue(account), amount)
+
+    def transfer(self, fromAccount, toAccount, amount):
+        """
+        Bring both accounts up to date, then transfer between them. See Bank.transfer.
+        """
+        self._accrue(toAccount)
+        return super().transfer(self._accrue(fromAccount), toAccount, amount)
+
+    def applyBatch(self, operations):
+        """
+        Bring every account named in a batch up to date, then apply the batch. See Bank.applyBatch.
+        """
+        operations = list(operations)
+        for operation in operations:
+            for accountNumber in operation[1:-1]:  # Every field between the kind and the amount is an account.
+                self.findAccount(accountNumber)
+        return super().applyBatch(operations)
+
+    def addMonthlyInterest(self, annualInterestRate):
+        """
+        Post a month of interest in O(1). Balances are updated as accounts are next touched.
+
+        :param annualInterestRate: The annual interest rate as a decimal.
+        :return: None, since the interest is not known until accounts are materialized.
+
+        >>> eager, lazy = Bank(), AccruingBank()
+        >>> for number, cents in ((11111111, 10000), (22222222, 123457), (33333333, 99)):
+        ...     for bank in (eager, lazy):
+        ...         account = Account("John", "Doe", "999123456", accountNumber=number)
+        ...         account.setBalance(cents)
+        ...         _ = bank.addAccountToBank(account)
+        >>> for rate in (1.25, 2.75, 12, 0.5):
+        ...     _ = eager.addMonthlyInterest(rate)
+        ...     lazy.addMonthlyInterest(rate)
+        >>> lazy.findAccount(22222222).withdraw(57)
+        125101
+        >>> eager.findAccount(22222222).withdraw(57)
+        125101
+        >>> [account.getBalance() for account in lazy] == [account.getBalance() for account in eager]
+        True
+        """
+        self.monthlyRates.append(annualInterestRate / 12 / 100)
+        self.accountEvent("monthlyInterest", None, annualInterestRate)
+
+    def settle(self):
+        """
+        Bring every account up to date.
+        """
+        for account in self.registry:
+            self._accrue(account)
+
+class ColumnarAccountStore:
+    """
+    A class that keeps account numbers, PINs and balances in contiguous int64/int16 columns indexed by
+    registry slot, so bank-wide operations run as single vectorized passes. NumPy is used when it is
+    installed; otherwise the columns fall back to the standard array module and plain loops.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty store.
+        """
+        self.size = 0  # One past the highest slot ever loaded.
+        if np is not None:
+            self.accountNumbers = np.zeros(0, dtype=np.int64)
+            self.balances = np.zeros(0, dtype=np.int64)
+            self.pins = np.zeros(0, dtype=np.int16)
+            self.live = np.zeros(0, dtype=np.bool_)
+        else:
+            self.accountNumbers = array("q")
+            self.balances = array("q")
+            self.pins = array("h")
+            self.live = array("b")
+        self.firstNames = []
+        self.lastNames = []
+        self.ssns = []
+
+    def _grow(self, slot):
+        """
+        Make sure the columns have room for the given slot.
+
+        :param slot: The slot that is about to be written.
+        """
+        while slot >= len(self.firstNames):
+            self.firstNames.append(None)
+            self.lastNames.append(None)
+            self.ssns.append(None)
+        if np is not None:
+            if slot >= len(self.balances):
+                capacity = max(16, 2 * len(self.balances), slot + 1)
+                for name in ("accountNumbers", "balances", "pins", "live"):
+                    column = getattr(self, name)
+                    grown = np.zeros(capacity, dtype=column.dtype)
+                    grown[:len(column)] = column
+                    setattr(self, name, grown)
+        else:
+            while slot >= len(self.balances):
+                self.accountNumbers.append(0)
+                self.balances.append(0)
+                self.pins.append(0)
+                self.live.append(0)
+        self.size = max(self.size, slot + 1)
+
+    def load(self, slot, account):
+        """
+        Copy an account's fields into the given slot.
+
+        :param slot: The slot to write.
+        :param account: The account to copy.
+        """
+        self._grow(slot)
+        self.accountNumbers[slot] = account.accountNumber
+        self.balances[slot] = account.getBalance()
+        self.pins[slot] = int(account.getPIN())
+        self.live[slot] = 1
+        self.firstNames[slot] = account.getOwnerFirstName()
+        self.lastNames[slot] = account.getOwnerLastName()
+        self.ssns[slot] = account.getSocialSecurityNumber()
+
+    def clear(self, slot):
+        """
+        Wipe a slot so that it no longer contributes to bank-wide operations.
+
+        :param slot: The slot to clear.
+        """
+        self.accountNumbers[slot] = 0
+        self.balances[slot] = 0
+        self.pins[slot] = 0
+        self.live[slot] = 0
+        self.firstNames[slot] = self.lastNames[slot] = self.ssns[slot] = None
+
+    def addMonthlyInterest(self, monthlyRate):
+        """
+        Credit interest to every slot, truncating each posting to the cent like int(balance * monthlyRate).
+
+        :param monthlyRate: The monthly interest rate as a fraction (e.g. 0.001).
+        :return: The total interest credited in cents.
+        """
+        if np is not None:
+            balances = self.balances[:self.size]
+            interest = (balances * monthlyRate).astype(np.int64)
+            interest[interest < 0] = 0  # Account.deposit ignores non-positive amounts.
+            balances += interest
+            return int(interest.sum())
+        total = 0
+        balances = self.balances
+        for slot in range(self.size):
+            interest = int(balances[slot] * monthlyRate)
+            if interest > 0:
+                balances[slot] += interest
+                total += interest
+        return total
+
+    def applyFee(self, fee, waiveAtBalance):
+        """
+        Charge a flat fee to every open account whose balance is below a waiver threshold. Accounts that
+        cannot cover the fee are skipped, just as Account.withdraw refuses to overdraw.
+
+        :param fee: The fee in cents.
+        :param waiveAtBalance: Accounts holding at least this many cents are not charged.
+        :return: The total fees collected in cents.
+        """
+        if fee <= 0:
+            return 0
+        if np is not None:
+            balances = self.balances[:self.size]
+            charged = self.live[:self.size] & (balances < waiveAtBalance) & (balances >= fee)
+            balances[charged] -= fee
+            return int(charged.sum()) * fee
+        total = 0
+        balances = self.balances
+        for slot in range(self.size):
+            if self.live[slot] and fee <= balances[slot] < waiveAtBalance:
+                balances[slot] -= fee
+                total += fee
+        return total
+
+    def totalBalance(self):
+        """
+        Sum the balances of every open account.
+
+        :return: The total balance in cents.
+        """
+        if np is not None:
+            return int(self.balances[:self.size].sum())
+        return sum(self.balances[:self.size])
+
+    def balanceRange(self):
+        """
+        Find the smallest and largest balance over the open accounts.
+
+        :return: A (minimum, maximum) tuple in cents, or None if no account is open.
+        """
+        if np is not None:
+            balances = self.balances[:self.size][self.live[:self.size]]
+            if len(balances) == 0:
+                return None
+            return int(balances.min()), int(balances.max())
+        balances = [self.balances[slot] for slot in range(self.size) if self.live[slot]]
+        if not balances:
+            return None
+        return min(balances), max(balances)
+
+def _storeColumn(column):
+    """
+    Build a property that reads and writes one store column at the account's slot.
+    """
+    def getter(self):
+        value = getattr(self.store, column)[self.slot]
+        return value if isinstance(value, str) or value is None else int(value)
+
+    def setter(self, value):
+        getattr(self.store, column)[self.slot] = value
+
+    return property(getter, setter)
+
+class ColumnarAccount(Account):
+    """
+    An account whose fields live in a ColumnarAccountStore slot instead of on the object itself.
+    All Account operations work unchanged on top of the column-backed attributes.
+    """
+
+    accountNumber = _storeColumn("accountNumbers")
+    balance = _storeColumn("balances")
+    ownerFirstName = _storeColumn("firstNames")
+    ownerLastName = _storeColumn("lastNames")
+    socialSecurityNumber = _storeColumn("ssns")
+
+    def __init__(self, store, slot):
+        """
+        Initialize a view over a store slot.
+
+        :param store: The ColumnarAccountStore holding the account data.
+        :param slot: The slot of the account in the store.
+        """
+        self.store = store
+        self.slot = slot
+
+    @property
+    def PIN(self):
+        """
+        The 4-digit PIN, stored in the store as an integer.
+        """
+        return f"{int(self.store.pins[self.slot]):04}"
+
+    @PIN.setter
+    def PIN(self, pin):
+        self.store.pins[self.slot] = int(pin)
+
+class ColumnarBank(Bank):
+    """
+    A bank that keeps account data in a ColumnarAccountStore. Accounts added to the bank are copied into
+    the store, and findAccount returns a ColumnarAccount view, so month-end interest, fee sweeps and balance
+    aggregates run over contiguous columns instead of one Account object at a time.
+    """
+
+    def __init__(self):
+        """
+        Initialize a new columnar bank with an empty store.
+        """
+        super().__init__()
+        self.store = ColumnarAccountStore()
+
+    def addAccountToBank(self, account):
+        """
+        Copy an account into the store and register a view over it.
+
+        :param account: The account to add.
+        :return: True if the account was added, False otherwise.
+
+        >>> bank = ColumnarBank()
+        >>> account = Account("John", "Doe", "999123456", accountNumber=11111111)
+        >>> account.deposit(10000)
+        10000
+        >>> bank.addAccountToBank(account)
+        True
+        >>> view = bank.findAccount(11111111)
+        >>> view.getBalance(), view.getOwnerFirstName(), view.isValidPIN(account.getPIN())
+        (10000, 'John', True)
+        >>> view.withdraw(2500)
+        7500
+        >>> bank.addAccountToBank(account)  # Edge case: duplicate account number
+        Account number 11111111 is already in use.
+        False
+        """
+        if self.registry.slotOf(account.accountNumber) is not None:
+            print(f"Account number {account.accountNumber} is already in use.")
+            return False
+        slot = self.registry.peekSlot()
+        self.store.load(slot, account)
+        view = ColumnarAccount(self.store, slot)
+        self.registry.add(view)
+        view.bank = self
+        self.accountEvent("open", view)
+        return True
+
+    def removeAccountFromBank(self, account):
+        """
+        Remove an account from the bank and clear its store slot.
+
+        :param account: The account (or view) to remove.
+
+        >>> bank = ColumnarBank()
+        >>> bank.addAccountToBank(Account("John", "Doe", "999123456", accountNumber=11111111))
+        True
+        >>> bank.removeAccountFromBank(bank.findAccount(11111111))
+        >>> bank.findAccount(11111111) is None
+        True
+        >>> bank.store.totalBalance()
+        0
+        """
+        view = self.registry.find(account.accountNumber)
+        if view is None:
+            return
+        self.registry.remove(view)
+        view.bank = None
+        self.accountEvent("close", view)
+        self.store.clear(view.slot)
+
+    def addMonthlyInterest(self, annualInterestRate):
+        """
+        Add monthly interest to all accounts in one pass over the balance column.
+
+        :param annualInterestRate: The annual interest rate as a decimal.
+        :return: The total interest credited in cents.
+
+        >>> bank = ColumnarBank()
+        >>> for number, cents in ((11111111, 10000), (22222222, 20000), (33333333, 0)):
+        ...     account = Account("John", "Doe", "999123456", accountNumber=number)
+        ...     account.setBalance(cents)
+        ...     bank.addAccountToBank(account)
+        True
+        True
+        True
+        >>> bank.addMonthlyInterest(1.25)
+        30
+        >>> bank.findAccount(11111111).getBalance(), bank.findAccount(22222222).getBalance()
+        (10010, 20020)
+        """
+        return self._bulkPosting("interest", lambda: self.store.addMonthlyInterest(annualInterestRate / 12 / 100))
+
+    def applyMonthlyFee(self, fee, waiveAtBalance):
+        """
+        Charge a maintenance fee to every account below a minimum balance.
+
+        :param fee: The fee in cents.
+        :param waiveAtBalance: Accounts holding at least this many cents are not charged.
+        :return: The total fees collected in cents.
+
+        >>> bank = ColumnarBank()
+        >>> for number, cents in ((11111111, 100), (22222222, 5000), (33333333, 500000)):
+        ...     account = Account("John", "Doe", "999123456", accountNumber=number)
+        ...     account.setBalance(cents)
+        ...     bank.addAccountToBank(account)
+        True
+        True
+        True
+        >>> aggregates, ledger = BankAggregates(bank), TransactionLedger(bank)
+        >>> bank.applyMonthlyFee(500, 100000)  # Only the middle account is charged
+        500
+        >>> bank.store.totalBalance(), bank.store.balanceRange(), aggregates.summary()["monthlyFees"]
+        (504600, (100, 500000), 500)
+        >>> [(row["kind"], row["amount"], row["balance"]) for row in ledger.statement(22222222)]
+        [('open', 5000, 5000), ('monthlyFee', -500, 4500)]
+        """
+        return self._bulkPosting("monthlyFee", lambda: self.store.applyFee(fee, waiveAtBalance))
+
+    def _bulkPosting(self, kind, post):
+        """
+        Run a bulk posting over the store, then report every account whose balance it changed to the listeners,
+        with the amount moved. Without listeners the posting runs alone.
+
+        :param kind: The kind of event to report for each account.
+        :param post: A callable that applies the posting to the store and returns its total.
+        :return: What post returned.
+        """
+        if not self.listeners:
+            return post()
+        size = self.store.size
+        before = self.store.balances[:size].copy() if np is not None else self.store.balances[:size]
+        total = post()
+        after = self.store.balances[:size]
+        if np is not None:
+            slots = np.flatnonzero(after != before).tolist()
+        else:
+            slots = [slot for slot in range(size) if after[slot] != before[slot]]
+        for slot in slots:
+            self.accountEvent(kind, self.registry.slots[slot], abs(int(after[slot]) - int(before[slot])))
+        return total
+
+class AccountFile:
+    """
+    A fixed-width binary account file that is opened with mmap, so a book of any size is ready in milliseconds
+    and balances are read and updated in place without building an Account object per record.
+
+    The file starts with a 32-byte header (magic, version, record size, record count, names offset), followed by
+    one 32-byte little-endian record per account sorted by account number, followed by a blob of UTF-8 owner
+    names. Each record holds the account number, balance, packed SSN, PIN, an open flag and the offset and
+    lengths of the owner's first and last name in the blob.
+    """
+
+    MAGIC = b"BANKACT1"
+    VERSION = 1
+    HEADER = struct.Struct("<8sIIQQ")
+    RECORD = struct.Struct("<qqIHBxIHH")
+    BALANCE = struct.Struct("<q")
+    BALANCE_OFFSET = 8
+    OPEN = 1
+
+    def __init__(self, path):
+        """
+        Map an existing account file into memory for reading and in-place updates.
+
+        :param path: The path of the account file.
+        """
+        self.path = path
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, version, recordSize, self.count, self.namesOffset = self.HEADER.unpack_from(self.map, 0)
+        if magic != self.MAGIC or version != self.VERSION or recordSize != self.RECORD.size:
+            raise ValueError(f"{path} is not a version {self.VERSION} account file.")
+        self.records = None
+        if np is not None:
+            self.records = np.frombuffer(self.map, dtype=AccountFile.recordDtype(), count=self.count,
+                                         offset=self.HEADER.size)
+        self.renamed = {}  # Record index -> (first name, last name) changed since the file was written.
+
+    @staticmethod
+    def recordDtype():
+        """
+        Get the NumPy structured dtype that matches RECORD.
+        """
+        return np.dtype([("accountNumber", "<i8"), ("balance", "<i8"), ("ssn", "<u4"), ("pin", "<u2"),
+                         ("flags", "u1"), ("pad", "u1"), ("nameOffset", "<u4"), ("firstNameLength", "<u2"),
+                         ("lastNameLength", "<u2")])
+
+    @classmethod
+    def write(cls, bank, path):
+        """
+        Write every account of a bank to an account file.
+
+        :param bank: The bank to convert.
+        :param path: The path of the account file to create. An existing file is replaced.
+        :return: The number of accounts written.
+        """
+        accounts = sorted(bank, key=lambda account: account.accountNumber)
+        names = bytearray()
+        namesOffset = cls.HEADER.size + len(accounts) * cls.RECORD.size
+        with open(path + ".tmp", "wb", buffering=1 << 20) as accountFile:
+            accountFile.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, cls.RECORD.size, len(accounts), namesOffset))
+            for account in accounts:
+                firstName = account.getOwnerFirstName().encode()
+                lastName = account.getOwnerLastName().encode()
+                accountFile.write(cls.RECORD.pack(account.accountNumber, account.getBalance(),
+                                                  int(account.getSocialSecurityNumber()), int(account.getPIN()),
+                                                  cls.OPEN, len(names), len(firstName), len(lastName)))
+                names += firstName
+                names += lastName
+            accountFile.write(names)
+            accountFile.flush()
+            os.fsync(accountFile.fileno())  # The new file must be on disk before it replaces the old one.
+        os.replace(path + ".tmp", path)
+        return len(accounts)
+
+    @classmethod
+    def read(cls, path, bank=None):
+        """
+        Load every open account of an account file into a bank as ordinary Account objects.
+
+        :param path: The path of the account file.
+        :param bank: Optional bank to load into. If not provided, a new Bank is created.
+        :return: The bank.
+
+        >>> import os, tempfile
+        >>> temporary = tempfile.TemporaryDirectory()
+        >>> path = os.path.join(temporary.name, "accounts.bin")
+        >>> bank = Bank()
+        >>> account = Account("Jöhn", "Doe", "012345678", accountNumber=11111111)
+        >>> account.deposit(12345)
+        12345
+        >>> bank.addAccountToBank(account)
+        True
+        >>> AccountFile.write(bank, path)
+        1
+        >>> copy = AccountFile.read(path).findAccount(11111111)
+        >>> copy.getOwnerFirstName(), copy.getSocialSecurityNumber(), copy.getBalance(), copy.getPIN() == account.getPIN()
+        ('Jöhn', '012345678', 12345, True)
+        >>> temporary.cleanup()
+        """
+        bank = bank if bank is not None else Bank()
+        accountFile = cls(path)
+        try:
+            for index in range(accountFile.count):
+                if accountFile.isOpen(index):
+                    account = Account(accountFile.firstName(index), accountFile.lastName(index),
+                                      accountFile.ssn(index), accountNumber=accountFile.accountNumber(index))
+                    account.PIN = accountFile.pin(index)
+                    account.balance = accountFile.balance(index)
+                    bank.addAccountToBank(account)
+        finally:
+            accountFile.close()
+        return bank
+
+    def _offset(self, index):
+        """
+        Get the byte offset of a record.
+        """
+        return self.HEADER.size + index * self.RECORD.size
+
+    def find(self, accountNumber):
+        """
+        Find the record of an account number with a binary search over the sorted records.
+
+        :param accountNumber: The account number to search for.
+        :return: The record index if found, None otherwise.
+        """
+        if self.records is not None:
+            index = int(np.searchsorted(self.records["accountNumber"], accountNumber))
+            if index < self.count and self.records["accountNumber"][index] == accountNumber:
+                return index
+            return None
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.accountNumber(middle) < accountNumber:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.accountNumber(low) == accountNumber:
+            return low
+        return None
+
+    def accountNumber(self, index):
+        """
+        Get the account number of a record.
+        """
+        return self.BALANCE.unpack_from(self.map, self._offset(index))[0]
+
+    def balance(self, index):
+        """
+        Get the balance of a record in cents.
+        """
+        return self.BALANCE.unpack_from(self.map, self._offset(index) + self.BALANCE_OFFSET)[0]
+
+    def setBalance(self, index, balance):
+        """
+        Set the balance of a record in place.
+        """
+        self.BALANCE.pack_into(self.map, self._offset(index) + self.BALANCE_OFFSET, balance)
+
+    def ssn(self, index):
+        """
+        Get the SSN of a record as a 9-digit string.
+        """
+        return f"{self.RECORD.unpack_from(self.map, self._offset(index))[2]:09}"
+
+    def pin(self, index):
+        """
+        Get the PIN of a record as a 4-digit string.
+        """
+        return f"{self.RECORD.unpack_from(self.map, self._offset(index))[3]:04}"
+
+    def isOpen(self, index):
+        """
+        Check whether a record belongs to an open account.
+        """
+        return self.RECORD.unpack_from(self.map, self._offset(index))[4] == self.OPEN
+
+    def firstName(self, index):
+        """
+        Get the owner's first name of a record.
+        """
+        if index in self.renamed:
+            return self.renamed[index][0]
+        nameOffset, firstLength = self.RECORD.unpack_from(self.map, self._offset(index))[5:7]
+        start = self.namesOffset + nameOffset
+        return self.map[start:start + firstLength].decode()
+
+    def lastName(self, index):
+        """
+        Get the owner's last name of a record.
+        """
+        if index in self.renamed:
+            return self.renamed[index][1]
+        nameOffset, firstLength, lastLength = self.RECORD.unpack_from(self.map, self._offset(index))[5:8]
+        start = self.namesOffset + nameOffset + firstLength
+        return self.map[start:start + lastLength].decode()
+
+    def rename(self, index, firstName=None, lastName=None):
+        """
+        Change the owner's name of a record. Names live in a packed blob that cannot grow in place, so changed
+        names are kept in memory until the file is written again with AccountFile.write (MappedBank.close does).
+
+        :param index: The record index.
+        :param firstName: Optional new first name.
+        :param lastName: Optional new last name.
+        """
+        self.renamed[index] = (firstName if firstName is not None else self.firstName(index),
+                               lastName if lastName is not None else self.lastName(index))
+
+    def updateRecord(self, index, ssn=None, pin=None, isOpen=None):
+        """
+        Update the fixed-width fields of a record in place.
+
+        :param index: The record index.
+        :param ssn: Optional new SSN.
+        :param pin: Optional new PIN.
+        :param isOpen: Optional new open flag.
+        """
+        fields = list(self.RECORD.unpack_from(self.map, self._offset(index)))
+        if ssn is not None:
+            fields[2] = int(ssn)
+        if pin is not None:
+            fields[3] = int(pin)
+        if isOpen is not None:
+            fields[4] = self.OPEN if isOpen else 0
+        self.RECORD.pack_into(self.map, self._offset(index), *fields)
+
+    def addMonthlyInterest(self, monthlyRate):
+        """
+        Credit interest to every open record in place, truncating each posting to the cent.
+
+        :param monthlyRate: The monthly interest rate as a fraction.
+        :return: The total interest credited in cents.
+        """
+        if self.records is not None:
+            balances = self.records["balance"]
+            interest = (balances * monthlyRate).astype(np.int64)
+            interest[(interest < 0) | (self.records["flags"] != self.OPEN)] = 0
+            balances += interest
+            return int(interest.sum())
+        total = 0
+        for index in range(self.count):
+            if self.isOpen(index):
+                interest = int(self.balance(index) * monthlyRate)
+                if interest > 0:
+                    self.setBalance(index, self.balance(index) + interest)
+                    total += interest
+        return total
+
+    def flush(self):
+        """
+        Write in-place updates back to the file.
+        """
+        self.map.flush()
+
+    def close(self):
+        """
+        Flush and unmap the file.
+        """
+        self.records = None  # Release the NumPy view so the map can be closed.
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+def _mappedField(getter, setter=None):
+    """
+    Build a property that reads (and optionally writes) one field of the account's record in the mapped file.
+    """
+    def read(self):
+        return getter(self.accountFile, self.index)
+
+    def write(self, value):
+        setter(self.accountFile, self.index, value)
+
+    return property(read, write if setter else None)
+
+class MappedAccount(Account):
+    """
+    An account backed by a record of a memory-mapped AccountFile. Balance, PIN and SSN changes are written to the
+    file in place. Owner names are stored in a packed blob, so name changes are held by the AccountFile until the
+    bank is closed and the file rewritten.
+    """
+
+    accountNumber = _mappedField(AccountFile.accountNumber)
+    balance = _mappedField(AccountFile.balance, AccountFile.setBalance)
+    PIN = _mappedField(AccountFile.pin, lambda accountFile, index, pin: accountFile.updateRecord(index, pin=pin))
+    socialSecurityNumber = _mappedField(AccountFile.ssn, lambda accountFile, index, ssn: accountFile.updateRecord(index, ssn=ssn))
+    ownerFirstName = _mappedField(AccountFile.firstName, lambda accountFile, index, name: accountFile.rename(index, firstName=name))
+    ownerLastName = _mappedField(AccountFile.lastName, lambda accountFile, index, name: accountFile.rename(index, lastName=name))
+
+    def __init__(self, accountFile, index):
+        """
+        Initialize a view over a record.
+
+        :param accountFile: The mapped AccountFile.
+        :param index: The record index.
+        """
+        self.accountFile = accountFile
+        self.index = index
+
+class MappedBank(Bank):
+    """
+    A bank whose existing accounts live in a memory-mapped AccountFile. Opening the bank maps the file without
+    reading it, lookups binary-search the sorted records, and balance changes are written in place. Accounts
+    opened after the file was written are held in the ordinary registry; write the bank back out with
+    AccountFile.write to fold them into the file.
+    """
+
+    def __init__(self, path):
+        """
+        Open a bank over an account file.
+
+        :param path: The path of the account file.
+
+        >>> import os, tempfile
+        >>> temporary = tempfile.TemporaryDirectory()
+        >>> path = os.path.join(temporary.name, "accounts.bin")
+        >>> bank = Bank()
+        >>> for number in (33333333, 11111111, 22222222):
+        ...     account = Account("John", "Doe", "999123456", accountNumber=number)
+        ...     account.setBalance(10000)
+        ...     bank.addAccountToBank(account)
+        True
+        True
+        True
+        >>> AccountFile.write(bank, path)
+        3
+        >>> mapped = MappedBank(path)
+        >>> mapped.findAccount(22222222).withdraw(2500)
+        7500
+        >>> mapped.addMonthlyInterest(12)
+        275
+        >>> mapped.removeAccountFromBank(mapped.findAccount(33333333))
+        >>> mapped.addAccountToBank(Account("Jane", "Roe", "999123457", accountNumber=44444444))
+        True
+        >>> mapped.findAccount(11111111).setOwnerLastName("Smith")
+        >>> mapped.close()
+        >>> reopened = MappedBank(path)
+        >>> reopened.findAccount(22222222).getBalance(), reopened.findAccount(33333333), len(reopened)
+        (7575, None, 3)
+        >>> reopened.findAccount(11111111).getOwnerLastName()
+        'Smith'
+        >>> reopened.close()
+        >>> temporary.cleanup()
+        """
+        super().__init__()
+        self.accountFile = AccountFile(path)
+
+    def _view(self, index):
+        """
+        Build a MappedAccount for an open record, attached to this bank.
+        """
+        account = MappedAccount(self.accountFile, index)
+        account.bank = self
+        return account
+
+    def findAccount(self, accountNumber):
+        """
+        Find an account in the mapped file or among the accounts opened since.
+
+        :param accountNumber: The account number to search for.
+        :return: The account if found, None otherwise.
+        """
+        account = self.registry.find(accountNumber)
+        if account is not None:
+            return account
+        index = self.accountFile.find(accountNumber)
+        if index is None or not self.accountFile.isOpen(index):
+            return None
+        return self._view(index)
+
+    def addAccountToBank(self, account):
+        """
+        Add a new account to the bank. Account numbers already open in the mapped file are rejected.
+
+        :param account: The account to add.
+        :return: True if the account was added, False otherwise.
+        """
+        index = self.accountFile.find(account.accountNumber)
+        if index is not None and self.accountFile.isOpen(index):
+            print(f"Account number {account.accountNumber} is already in use.")
+            return False
+        return super().addAccountToBank(account)
+
+    def removeAccountFromBank(self, account):
+        """
+        Remove an account from the bank. Mapped accounts are marked closed in the file.
+
+        :param account: The account to remove.
+        """
+        if isinstance(account, MappedAccount):
+            if account.accountFile is self.accountFile and self.accountFile.isOpen(account.index):
+                self.accountFile.updateRecord(account.index, isOpen=False)
+                account.bank = None
+                self.accountEvent("close", account)
+            return
+        super().removeAccountFromBank(account)
+
+    def addMonthlyInterest(self, annualInterestRate):
+        """
+        Add monthly interest to the mapped accounts in place and to the accounts opened since.
+
+        :param annualInterestRate: The annual interest rate as a decimal.
+        :return: The total interest credited in cents.
+        """
+        accountFile = self.accountFile
+        if not self.listeners:
+            total = accountFile.addMonthlyInterest(annualInterestRate / 12 / 100)
+        else:
+            before = [accountFile.balance(index) for index in range(accountFile.count)]
+            total = accountFile.addMonthlyInterest(annualInterestRate / 12 / 100)
+            for index, balance in enumerate(before):
+                interest = accountFile.balance(index) - balance
+                if interest:
+                    self.accountEvent("interest", self._view(index), interest)
+        return total + super().addMonthlyInterest(annualInterestRate)
+
+    def __iter__(self):
+        """
+        Iterate over the open mapped accounts, then the accounts opened since.
+        """
+        for index in range(self.accountFile.count):
+            if self.accountFile.isOpen(index):
+                yield self._view(index)
+        yield from self.registry
+
+    def __len__(self):
+        """
+        Return the number of open accounts.
+        """
+        return sum(1 for index in range(self.accountFile.count) if self.accountFile.isOpen(index)) + len(self.registry)
+
+    def close(self):
+        """
+        Fold accounts opened and owner names changed since the file was written into it, then unmap it.
+        """
+        if len(self.registry) or self.accountFile.renamed:
+            AccountFile.write(self, self.accountFile.path)  # Replaces the file; the old mapping stays valid until closed.
+        self.accountFile.close()
+
+class SQLiteAccountStore:
+    """
+    A storage backend that keeps a bank's accounts in a SQLite database, for books larger than memory. It has the
+    same interface as AccountRegistry (add, remove, find, len and iteration) and is also a bank listener that
+    writes account changes through to the database.
+
+    The database runs in WAL mode, so readers never block the writer. Lookups that miss the cache use a pool of
+    reader connections; every statement is a fixed SQL string, so sqlite3 reuses its prepared statement. Recently
+    used accounts stay in an LRU cache of live Account objects. Changes to them are collected and written in
+    batches of batchSize with executemany, in one transaction. A cached account is written before it is evicted.
+
+    Changes still in the batch are lost on a crash; call flush() when they must be durable. As with AccruingBank,
+    look accounts up through the bank rather than keeping references: an account evicted from the cache is read
+    back as a new object.
+    """
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS accounts (number INTEGER PRIMARY KEY, firstName TEXT NOT NULL, "
+              "lastName TEXT NOT NULL, ssn TEXT NOT NULL, pin TEXT NOT NULL, balance INTEGER NOT NULL)")
+    SELECT = "SELECT number, firstName, lastName, ssn, pin, balance FROM accounts"
+    UPSERT = "INSERT OR REPLACE INTO accounts VALUES (?, ?, ?, ?, ?, ?)"
+    UPDATE_BALANCE = "UPDATE accounts SET balance = ? WHERE number = ?"
+
+    def __init__(self, path, cacheSize=100000, readers=4, batchSize=1000, accountClass=Account):
+        """
+        Open or create an account database.
+
+        :param path: The database file.
+        :param cacheSize: The number of accounts kept in memory.
+        :param readers: The number of reader connections in the pool.
+        :param batchSize: The number of pending changes that triggers a write.
+        :param accountClass: The class used for accounts read from the database (Account or CompactAccount).
+        """
+        self.path = path
+        self.cacheSize = cacheSize
+        self.batchSize = batchSize
+        self.accountClass = accountClass
+        self.bank = None  # Set by SQLiteBank; accounts read from the database are attached to it.
+        self.lock = threading.RLock()
+        self.writer = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.writer.execute("PRAGMA journal_mode=WAL")
+        self.writer.execute("PRAGMA synchronous=NORMAL")
+        self.writer.execute(self.SCHEMA)
+        self.readers = queue.Queue()
+        for _ in range(readers):
+            reader = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            self.readers.put(reader)
+        self.cache = collections.OrderedDict()  # Account number -> Account, least recently used first.
+        self.pendingRows = {}  # Account number -> account whose whole row must be written.
+        self.pendingBalances = {}  # Account number -> account whose balance must be written.
+
+    @contextlib.contextmanager
+    def _reader(self):
+        """
+        Borrow a reader connection from the pool.
+        """
+        reader = self.readers.get()
+        try:
+            yield reader
+        finally:
+            self.readers.put(reader)
+
+    def _load(self, row):
+        """
+        Build an account from a database row.
+        """
+        number, firstName, lastName, ssn, pin, balance = row
+        account = self.accountClass(firstName, lastName, ssn, accountNumber=number)
+        account.PIN = pin
+        account.balance = balance
+        account.bank = self.bank
+        return account
+
+    def _cache(self, account):
+        """
+        Put an account in the cache, evicting the least recently used one if it is full. The caller must hold
+        self.lock.
+        """
+        self.cache[account.accountNumber] = account
+        if len(self.cache) > self.cacheSize:
+            number, _ = self.cache.popitem(last=False)
+            if number in self.pendingRows or number in self.pendingBalances:
+                self.flush()
+
+    def flush(self):
+        """
+        Write every pending change to the database in one transaction.
+        """
+        with self.lock:
+            if not self.pendingRows and not self.pendingBalances:
+                return
+            rows = [(account.accountNumber, account.getOwnerFirstName(), account.getOwnerLastName(),
+                     account.getSocialSecurityNumber(), account.getPIN(), account.getBalance())
+                    for account in self.pendingRows.values()]
+            balances = [(account.getBalance(), number) for number, account in self.pendingBalances.items()
+                        if number not in self.pendingRows]
+            self.writer.execute("BEGIN")
+            try:
+                self.writer.executemany(self.UPSERT, rows)
+                self.writer.executemany(self.UPDATE_BALANCE, balances)
+                self.writer.execute("COMMIT")
+            except BaseException:
+                self.writer.execute("ROLLBACK")  # Keep the changes pending, and the connection usable.
+                raise
+            self.pendingRows.clear()
+            self.pendingBalances.clear()
+
+    def _pending(self, table, account):
+        """
+        Queue a change, writing the batch once it is full.
+        """
+        with self.lock:
+            table[account.accountNumber] = account
+            if len(self.pendingRows) + len(self.pendingBalances) >= self.batchSize:
+                self.flush()
+
+    def add(self, account):
+        """
+        Add an account.
+
+        :param account: The account to add.
+        :return: The account number, or None if the number is already in use.
+        """
+        if self.find(account.accountNumber) is not None:
+            return None
+        with self.lock:
+            self._cache(account)
+            self._pending(self.pendingRows, account)
+        return account.accountNumber
+
+    def addMany(self, accounts):
+        """
+        Add several accounts in one transaction with executemany, without caching them.
+
+        :param accounts: A list of the accounts to add.
+        :return: A list of the accounts that were added. Accounts whose number is already in use are skipped.
+        """
+        with self.lock:
+            self.flush()
+            writer = self.writer
+            writer.execute("BEGIN")
+            try:
+                seen = set()
+                added = []
+                for account in accounts:
+                    number = account.accountNumber
+                    if number in seen or writer.execute(self.SELECT + " WHERE number = ?", (number,)).fetchone():
+                        continue
+                    seen.add(number)
+                    added.append(account)
+                writer.executemany(self.UPSERT, [(account.accountNumber, account.getOwnerFirstName(),
+                                                  account.getOwnerLastName(), account.getSocialSecurityNumber(),
+                                                  account.getPIN(), account.getBalance()) for account in added])
+                writer.execute("COMMIT")
+            except BaseException:
+                writer.execute("ROLLBACK")
+                raise
+        return added
+
+    def remove(self, account):
+        """
+        Remove an account.
+
+        :param account: The account to remove.
+        :return: The account number, or None if the account is not stored.
+        """
+        number = account.accountNumber
+        if self.find(number) is None:
+            return None
+        with self.lock:
+            self.flush()
+            self.cache.pop(number, None)
+            self.writer.execute("DELETE FROM accounts WHERE number = ?", (number,))
+        return number
+
+    def find(self, accountNumber):
+        """
+        Find an account by number, from the cache or the database.
+
+        :param accountNumber: The account number.
+        :return: The account, or None if there is none with that number.
+        """
+        with self.lock:
+            account = self.cache.get(accountNumber)
+            if account is not None:
+                self.cache.move_to_end(accountNumber)
+                return account
+        with self._reader() as reader:
+            row = reader.execute(self.SELECT + " WHERE number = ?", (accountNumber,)).fetchone()
+        if row is None:
+            return None
+        with self.lock:
+            account = self.cache.get(accountNumber)  # Another thread may have loaded it meanwhile.
+            if account is None:
+                account = self._load(row)
+                self._cache(account)
+            return account
+
+    def __len__(self):
+        """
+        Return the number of accounts stored.
+        """
+        self.flush()
+        with self._reader() as reader:
+            return reader.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+
+    def __iter__(self):
+        """
+        Iterate over the accounts in account-number order. Cached accounts are returned as they are; the others are
+        read without being cached, so a full scan does not flush the cache.
+        """
+        self.flush()
+        with self._reader() as reader:
+            for row in reader.execute(self.SELECT + " ORDER BY number"):
+                with self.lock:  # Other threads may be loading or evicting accounts.
+                    account = self.cache.get(row[0])
+                yield account if account is not None else self._load(row)
+
+    def __call__(self, kind, account, amount):
+        """
+        Queue an account change to be written. Called by the bank for every change.
+
+        :param kind: The kind of change.
+        :param account: The account that changed, or None for bank-wide changes.
+        :param amount: The amount involved in cents, if any.
+        """
+        if account is None or kind in ("open", "close"):
+            return  # Opening and closing are written by add and remove.
+        if kind in ("setPIN", "setOwner"):
+            self._pending(self.pendingRows, account)
+        else:
+            self._pending(self.pendingBalances, account)
+
+    def close(self):
+        """
+        Write pending changes and close the database.
+        """
+        self.flush()
+        self.writer.close()
+        while not self.readers.empty():
+            self.readers.get().close()
+
+class SQLiteBank(Bank):
+    """
+    A bank whose accounts are stored in a SQLite database through a SQLiteAccountStore, so the book can be larger
+    than memory while frequently used accounts are served from the cache.
+    """
+
+    def __init__(self, path, **options):
+        """
+        Open a bank over an account database, creating it if needed.
+
+        :param path: The database file.
+        :param options: Cache, reader pool and batch options passed to SQLiteAccountStore.
+
+        >>> import os, tempfile
+        >>> temporary = tempfile.TemporaryDirectory()
+        >>> path = os.path.join(temporary.name, "accounts.db")
+        >>> bank = SQLiteBank(path, cacheSize=2)
+        >>> for number in (11111111, 22222222, 33333333):
+        ...     _ = bank.addAccountToBank(Account("John", "Doe", "999123456", accountNumber=number))
+        >>> bank.addAccountToBank(Account("Jane", "Doe", "999123457", accountNumber=11111111))
+        Account number 11111111 is already in use.
+        False
+        >>> bank.findAccount(11111111).deposit(10000)  # Evicted from the cache, read back from the database
+        10000
+        >>> bank.transfer(bank.findAccount(11111111), bank.findAccount(22222222), 4000)
+        (6000, 4000)
+        >>> bank.addMonthlyInterest(12)
+        100
+        >>> bank.findAccount(33333333).setPIN("4321")
+        >>> bank.removeAccountFromBank(bank.findAccount(22222222))
+        >>> [account.accountNumber for account in bank.accounts]
+        [11111111, 33333333]
+        >>> bank.close()
+        >>> reopened = SQLiteBank(path)
+        >>> [(account.accountNumber, account.getBalance()) for account in reopened], reopened.findAccount(33333333).getPIN()
+        ([(11111111, 6060), (33333333, 0)], '4321')
+        >>> reopened.close()
+        >>> temporary.cleanup()
+        """
+        super().__init__(SQLiteAccountStore(path, **options))
+        self.registry.bank = self
+        self.addListener(self.registry)
+
+    def addMonthlyInterest(self, annualInterestRate):
+        """
+        Add monthly interest to all accounts with two SQL statements instead of loading every account. Cached
+        accounts are credited in memory with the same truncation, so they stay in step with the database. Only
+        when listeners other than the store are attached are the credited accounts read back to report them.
+
+        :param annualInterestRate: The annual interest rate as a decimal.
+        :return: The total interest credited in cents.
+        """
+        monthlyRate = annualInterestRate / 12 / 100
+        store = self.registry
+        listeners = [listener for listener in self.listeners if listener is not store]  # The store writes it here.
+        credited = ()
+        with store.lock:
+            store.flush()
+            writer = store.writer
+            writer.execute("BEGIN")
+            try:
+                total = writer.execute("SELECT TOTAL(CAST(balance * ? AS INTEGER)) FROM accounts WHERE balance > 0",
+                                       (monthlyRate,)).fetchone()[0]
+                if listeners:
+                    credited = writer.execute(store.SELECT + " WHERE CAST(balance * ? AS INTEGER) > 0 ORDER BY number",
+                                              (monthlyRate,)).fetchall()
+                writer.execute("UPDATE accounts SET balance = balance + CAST(balance * ? AS INTEGER) WHERE balance > 0",
+                               (monthlyRate,))
+                writer.execute("COMMIT")
+            except BaseException:
+                writer.execute("ROLLBACK")
+                raise
+            for account in store.cache.values():
+                interest = int(account.balance * monthlyRate)
+                if interest > 0:
+                    account.balance += interest
+            reported = []
+            for row in credited:
+                interest = int(row[-1] * monthlyRate)
+                account = store.cache.get(row[0])
+                if account is None:
+                    account = store._load(row)
+                    account.balance += interest  # The row was read before the update.
+                reported.append((account, interest))
+        for account, interest in reported:
+            for listener in listeners:
+                listener("interest", account, interest)
+        return int(total)
+
+    def close(self):
+        """
+        Write pending changes and close the database.
+        """
+        self.registry.close()
+
+class BankJournal:
+    """
+    A write-ahead journal that makes a Bank durable. Every account change reported by the bank is appended to a
+    journal file as one JSON line. Records are fsynced in groups (every groupCommitRecords records or
+    groupCommitMillis milliseconds, whichever comes first), so a burst of transactions shares one fsync. A compact
+    snapshot of all accounts is written every snapshotEveryRecords records, after which the journal is truncated,
+    so recovery only replays the records written since the last snapshot.
+
+    Records that have not been synced yet are lost on a crash; call sync() when a change must be durable before
+    the caller continues.
+
+    For a ConcurrentBank, automatic snapshots are taken by the background flusher thread while every bank lock is
+    held, so no change is half applied when the snapshot is written and no writer thread pays for it. Other banks
+    are used from one thread, so they take the snapshot inline, unless the journal is opened with
+    inlineCommit=False: the caller then copies the accounts with captureSnapshot when snapshotDue() says so, and
+    can write the copy with writeSnapshot in another thread.
+    """
+
+    JOURNAL_FILE = "journal.log"
+    SNAPSHOT_FILE = "snapshot.jsonl"
+
+    def __init__(self, bank, directory, groupCommitRecords=128, groupCommitMillis=5, snapshotEveryRecords=100000, lsn=0,
+                 inlineCommit=True):
+        """
+        Attach a journal to a bank. Use BankJournal.open to recover a bank from an existing directory first.
+
+        :param bank: The bank to journal.
+        :param directory: The directory holding the journal and snapshot files.
+        :param groupCommitRecords: Sync after this many pending records.
+        :param groupCommitMillis: Sync pending records at least this often, in milliseconds.
+        :param snapshotEveryRecords: Write a snapshot after this many records. 0 disables automatic snapshots.
+        :param lsn: The sequence number of the last record already in the directory.
+        :param inlineCommit: Sync a full group, and take automatic snapshots, in the writer that fills them. Pass
+                             False when the caller does both itself (see commitDue and snapshotDue), e.g. from an
+                             executor so an event loop never waits on fsync; the flusher thread still syncs every
+                             groupCommitMillis.
+        """
+        self.bank = bank
+        self.directory = directory
+        self.groupCommitRecords = groupCommitRecords
+        self.groupCommitMillis = groupCommitMillis
+        self.snapshotEveryRecords = snapshotEveryRecords
+        self.lsn = lsn
+        self.recordsSinceSnapshot = 0
+        self.pending = 0
+        self.inlineCommit = inlineCommit
+        self.lock = threading.Lock()
+        self.syncLock = threading.Lock()  # Held across a sync's fsync, which runs outside self.lock.
+        self.snapshotInBackground = isinstance(bank, ConcurrentBank)
+        self.snapshotting = False
+        os.makedirs(directory, exist_ok=True)
+        self.file = open(os.path.join(directory, self.JOURNAL_FILE), "a", buffering=1 << 20)
+        self.closed = threading.Event()
+        self.flusher = threading.Thread(target=self._flushPeriodically, name="BankJournal flusher", daemon=True)
+        self.flusher.start()
+        bank.addListener(self)
+
+    @classmethod
+    def open(cls, directory, bank=None, **options):
+        """
+        Recover a bank from a journal directory and attach a journal to it.
+
+        :param directory: The directory holding the journal and snapshot files. It is created if missing.
+        :param bank: Optional empty bank to recover into (e.g. a ColumnarBank). If not provided, a new Bank is created.
+        :param options: Group commit and snapshot options passed to the constructor.
+        :return: A (bank, journal) tuple.
+
+        >>> import tempfile
+        >>> temporary = tempfile.TemporaryDirectory()
+        >>> directory = temporary.name
+        >>> bank, journal = BankJournal.open(directory)
+        >>> account = Account("John", "Doe", "999123456", accountNumber=11111111)
+        >>> bank.addAccountToBank(account)
+        True
+        >>> account.deposit(10000)
+        10000
+        >>> account.atmWithdraw(500)
+        9250
+        >>> bank.addMonthlyInterest(12)
+        92
+        >>> account.setPIN("4321")
+        >>> journal.close()
+        >>> recovered, journal = BankJournal.open(directory)
+        >>> recovered.findAccount(11111111).getBalance(), recovered.findAccount(11111111).getPIN()
+        (9342, '4321')
+        >>> journal.snapshot()
+        >>> recovered.removeAccountFromBank(recovered.findAccount(11111111))
+        >>> journal.close()
+        >>> recovered, journal = BankJournal.open(directory)
+        >>> recovered.findAccount(11111111) is None
+        True
+        >>> journal.close()
+        >>> temporary.cleanup()
+        """
+        bank = bank if bank is not None else Bank()
+        lsn = cls.recover(directory, bank)
+        return bank, cls(bank, directory, lsn=lsn, **options)
+
+    @classmethod
+    def recover(cls, directory, bank):
+        """
+        Load the latest snapshot into a bank and replay the journal records written after it. A torn record at the
+        end of the journal (from a crash mid-write) is discarded.
+
+        :param directory: The directory holding the journal and snapshot files.
+        :param bank: The empty bank to recover into. It must have no listeners attached yet.
+        :return: The sequence number of the last record recovered.
+
+        >>> import tempfile
+        >>> temporary = tempfile.TemporaryDirectory()
+        >>> directory = temporary.name
+        >>> with open(os.path.join(directory, BankJournal.JOURNAL_FILE), "w") as journal:
+        ...     _ = journal.write('{"op":"close","account":11111111,"lsn":1}\\n')
+        >>> BankJournal.recover(directory, Bank())  # Records for accounts that are not there are skipped
+        1
+        >>> temporary.cleanup()
+        """
+        lsn = 0
+        snapshotPath = os.path.join(directory, cls.SNAPSHOT_FILE)
+        if os.path.exists(snapshotPath):
+            with open(snapshotPath) as snapshot:
+                lsn = json.loads(snapshot.readline())["lsn"]
+                for line in snapshot:
+                    number, firstName, lastName, ssn, pin, balance = json.loads(line)
+                    cls._restoreAccount(bank, number, firstName, lastName, ssn, pin, balance)
+        journalPath = os.path.join(directory, cls.JOURNAL_FILE)
+        if os.path.exists(journalPath):
+            with open(journalPath, "r+b") as journal:
+                offset = 0
+                for line in journal:
+                    try:
+                        record = json.loads(line) if line.endswith(b"\n") else None
+                    except ValueError:
+                        record = None
+                    if record is None:
+                        journal.truncate(offset)  # Drop the torn record so new records start on a clean line.
+                        break
+                    offset += len(line)
+                    if record["lsn"] > lsn:
+                        cls._replay(bank, record)
+                        lsn = record["lsn"]
+        return lsn
+
+    @staticmethod
+    def _restoreAccount(bank, number, firstName, lastName, ssn, pin, balance):
+        """
+        Add an account with the given fields to a bank that is being recovered.
+        """
+        account = Account(firstName, lastName, ssn, accountNumber=number)
+        account.PIN = pin
+        account.balance = balance
+        bank.addAccountToBank(account)
+
+    @classmethod
+    def _replay(cls, bank, record):
+        """
+        Apply one journal record to a bank that is being recovered. Records that do not fit the bank (an account
+        opened twice, or a change to an account that is not there) are skipped.
+        """
+        op = record["op"]
+        if op == "monthlyInterest":
+            bank.addMonthlyInterest(record["rate"])
+            return
+        account = bank.findAccount(record["account"])
+        if op == "open":
+            if account is None:
+                cls._restoreAccount(bank, record["account"], record["firstName"], record["lastName"], record["ssn"],
+                                    record["pin"], record["balance"])
+            return
+        if account is None:
+            return
+        if op == "close":
+            bank.removeAccountFromBank(account)
+        elif op == "setPIN":
+            account.PIN = record["pin"]
+        elif op == "setOwner":
+            account.ownerFirstName = record["firstName"]
+            account.ownerLastName = record["lastName"]
+            account.socialSecurityNumber = record["ssn"]
+        else:
+            account.balance = record["balance"]
+
+    def __call__(self, kind, account, amount):
+        """
+        Append a record for an account change. Called by the bank for every change.
+
+        :param kind: The kind of change.
+        :param account: The account that changed, or None for bank-wide changes.
+        :param amount: The amount involved in cents, if any.
+        """
+        if kind == "monthlyInterest":
+            record = {"op": kind, "rate": amount}
+        elif kind in ("open", "setOwner"):
+            record = {"op": kind, "account": account.accountNumber, "firstName": account.getOwnerFirstName(),
+                      "lastName": account.getOwnerLastName(), "ssn": account.getSocialSecurityNumber(),
+                      "pin": account.getPIN(), "balance": account.getBalance()}
+        elif kind == "setPIN":
+            record = {"op": kind, "account": account.accountNumber, "pin": account.getPIN()}
+        elif kind == "close":
+            record = {"op": kind, "account": account.accountNumber}
+        else:
+            record = {"op": kind, "account": account.accountNumber, "amount": amount, "balance": account.getBalance()}
+        with self.lock:
+            self.lsn += 1
+            record["lsn"] = self.lsn
+            self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.pending += 1
+            self.recordsSinceSnapshot += 1
+            if self.inlineCommit and self.pending >= self.groupCommitRecords:
+                self._sync()
+        if self.inlineCommit and not self.snapshotInBackground and self._snapshotDue():
+            self.snapshot()
+
+    def _snapshotDue(self):
+        """
+        Check whether enough records have been written for an automatic snapshot.
+        """
+        return (self.snapshotEveryRecords and self.recordsSinceSnapshot >= self.snapshotEveryRecords
+                and not self.snapshotting)
+
+    def _sync(self):
+        """
+        Flush and fsync the pending records. The caller must hold self.lock.
+        """
+        if self.pending:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+
+    def _flushPeriodically(self):
+        """
+        Sync pending records every groupCommitMillis until the journal is closed, and take the automatic
+        snapshots of a ConcurrentBank.
+        """
+        while not self.closed.wait(self.groupCommitMillis / 1000):
+            self.sync()
+            if self.snapshotInBackground and self._snapshotDue():
+                self.snapshot()
+
+    def commitDue(self):
+        """
+        Check whether a full group of records is waiting to be synced.
+
+        :return: True if sync() should be called.
+        """
+        return self.pending >= self.groupCommitRecords
+
+    def sync(self):
+        """
+        Make every record appended so far durable. Writers can go on appending records while the fsync runs.
+        """
+        with self.syncLock:
+            with self.lock:
+                if not self.pending or self.file.closed:
+                    return
+                self.file.flush()
+                self.pending = 0
+            os.fsync(self.file.fileno())
+
+    def snapshotDue(self):
+        """
+        Check whether an automatic snapshot is waiting for the caller to take (see inlineCommit).
+
+        :return: True if captureSnapshot() and writeSnapshot() should be called.
+        """
+        return not self.inlineCommit and not self.snapshotInBackground and bool(self._snapshotDue())
+
+    @staticmethod
+    def _snapshotRow(account):
+        """
+        Get the fields a snapshot keeps for an account.
+        """
+        return [account.accountNumber, account.getOwnerFirstName(), account.getOwnerLastName(),
+                account.getSocialSecurityNumber(), account.getPIN(), account.getBalance()]
+
+    def _writeSnapshotFile(self, lsn, rows):
+        """
+        Write a snapshot file of account rows and rename it into place.
+        """
+        path = os.path.join(self.directory, self.SNAPSHOT_FILE)
+        with open(path + ".tmp", "w", buffering=1 << 20) as snapshot:
+            snapshot.write(json.dumps({"lsn": lsn}) + "\n")
+            for row in rows:
+                snapshot.write(json.dumps(row, separators=(",", ":")) + "\n")
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(path + ".tmp", path)
+
+    def captureSnapshot(self):
+        """
+        Copy the fields of every account for writeSnapshot. Call it from the thread that changes the bank; only
+        the copy is made here, so encoding and writing the snapshot can run in another thread.
+
+        :return: The capture to pass to writeSnapshot.
+        """
+        self.snapshotting = True  # No other automatic snapshot is started until writeSnapshot finishes.
+        try:
+            settle = getattr(self.bank, "settle", None)
+            if settle is not None:
+                settle()  # As in snapshot(), so the copy covers the interest records this writes.
+            with self.lock:
+                self.file.flush()
+                return self.lsn, self.file.tell(), [self._snapshotRow(account) for account in self.bank]
+        except BaseException:
+            self.snapshotting = False
+            raise
+
+    def writeSnapshot(self, capture):
+        """
+        Write a snapshot from captureSnapshot, then drop the journal records it covers. Records appended since the
+        capture are kept, so the bank may go on changing while this runs. Do not call snapshot() meanwhile.
+
+        :param capture: The value returned by captureSnapshot.
+
+        >>> import tempfile
+        >>> temporary = tempfile.TemporaryDirectory()
+        >>> bank, journal = BankJournal.open(temporary.name, inlineCommit=False, snapshotEveryRecords=2)
+        >>> account = Account("John", "Doe", "999123456", accountNumber=11111111)
+        >>> bank.addAccountToBank(account)
+        True
+        >>> account.deposit(1000)
+        1000
+        >>> journal.snapshotDue()
+        True
+        >>> capture = journal.captureSnapshot()
+        >>> account.deposit(500)  # A change made while the snapshot is written
+        1500
+        >>> journal.writeSnapshot(capture)
+        >>> journal.snapshotDue(), journal.recordsSinceSnapshot
+        (False, 1)
+        >>> journal.close()
+        >>> recovered, journal = BankJournal.open(temporary.name)
+        >>> recovered.findAccount(11111111).getBalance()
+        1500
+        >>> journal.close()
+        >>> temporary.cleanup()
+        """
+        lsn, offset, rows = capture
+        try:
+            self._writeSnapshotFile(lsn, rows)
+            journalPath = os.path.join(self.directory, self.JOURNAL_FILE)
+            with self.syncLock, self.lock:
+                if self.file.closed:
+                    return
+                self.file.flush()
+                with open(journalPath, "rb") as journal:
+                    journal.seek(offset)
+                    tail = journal.read()
+                with open(journalPath + ".tmp", "wb") as journal:
+                    journal.write(tail)
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                self.file.close()
+                os.replace(journalPath + ".tmp", journalPath)
+                self.file = open(journalPath, "a", buffering=1 << 20)
+                self.pending = 0
+                self.recordsSinceSnapshot = self.lsn - lsn
+        finally:
+            self.snapshotting = False
+
+    def snapshot(self):
+        """
+        Write a snapshot of every account, then truncate the journal. The snapshot is written to a temporary file
+        and renamed into place, so a crash leaves either the old or the new snapshot. Records already covered by a
+        snapshot are skipped on recovery, so a crash before the journal is truncated is also safe.
+
+        On a ConcurrentBank every bank lock is held while the snapshot is written, so it matches its sequence
+        number exactly. Do not call it from a thread that holds one of them.
+
+        >>> import tempfile
+        >>> temporary = tempfile.TemporaryDirectory()
+        >>> directory = temporary.name
+        >>> bank, journal = BankJournal.open(directory, ConcurrentBank(), snapshotEveryRecords=50, groupCommitMillis=1)
+        >>> accounts = [Account("John", "Doe", "999123456", accountNumber=11111111 + i) for i in range(4)]
+        >>> for account in accounts:
+        ...     _ = bank.addAccountToBank(account)
+        >>> def work(account):
+        ...     for _ in range(200):
+        ...         _ = bank.deposit(account, 3)
+        >>> threads = [threading.Thread(target=work, args=(account,)) for account in accounts]
+        >>> for thread in threads:
+        ...     thread.start()
+        >>> for thread in threads:
+        ...     thread.join()
+        >>> journal.close()
+        >>> recovered, journal = BankJournal.open(directory)
+        >>> [account.getBalance() for account in recovered]
+        [600, 600, 600, 600]
+        >>> journal.close()
+        >>> temporary.cleanup()
+        """
+        settle = getattr(self.bank, "settle", None)
+        if settle is not None:
+            # Catch an AccruingBank's accounts up first: the interest events this records are covered by the
+            # snapshot, and nothing is left to catch up while the journal lock is held below.
+            self.snapshotting = True
+            try:
+                settle()
+            finally:
+                self.snapshotting = False
+        locked = isinstance(self.bank, ConcurrentBank)
+        if locked:
+            self.bank.registryLock.acquire()
+            self.bank._acquireAll()
+        try:
+            with self.lock:
+                self._sync()
+                self._writeSnapshotFile(self.lsn, (self._snapshotRow(account) for account in self.bank))
+                self.file.truncate(0)
+                self.recordsSinceSnapshot = 0
+        finally:
+            if locked:
+                self.bank._releaseAll()
+                self.bank.registryLock.release()
+
+    def close(self):
+        """
+        Sync the journal, stop the background flusher and detach from the bank.
+        """
+        self.bank.removeListener(self)
+        self.closed.set()
+        self.flusher.join()
+        with self.syncLock, self.lock:
+            self._sync()
+            self.file.close()
+
+class TransactionLedger:
+    """
+    An append-only ledger of every money movement in a Bank: deposits, withdrawals, ATM withdrawals and their
+    fees, monthly fees, transfer legs, coin deposits, interest postings and balance adjustments. It attaches to the bank as a
+    listener.
+
+    Rows are stored column-wise in typed arrays (33 bytes per row): time in microseconds, account number, kind,
+    signed amount and the account's balance after the row. Rows are appended in time order, so the time column
+    is its own index and a time range is found by binary search. Each account also keeps an array of its row
+    numbers, so a statement for one account over a time range costs a binary search plus one step per row it
+    returns, however many rows the ledger holds.
+
+    A balance that changed without an account event (e.g. a direct write to Account.balance) is found by
+    comparing it with the ledger's running balance when the account next changes, and recorded as an
+    "adjustment" row.
+
+    Rows are appended under a lock, so the ledger can record a ConcurrentBank changed from many threads.
+    """
+
+    KINDS = ("open", "deposit", "withdraw", "atmWithdraw", "atmFee", "monthlyFee", "transferIn", "transferOut",
+             "coinDeposit", "interest", "adjustment")
+    CREDITS = ("deposit", "transferIn", "coinDeposit", "interest")
+    DEBITS = ("withdraw", "atmWithdraw", "transferOut", "monthlyFee")
+
+    def __init__(self, bank, clock=time.time):
+        """
+        Attach a ledger to a bank. Accounts already in the bank get an "open" row with their current balance.
+
+        :param bank: The bank to record.
+        :param clock: A callable returning the current time in seconds since the epoch.
+        """
+        self.bank = bank
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.times = array("q")
+        self.accountNumbers = array("q")
+        self.kinds = array("B")
+        self.amounts = array("q")
+        self.balances = array("q")
+        self.accountRows = {}  # Account number -> array of the account's row numbers.
+        self.runningBalances = {}  # Account number -> balance after its latest row, for open accounts.
+        self.kindCodes = {kind: code for code, kind in enumerate(self.KINDS)}
+        for account in bank:
+            self._append(account.accountNumber, "open", account.getBalance(), account.getBalance())
+        bank.addListener(self)
+
+    def __len__(self):
+        """
+        Return the number of rows in the ledger.
+        """
+        return len(self.times)
+
+    def _append(self, accountNumber, kind, amount, balance):
+        """
+        Append one row, keeping the time column in order even if the clock steps back.
+        """
+        now = int(self.clock() * 1000000)
+        if self.times and now < self.times[-1]:
+            now = self.times[-1]
+        rows = self.accountRows.get(accountNumber)
+        if rows is None:
+            rows = self.accountRows[accountNumber] = array("q")
+        rows.append(len(self.times))
+        self.times.append(now)
+        self.accountNumbers.append(accountNumber)
+        self.kinds.append(self.kindCodes[kind])
+        self.amounts.append(amount)
+        self.balances.append(balance)
+        self.runningBalances[accountNumber] = balance
+
+    def _reconcile(self, accountNumber, balance):
+        """
+        Record any difference between an account's balance before a change and the ledger's running balance as an
+        adjustment made without an event.
+        """
+        difference = balance - self.runningBalances.get(accountNumber, balance)
+        if difference:
+            self._append(accountNumber, "adjustment", difference, balance)
+
+    def __call__(self, kind, account, amount):
+        """
+        Record an account change. Called by the bank for every change.
+
+        :param kind: The kind of change.
+        :param account: The account that changed, or None for bank-wide changes.
+        :param amount: The amount involved in cents, if any.
+
+        >>> bank = ConcurrentBank()
+        >>> ledger = TransactionLedger(bank)
+        >>> accounts = [Account("John", "Doe", "999123456", accountNumber=11111111 + i) for i in range(8)]
+        >>> for account in accounts:
+        ...     _ = bank.addAccountToBank(account)
+        >>> def work(account):
+        ...     for _ in range(500):
+        ...         _ = bank.deposit(account, 3)
+        >>> threads = [threading.Thread(target=work, args=(account,)) for account in accounts]
+        >>> for thread in threads:
+        ...     thread.start()
+        >>> for thread in threads:
+        ...     thread.join()
+        >>> len(ledger), {row["balance"] for row in ledger.statement(11111111)} == set(range(0, 1501, 3))
+        (4008, True)
+        >>> all(row["kind"] != "adjustment" for row in ledger.rows())
+        True
+        """
+        if kind not in self.kindCodes and kind not in ("close", "setBalance"):
+            return  # PIN and owner changes and pending postings ("monthlyInterest") move no money.
+        number = account.accountNumber
+        with self.lock:
+            balance = account.getBalance()
+            if kind == "open":
+                self._append(number, kind, balance, balance)
+            elif kind == "close":
+                self.runningBalances.pop(number, None)
+            elif kind == "setBalance":
+                self._append(number, "adjustment", balance - self.runningBalances.get(number, 0), balance)
+            elif kind == "atmWithdraw":
+                fee = account.ATM_WITHDRAWAL_FEE
+                self._reconcile(number, balance + amount + fee)
+                self._append(number, kind, -amount, balance + fee)
+                self._append(number, "atmFee", -fee, balance)
+            elif kind in self.DEBITS:
+                self._reconcile(number, balance + amount)
+                self._append(number, kind, -amount, balance)
+            else:
+                self._reconcile(number, balance - amount)
+                self._append(number, kind, amount, balance)
+
+    def rows(self, start=None, end=None):
+        """
+        Stream the rows of every account in a time range, oldest first.
+
+        :param start: The start of the range in seconds since the epoch (inclusive), or None for the beginning.
+        :param end: The end of the range in seconds since the epoch (exclusive), or None for the end.
+        :return: A generator of row dicts (see statement), each with an extra "account" key.
+        """
+        first = 0 if start is None else bisect.bisect_left(self.times, int(start * 1000000))
+        last = len(self.times) if end is None else bisect.bisect_left(self.times, int(end * 1000000))
+        for row in range(first, last):
+            entry = self._row(row)
+            entry["account"] = self.accountNumbers[row]
+            yield entry
+
+    def statement(self, accountNumber, start=None, end=None):
+        """
+        Stream the rows of one account in a time range, oldest first.
+
+        :param accountNumber: The account number.
+        :param start: The start of the range in seconds since the epoch (inclusive), or None for the beginning.
+        :param end: The end of the range in seconds since the epoch (exclusive), or None for the end.
+        :return: A generator of row dicts {"time": seconds since the epoch, "kind": str, "amount": signed cents,
+                 "balance": cents after the row}.
+
+        >>> ticks = iter(range(1000))
+        >>> bank = Bank()
+        >>> ledger = TransactionLedger(bank, clock=lambda: next(ticks))
+        >>> source, target = Account("John", "Doe", "999123456", 11111111), Account("Jane", "Doe", "999123457", 22222222)
+        >>> _ = bank.addAccountToBank(source), bank.addAccountToBank(target)
+        >>> source.deposit(10000)
+        10000
+        >>> source.atmWithdraw(2000)
+        7750
+        >>> bank.transfer(source, target, 1000)
+        (6750, 1000)
+        >>> bank.addMonthlyInterest(12)
+        77
+        >>> target.deposit(CoinCollector.parseChange("QQ"), "coinDeposit")
+        1060
+        >>> for row in ledger.statement(11111111, start=3):
+        ...     print(row["time"], row["kind"], row["amount"], row["balance"])
+        3.0 atmWithdraw -2000 8000
+        4.0 atmFee -250 7750
+        5.0 transferOut -1000 6750
+        7.0 interest 67 6817
+        >>> [row["kind"] for row in ledger.statement(22222222, end=9)]
+        ['open', 'transferIn', 'interest']
+        >>> len(ledger), sum(row["amount"] for row in ledger.rows()) == source.getBalance() + target.getBalance()
+        (10, True)
+        >>> target.balance += 5  # A change the bank did not report
+        >>> target.deposit(100)
+        1165
+        >>> [(row["kind"], row["amount"]) for row in ledger.statement(22222222)][-2:]
+        [('adjustment', 5), ('deposit', 100)]
+        """
+        rows = self.accountRows.get(accountNumber)
+        if rows is None:
+            return
+        times = self.times
+        first = 0 if start is None else bisect.bisect_left(rows, int(start * 1000000), key=times.__getitem__)
+        last = len(rows) if end is None else bisect.bisect_left(rows, int(end * 1000000), key=times.__getitem__)
+        for position in range(first, last):
+            yield self._row(rows[position])
+
+    def _row(self, row):
+        """
+        Build the dict for one row.
+        """
+        return {"time": self.times[row] / 1000000, "kind": self.KINDS[self.kinds[row]], "amount": self.amounts[row],
+                "balance": self.balances[row]}
+
+    def close(self):
+        """
+        Detach the ledger from the bank. The recorded rows stay readable.
+        """
+        self.bank.removeListener(self)
+
+class ReadView:
+    """
+    A point-in-time view of the balances in a Bank, opened with ReadViews.open. Reads see every account as it was
+    when the view was opened, however the bank changes afterwards. Close the view (or use it in a with block)
+    when the report is done, so writers stop preserving balances for it.
+    """
+
+    def __init__(self, views):
+        """
+        Initialize a view. Use ReadViews.open instead.
+        """
+        self.views = views
+        self.preserved = {}  # Account number -> balance when the view was opened, for accounts changed since.
+
+    def balance(self, accountNumber):
+        """
+        Get the balance of an account as of the view.
+
+        :param accountNumber: The account number.
+        :return: The balance in cents, or None if the account was not open when the view was opened.
+        """
+        balance = self.views.balances.get(accountNumber, ReadViews.ABSENT)
+        balance = self.preserved.get(accountNumber, balance)  # Checked second: writers preserve before updating.
+        return None if balance is ReadViews.ABSENT else balance
+
+    def __iter__(self):
+        """
+        Iterate over (accountNumber, balance) pairs of the accounts open when the view was opened.
+        """
+        for accountNumber in list(self.views.balances):
+            balance = self.balance(accountNumber)
+            if balance is not None:
+                yield accountNumber, balance
+
+    def totalBalance(self):
+        """
+        Get the total balance of the bank as of the view.
+
+        :return: The total in cents.
+        """
+        return sum(balance for _, balance in self)
+
+    def close(self):
+        """
+        Release the view.
+        """
+        self.views.release(self)
+
+    def __enter__(self):
+        """
+        Use the view in a with block that closes it.
+        """
+        return self
+
+    def __exit__(self, *exc):
+        """
+        Close the view at the end of a with block.
+        """
+        self.close()
+
+class ReadViews:
+    """
+    A class that gives reports consistent point-in-time views of a Bank's balances while deposits, withdrawals
+    and transfers carry on. It attaches to the bank as a listener and keeps a copy of every balance. Opening a view
+    is O(1); afterwards, the first change to each account preserves its old balance in every open view
+    (copy-on-write), so a writer pays one dict update, plus one per open view for its first change to an account.
+
+    For a ConcurrentBank, opening a view briefly takes every stripe lock so no transfer is half applied.
+    """
+
+    ABSENT = object()  # Marks an account that was not open.
+
+    def __init__(self, bank):
+        """
+        Attach to a bank.
+
+        :param bank: The bank to provide views of.
+        """
+        self.bank = bank
+        self.balances = {account.accountNumber: account.getBalance() for account in bank}
+        self.openViews = ()
+        self.lock = threading.Lock()
+        bank.addListener(self)
+
+    def open(self):
+        """
+        Open a view of the bank as it is now.
+
+        :return: The ReadView.
+
+        >>> bank = Bank()
+        >>> views = ReadViews(bank)
+        >>> source, target = Account("John", "Doe", "999123456", 11111111), Account("Jane", "Doe", "999123457", 22222222)
+        >>> _ = bank.addAccountToBank(source), bank.addAccountToBank(target)
+        >>> source.deposit(10000)
+        10000
+        >>> with views.open() as view:
+        ...     _ = bank.transfer(source, target, 2500)
+        ...     _ = bank.addAccountToBank(Account("Jack", "Roe", "999123458", 33333333))
+        ...     bank.removeAccountFromBank(target)
+        ...     sorted(view), view.totalBalance(), view.balance(33333333)
+        ([(11111111, 10000), (22222222, 0)], 10000, None)
+        >>> sorted(views.open())
+        [(11111111, 7500), (33333333, 0)]
+        """
+        view = ReadView(self)
+        with self._writersPaused():
+            self.openViews = self.openViews + (view,)
+        return view
+
+    def release(self, view):
+        """
+        Close a view. Called by ReadView.close.
+        """
+        with self._writersPaused():
+            self.openViews = tuple(other for other in self.openViews if other is not view)
+            if not self.openViews:
+                # Drop the entries of accounts closed while views were open.
+                for accountNumber in [number for number, balance in self.balances.items() if balance is self.ABSENT]:
+                    del self.balances[accountNumber]
+
+    @contextlib.contextmanager
+    def _writersPaused(self):
+        """
+        Hold off every writer of the bank: all stripe locks for a ConcurrentBank, otherwise just the views' lock.
+        """
+        locked = isinstance(self.bank, ConcurrentBank)
+        if locked:
+            self.bank._acquireAll()
+        try:
+            with self.lock:
+                yield
+        finally:
+            if locked:
+                self.bank._releaseAll()
+
+    def _update(self, accountNumber, balance):
+        """
+        Record a new balance, preserving the old one in every open view that has not seen a change to it yet.
+        """
+        for view in self.openViews:
+            if accountNumber not in view.preserved:
+                view.preserved[accountNumber] = self.balances.get(accountNumber, self.ABSENT)
+        self.balances[accountNumber] = balance
+
+    def __call__(self, kind, account, amount):
+        """
+        Track an account change. Called by the bank for every change.
+
+        :param kind: The kind of change.
+        :param account: The account that changed, or None for bank-wide changes.
+        :param amount: The amount involved in cents, if any.
+        """
+        if kind == "close":
+            if self.openViews:
+                self._update(account.accountNumber, self.ABSENT)
+            else:
+                self.balances.pop(account.accountNumber, None)
+        elif kind not in ("setPIN", "setOwner", "monthlyInterest"):
+            self._update(account.accountNumber, account.getBalance())
+
+    def close(self):
+        """
+        Detach from the bank.
+        """
+        self.bank.removeListener(self)
+
+class BankAggregates:
+    """
+    Running bank-wide figures kept up to date on every account change, so dashboards can read them in O(1)
+    instead of scanning every account: total balance, open-account count, ATM and monthly fees collected, interest paid,
+    minimum and maximum balance and a histogram of balances by band. It attaches to the bank as a listener and
+    keeps each account's last known balance, so every change is applied as a difference.
+
+    The minimum and maximum come from heaps of the distinct balances with lazy deletion: stale entries are popped
+    when they reach the top, and the heaps are rebuilt when stale entries outnumber live ones.
+
+    On an AccruingBank, interest is counted as each account catches up on its postings, so interestPaid and the
+    balance figures lag until accounts are touched; call the bank's settle() (or check()) for final figures.
+    """
+
+    BAND_EDGES = (100, 1000, 10000, 100000, 1000000, 10000000, 100000000)  # Band lower bounds in cents.
+    BAND_LABELS = ("<$1", "$1-$10", "$10-$100", "$100-$1k", "$1k-$10k", "$10k-$100k", "$100k-$1M", ">=$1M")
+
+    def __init__(self, bank):
+        """
+        Attach to a bank, computing the figures for the accounts it already holds.
+
+        :param bank: The bank to aggregate.
+        """
+        self.bank = bank
+        self.lock = threading.Lock()
+        self.balances = {}  # Account number -> last known balance.
+        self.balanceCounts = {}  # Balance -> number of accounts holding it.
+        self.minHeap = []
+        self.maxHeap = []  # Negated balances.
+        self.bands = [0] * len(self.BAND_LABELS)
+        self.totalBalance = 0
+        self.atmFees = 0
+        self.monthlyFees = 0
+        self.interestPaid = 0
+        for account in bank:
+            self._add(account.accountNumber, account.getBalance())
+        bank.addListener(self)
+
+    @property
+    def accountCount(self):
+        """
+        The number of open accounts.
+        """
+        return len(self.balances)
+
+    def _add(self, accountNumber, balance):
+        """
+        Count a balance for an account.
+        """
+        self.balances[accountNumber] = balance
+        self.totalBalance += balance
+        self.bands[bisect.bisect_right(self.BAND_EDGES, balance)] += 1
+        count = self.balanceCounts.get(balance, 0)
+        self.balanceCounts[balance] = count + 1
+        if not count:
+            heapq.heappush(self.minHeap, balance)
+            heapq.heappush(self.maxHeap, -balance)
+            if len(self.minHeap) > 2 * len(self.balanceCounts) + 64:
+                self.minHeap = list(self.balanceCounts)
+                heapq.heapify(self.minHeap)
+                self.maxHeap = [-balance for balance in self.balanceCounts]
+                heapq.heapify(self.maxHeap)
+
+    def _remove(self, accountNumber):
+        """
+        Stop counting an account's balance.
+
+        :return: The balance that was counted.
+        """
+        balance = self.balances.pop(accountNumber)
+        self.totalBalance -= balance
+        self.bands[bisect.bisect_right(self.BAND_EDGES, balance)] -= 1
+        count = self.balanceCounts[balance] - 1
+        if count:
+            self.balanceCounts[balance] = count
+        else:
+            del self.balanceCounts[balance]
+        return balance
+
+    def _update(self, account):
+        """
+        Replace an account's counted balance with its current one.
+
+        :return: The change in balance.
+        """
+        number = account.accountNumber
+        old = self._remove(number) if number in self.balances else 0
+        balance = account.getBalance()
+        self._add(number, balance)
+        return balance - old
+
+    def __call__(self, kind, account, amount):
+        """
+        Apply an account change. Called by the bank for every change.
+
+        :param kind: The kind of change.
+        :param account: The account that changed, or None for bank-wide changes.
+        :param amount: The amount involved in cents, if any.
+        """
+        if kind in ("setPIN", "setOwner", "monthlyInterest"):
+            return  # No money moves until a pending posting is applied.
+        with self.lock:
+            if kind == "close":
+                if account.accountNumber in self.balances:
+                    self._remove(account.accountNumber)
+            else:
+                change = self._update(account)
+                if kind == "atmWithdraw":
+                    self.atmFees += -change - amount
+                elif kind == "monthlyFee":
+                    self.monthlyFees -= change
+                elif kind == "interest":
+                    self.interestPaid += change
+
+    def minBalance(self):
+        """
+        Get the smallest balance of the open accounts.
+
+        :return: The balance in cents, or None if no account is open.
+        """
+        with self.lock:
+            while self.minHeap and self.minHeap[0] not in self.balanceCounts:
+                heapq.heappop(self.minHeap)
+            return self.minHeap[0] if self.minHeap else None
+
+    def maxBalance(self):
+        """
+        Get the largest balance of the open accounts.
+
+        :return: The balance in cents, or None if no account is open.
+        """
+        with self.lock:
+            while self.maxHeap and -self.maxHeap[0] not in self.balanceCounts:
+                heapq.heappop(self.maxHeap)
+            return -self.maxHeap[0] if self.maxHeap else None
+
+    def summary(self):
+        """
+        Get every figure at once.
+
+        :return: A dict with accountCount, totalBalance, atmFees, monthlyFees, interestPaid, minBalance, maxBalance
+                 and bands (the number of accounts per balance band).
+        """
+        minBalance, maxBalance = self.minBalance(), self.maxBalance()
+        with self.lock:
+            return {"accountCount": self.accountCount, "totalBalance": self.totalBalance, "atmFees": self.atmFees,
+                    "monthlyFees": self.monthlyFees, "interestPaid": self.interestPaid, "minBalance": minBalance, "maxBalance": maxBalance,
+                    "bands": dict(zip(self.BAND_LABELS, self.bands))}
+
+    def check(self):
+        """
+        Recompute the balance figures from a full scan of the bank and compare them with the running ones. Fees
+        and interest paid are history and cannot be recomputed, so they are not checked. The scan catches every
+        account of an AccruingBank up first, so the interest it posted lazily is counted before comparing.
+
+        :return: A list of the figures that differ, each as "name: tracked X, actual Y". Empty if consistent.
+
+        >>> bank = Bank()
+        >>> aggregates = BankAggregates(bank)
+        >>> accounts = [Account("John", "Doe", "999123456", accountNumber=11111111 + i) for i in range(3)]
+        >>> for account in accounts:
+        ...     _ = bank.addAccountToBank(account)
+        >>> accounts[0].deposit(250000)
+        250000
+        >>> accounts[1].deposit(5000)
+        5000
+        >>> accounts[1].atmWithdraw(2000)
+        2750
+        >>> bank.transfer(accounts[0], accounts[2], 50000)
+        (200000, 50000)
+        >>> bank.addMonthlyInterest(12)
+        2527
+        >>> bank.removeAccountFromBank(accounts[1])
+        >>> summary = aggregates.summary()
+        >>> summary["accountCount"], summary["totalBalance"], summary["atmFees"], summary["interestPaid"]
+        (2, 252500, 250, 2527)
+        >>> summary["minBalance"], summary["maxBalance"], summary["bands"]["$100-$1k"], summary["bands"]["$1k-$10k"]
+        (50500, 202000, 1, 1)
+        >>> aggregates.check()
+        []
+        >>> accounts[0].balance += 1  # A change the bank did not report
+        >>> aggregates.check()
+        ['totalBalance: tracked 252500, actual 252501', 'maxBalance: tracked 202000, actual 202001']
+        >>> lazy = AccruingBank()
+        >>> lazyAggregates = BankAggregates(lazy)
+        >>> _ = lazy.addAccountToBank(Account("John", "Doe", "999123456", accountNumber=11111111))
+        >>> lazy.findAccount(11111111).deposit(100000)
+        100000
+        >>> lazy.addMonthlyInterest(12)
+        >>> lazyAggregates.summary()["interestPaid"]  # Not applied to the account yet
+        0
+        >>> lazyAggregates.check(), lazyAggregates.summary()["interestPaid"]
+        ([], 1000)
+        """
+        balances = [account.getBalance() for account in self.bank]
+        bands = [0] * len(self.BAND_LABELS)
+        for balance in balances:
+            bands[bisect.bisect_right(self.BAND_EDGES, balance)] += 1
+        actual = {"accountCount": len(balances), "totalBalance": sum(balances),
+                  "minBalance": min(balances, default=None), "maxBalance": max(balances, default=None),
+                  "bands": dict(zip(self.BAND_LABELS, bands))}
+        tracked = self.summary()
+        return [f"{name}: tracked {tracked[name]}, actual {value}" for name, value in actual.items()
+                if tracked[name] != value]
+
+    def close(self):
+        """
+        Detach from the bank.
+        """
+        self.bank.removeListener(self)
+
+class AccountImporter:
+    """
+    A class that streams account records from a CSV or JSONL file into a bank in bounded-memory chunks.
+
+    Each record needs firstName, lastName and ssn fields, and may carry an opening balance in cents. SSNs are
+    validated as in BankManager.openAccount (exactly 9 digits), and balances must be whole numbers of cents. Every
+    accepted record is given a fresh account number and PIN; rejected records are written to a separate JSONL file
+    with their line number and reason. Each chunk is added with Bank.addAccountsToBank, so on a SQLiteBank it is
+    written in one transaction.
+    """
+
+    def __init__(self, bank, accountClass=Account, chunkSize=10000):
+        """
+        Initialize an importer.
+
+        :param bank: The bank to import into.
+        :param accountClass: The class used for imported accounts (Account or CompactAccount).
+        :param chunkSize: How many records to validate before inserting them into the bank.
+        """
+        self.bank = bank
+        self.accountClass = accountClass
+        self.chunkSize = chunkSize
+
+    @staticmethod
+    def readRecords(path):
+        """
+        Stream (line number, record dict or None) pairs from a CSV file with a header row or a JSONL file, chosen
+        by the file extension. Unparseable JSONL lines yield None.
+        """
+        with open(path, newline="", encoding="utf-8") as source:
+            if path.lower().endswith((".jsonl", ".json", ".ndjson")):
+                for lineNumber, line in enumerate(source, 1):
+                    if line.strip():
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            record = None
+                        yield lineNumber, record if isinstance(record, dict) else None
+            else:
+                reader = csv.DictReader(source)
+                for record in reader:
+                    yield reader.line_num, record
+
+    @staticmethod
+    def validate(record):
+        """
+        Check one record.
+
+        :param record: The record dict, or None if it could not be parsed.
+        :return: A (firstName, lastName, ssn, balance) tuple, or the rejection reason as a string.
+
+        >>> AccountImporter.validate({"firstName": "John", "lastName": "Doe", "ssn": "999123456", "balance": "2500"})
+        ('John', 'Doe', '999123456', 2500)
+        >>> AccountImporter.validate({"firstName": "John", "lastName": "Doe", "ssn": "99912345"})
+        'Social Security Number must be 9 digits.'
+        >>> AccountImporter.validate({"firstName": "John", "ssn": "999123456"})
+        'Missing field: lastName.'
+        >>> [AccountImporter.validate({"firstName": "John", "lastName": "Doe", "ssn": "999123456", "balance": balance})
+        ...  for balance in (12.9, True, "12.5")]  # Edge case: only whole cents are accepted
+        ['Balance must be a whole number of cents.', 'Balance must be a whole number of cents.', 'Balance must be a whole number of cents.']
+        """
+        if record is None:
+            return "Malformed record."
+        for field in ("firstName", "lastName", "ssn"):
+            if record.get(field) is None:
+                return f"Missing field: {field}."
+        ssn = str(record["ssn"])
+        if len(ssn) != 9 or not ssn.isdigit():
+            return "Social Security Number must be 9 digits."
+        balance = record.get("balance")
+        if balance is None or balance == "":
+            balance = 0
+        elif isinstance(balance, str) and re.fullmatch(r"\s*-?[0-9]+\s*", balance):
+            balance = int(balance)
+        elif not isinstance(balance, int) or isinstance(balance, bool):
+            return "Balance must be a whole number of cents."
+        if balance < 0:
+            return "Balance must not be negative."
+        return str(record["firstName"]), str(record["lastName"]), ssn, balance
+
+    def importFile(self, path, rejectsPath, issuedPath=None):
+        """
+        Import every valid record of a file.
+
+        :param path: The CSV or JSONL file to read.
+        :param rejectsPath: The JSONL file that receives {"line", "reason", "record"} for each rejected record.
+        :param issuedPath: Optional CSV file that receives line, accountNumber and PIN for each imported record.
+        :return: An (imported, rejected) tuple of counts.
+
+        >>> import os, tempfile
+        >>> temporary = tempfile.TemporaryDirectory()
+        >>> directory = temporary.name
+        >>> path = os.path.join(directory, "accounts.csv")
+        >>> with open(path, "w") as source:
+        ...     _ = source.write("firstName,lastName,ssn,balance\\nJohn,Doe,999123456,1000\\nJane,Doe,12345,0\\nJack,Roe,999123458,\\n")
+        >>> bank = Bank()
+        >>> AccountImporter(bank, chunkSize=2).importFile(path, os.path.join(directory, "rejects.jsonl"))
+        (2, 1)
+        >>> sorted(account.getBalance() for account in bank)
+        [0, 1000]
+        >>> with open(os.path.join(directory, "rejects.jsonl")) as rejects:
+        ...     print(rejects.read().strip())
+        {"line": 3, "reason": "Social Security Number must be 9 digits.", "record": {"firstName": "Jane", "lastName": "Doe", "ssn": "12345", "balance": "0"}}
+        >>> temporary.cleanup()
+        """
+        imported = rejected = 0
+        with open(rejectsPath, "w", buffering=1 << 20) as rejects, \
+                open(issuedPath or os.devnull, "w", newline="", buffering=1 << 20) as issued:
+            issuedWriter = csv.writer(issued)
+            if issuedPath:
+                issuedWriter.writerow(["line", "accountNumber", "PIN"])
+            chunk = []
+            for lineNumber, record in self.readRecords(path):
+                fields = self.validate(record)
+                if isinstance(fields, str):
+                    rejects.write(json.dumps({"line": lineNumber, "reason": fields, "record": record}) + "\n")
+                    rejected += 1
+                    continue
+                chunk.append((lineNumber, fields))
+                if len(chunk) >= self.chunkSize:
+                    imported += self._insert(chunk, issuedWriter)
+                    chunk = []
+            imported += self._insert(chunk, issuedWriter)
+        return imported, rejected
+
+    def _insert(self, chunk, issuedWriter):
+        """
+        Create accounts for a chunk of validated records and add them to the bank.
+
+        :return: The number of accounts added.
+        """
+        accounts = {}  # Account number -> (line number, account).
+        for lineNumber, (firstName, lastName, ssn, balance) in chunk:
+            number = self.bank.newAccountNumber()
+            while number in accounts:  # Not in the bank yet, but already issued in this chunk.
+                number = self.bank.newAccountNumber()
+            account = self.accountClass(firstName, lastName, ssn, accountNumber=number)
+            account.balance = balance
+            accounts[number] = (lineNumber, account)
+        added = self.bank.addAccountsToBank([account for _, account in accounts.values()])
+        rows = [(accounts[account.accountNumber][0], account.accountNumber, account.getPIN()) for account in added]
+        issuedWriter.writerows(rows)
+        return len(rows)
+
+class CashDispenser:
+    """
+    A class that decides which notes an ATM pays out. The minimum-note combination for every amount up to the
+    withdrawal limit is precomputed once, so the common case is a table lookup plus an inventory check. Only when
+    a cassette runs too low for that combination is a small inventory-bounded search run instead. Amounts the
+    remaining notes cannot pay exactly are refused.
+    """
+
+    def __init__(self, inventory=None, limit=1000):
+        """
+        Initialize a dispenser.
+
+        :param inventory: A dict mapping each note denomination in dollars to the number of notes loaded, or None
+                          for an unlimited count. Defaults to unlimited $20, $10 and $5 notes.
+        :param limit: The largest amount in dollars that can be withdrawn at once.
+        """
+        self.inventory = dict(inventory) if inventory is not None else {20: None, 10: None, 5: None}
+        self.denominations = sorted(self.inventory, reverse=True)
+        self.limit = limit
+        self.unit = math.gcd(*self.denominations)
+        self.table = self._buildTable()
+
+    def _buildTable(self):
+        """
+        Compute the minimum-note combination for every multiple of the smallest unit up to the limit.
+
+        :return: A list indexed by amount // unit of note-count tuples (one count per denomination), or None where
+                 the amount cannot be paid with these denominations at all.
+        """
+        steps = self.limit // self.unit
+        notes = [0] + [None] * steps
+        last = [None] * (steps + 1)
+        for step in range(1, steps + 1):
+            for denomination in self.denominations:
+                previous = step - denomination // self.unit
+                if previous >= 0 and notes[previous] is not None and (notes[step] is None or notes[previous] + 1 < notes[step]):
+                    notes[step] = notes[previous] + 1
+                    last[step] = denomination
+        table = [()] + [None] * steps
+        for step in range(1, steps + 1):
+            if notes[step] is not None:
+                counts = dict(zip(self.denominations, table[step - last[step] // self.unit]))
+                counts[last[step]] = counts.get(last[step], 0) + 1
+                table[step] = tuple(counts.get(denomination, 0) for denomination in self.denominations)
+        return table
+
+    def plan(self, amount):
+        """
+        Choose the notes for an amount without taking them from the cassettes.
+
+        :param amount: The amount in dollars.
+        :return: A dict mapping denomination to note count, or None if the amount cannot be paid.
+
+        >>> dispenser = CashDispenser({20: 2, 10: 0, 5: 10})
+        >>> dispenser.plan(35)
+        {20: 1, 10: 0, 5: 3}
+        >>> dispenser.plan(75)  # Not enough $20 notes for the table answer, so fall back to more $5 notes
+        {20: 2, 10: 0, 5: 7}
+        >>> dispenser.plan(95) is None  # Would need eleven $5 notes
+        True
+        >>> dispenser.plan(1005) is None  # Edge case: over the limit
         True
-        >>> bank.addMonthlyInterest(1.25)
-        >>> account1.getBalance()
-        10010
-        >>> account2.getBalance()
-        20020
         """
-        monthlyRate = annualInterestRate / 12 / 100
-        for account in self.accounts:
-            if account:
-                interest = int(account.getBalance() * monthlyRate)
-                account.deposit(interest)
+        if amount <= 0 or amount > self.limit or amount % self.unit:
+            return None
+        counts = self.table[amount // self.unit]
+        if counts is None:
+            return None
+        if all(available is None or available >= count
+               for available, count in zip((self.inventory[d] for d in self.denominations), counts)):
+            return dict(zip(self.denominations, counts))
+        return self._boundedPlan(amount)
+
+    def _boundedPlan(self, amount):
+        """
+        Find the minimum-note combination that the current inventory can pay.
+        """
+        steps = amount // self.unit
+        best = [None] * (steps + 1)
+        best[0] = ()
+        for denomination in self.denominations:
+            available = self.inventory[denomination]
+            size = denomination // self.unit
+            nextBest = list(best)
+            for step in range(steps + 1):
+                if best[step] is None:
+                    continue
+                count = 1
+                while step + count * size <= steps and (available is None or count <= available):
+                    candidate = best[step] + ((denomination, count),)
+                    target = nextBest[step + count * size]
+                    if target is None or sum(c for _, c in candidate) < sum(c for _, c in target):
+                        nextBest[step + count * size] = candidate
+                    count += 1
+            best = nextBest
+        if best[steps] is None:
+            return None
+        counts = dict(best[steps])
+        return {denomination: counts.get(denomination, 0) for denomination in self.denominations}
+
+    def take(self, notes):
+        """
+        Remove dispensed notes from the cassettes.
+
+        :param notes: A plan returned by plan().
+        """
+        for denomination, count in notes.items():
+            if self.inventory[denomination] is not None:
+                self.inventory[denomination] -= count
+
+class IdempotencyCache:
+    """
+    A bounded cache of results by idempotency key, so that a retried money movement (e.g. an ATM resending a
+    deposit after a timeout) returns the original result instead of being applied twice. Entries expire ttl
+    seconds after they were stored, and the least recently used entry is evicted when the cache is full, so
+    memory stays bounded and every lookup is O(1).
+
+    Calls that are still running are kept apart from the cache, in self.inFlight, and are never evicted or
+    expired: a caller that retries a key while the first call is running waits for its result.
+    """
+
+    def __init__(self, capacity=100000, ttl=3600.0, clock=time.monotonic):
+        """
+        Initialize an empty cache.
+
+        :param capacity: The maximum number of keys remembered.
+        :param ttl: Seconds a key is remembered after its result is stored.
+        :param clock: A callable returning the current time in seconds.
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = collections.OrderedDict()  # Key -> (expiry, fingerprint, result) of finished calls.
+        self.inFlight = {}  # Key -> [fingerprint, finished flag, result] of running calls.
+        self.lock = threading.Lock()
+        self.finished = threading.Condition(self.lock)  # Notified whenever a call finishes.
+
+    def __len__(self):
+        """
+        Return the number of finished keys remembered, including expired ones not evicted yet.
+        """
+        return len(self.entries)
+
+    def run(self, key, fingerprint, function, *args):
+        """
+        Call a function once per key, returning the stored result for repeated keys.
+
+        :param key: The idempotency key. Any hashable value, e.g. (accountNumber, clientKey).
+        :param fingerprint: A value describing the request, e.g. the operation and amount. A repeated key with a
+                            different fingerprint is refused rather than answered with an unrelated result.
+        :param function: The function to call the first time the key is seen.
+        :param args: The arguments for the function.
+        :return: A (result, replayed) tuple, where replayed tells whether the result was stored earlier.
+        :raises ValueError: If the key was used with a different fingerprint.
+
+        >>> ticks = [0]
+        >>> cache = IdempotencyCache(capacity=2, ttl=60, clock=lambda: ticks[0])
+        >>> account = Account("John", "Doe", "999123456", accountNumber=11111111)
+        >>> cache.run("a", ("deposit", 500), account.deposit, 500)
+        (500, False)
+        >>> cache.run("a", ("deposit", 500), account.deposit, 500)  # A retry is not applied again
+        (500, True)
+        >>> cache.run("a", ("deposit", 700), account.deposit, 700)
+        Traceback (most recent call last):
+            ...
+        ValueError: Idempotency key reused for a different request.
+        >>> _ = cache.run("b", ("deposit", 1), account.deposit, 1), cache.run("c", ("deposit", 1), account.deposit, 1)
+        >>> cache.run("a", ("deposit", 500), account.deposit, 500)  # Evicted as least recently used
+        (1002, False)
+        >>> ticks[0] = 61
+        >>> cache.run("c", ("deposit", 1), account.deposit, 1)  # Expired
+        (1003, False)
+        """
+        with self.lock:
+            while True:
+                call = self.inFlight.get(key)
+                if call is None:
+                    break
+                if call[0] != fingerprint:
+                    raise ValueError("Idempotency key reused for a different request.")
+                while self.inFlight.get(key) is call:
+                    self.finished.wait()
+                if call[1]:
+                    return call[2], True
+                # The first call failed; look again, another retry may already be running it.
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self.entries[key]
+                entry = None
+            if entry is not None:
+                if entry[1] != fingerprint:
+                    raise ValueError("Idempotency key reused for a different request.")
+                self.entries.move_to_end(key)
+                return entry[2], True
+            call = self.inFlight[key] = [fingerprint, False, None]
+        try:
+            result = function(*args)
+        except BaseException:
+            with self.lock:
+                del self.inFlight[key]  # Let a retry run the call again.
+                self.finished.notify_all()
+            raise
+        with self.lock:
+            call[1:] = [True, result]
+            del self.inFlight[key]
+            self.entries[key] = (self.clock() + self.ttl, fingerprint, result)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+            self.finished.notify_all()
+        return result, False
+
+class LatencyHistogram:
+    """
+    A class that records latencies in log-linear buckets, in the style of an HDR histogram: every power of two is
+    split into 32 equal buckets, so any recorded value is known to within about 3% using a few hundred counters
+    at most, whatever the range of values.
+    """
+
+    SUB_BUCKET_BITS = 5
+
+    def __init__(self):
+        """
+        Initialize an empty histogram.
+        """
+        self.buckets = {}  # Bucket lower bound -> count.
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value):
+        """
+        Record one value.
+
+        :param value: The value, e.g. a latency in nanoseconds.
+        """
+        shift = value.bit_length() - self.SUB_BUCKET_BITS - 1
+        lower = (value >> shift) << shift if shift > 0 else value
+        self.buckets[lower] = self.buckets.get(lower, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def upperBound(self, lower):
+        """
+        Get the largest value that falls into the bucket starting at lower.
+        """
+        shift = lower.bit_length() - self.SUB_BUCKET_BITS - 1
+        return lower + (1 << shift) - 1 if shift > 0 else lower
+
+    def percentile(self, percent):
+        """
+        Estimate a percentile.
+
+        :param percent: The percentile, from 0 to 100.
+        :return: The upper bound of the bucket holding the percentile, or None if the histogram is empty.
+
+        >>> histogram = LatencyHistogram()
+        >>> for value in range(1, 1001):
+        ...     histogram.record(value)
+        >>> histogram.percentile(50), histogram.percentile(99), histogram.percentile(100)
+        (503, 991, 1000)
+        """
+        if not self.count:
+            return None
+        target = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for lower in sorted(self.buckets):
+            seen += self.buckets[lower]
+            if seen >= target:
+                return min(self.upperBound(lower), self.max)
+        return self.max
+
+    def cumulativeCounts(self, bounds):
+        """
+        Count the values at or below each bound, for exporting as Prometheus buckets.
+
+        :param bounds: Ascending bucket bounds in the histogram's unit.
+        :return: A list with one cumulative count per bound.
+        """
+        counts = [0] * len(bounds)
+        for lower, count in self.buckets.items():
+            position = bisect.bisect_left(bounds, self.upperBound(lower))
+            if position < len(bounds):
+                counts[position] += count
+        return list(itertools.accumulate(counts))
+
+class Metrics:
+    """
+    A class that instruments the bank's hot paths: Account.deposit, withdraw, atmWithdraw and isValidPIN,
+    findAccount of every Bank class and each BankManager menu action. It keeps a latency histogram per
+    operation, success and failure counters by reason, and totals of the money moved, and exports them as a
+    Prometheus text file or a JSON snapshot.
+
+    Instrumentation works by wrapping the methods when enable() is called and restoring the originals on
+    disable(), so the code runs exactly as before, with no added cost, while metrics are off. Counters are not
+    locked; under heavy multi-threaded use they may drop the odd update.
+    """
+
+    ACCOUNT_METHODS = ("deposit", "withdraw", "atmWithdraw", "isValidPIN")
+    MENU_ACTIONS = ("openAccount", "getAccountInformation", "changePIN", "depositMoney", "transferMoney",
+                    "withdrawMoney", "atmWithdrawal", "depositChange", "closeAccount", "addMonthlyInterest")
+    PROMETHEUS_BOUNDS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0)
+
+    active = None  # The Metrics instance currently installed, if any.
+
+    def __init__(self):
+        """
+        Initialize empty metrics. Call enable() to start recording.
+        """
+        self.histograms = {}
+        self.outcomes = {}  # (operation, reason or None) -> count.
+        self.moved = {"deposited": 0, "withdrawn": 0, "atmFees": 0}
+        self.originals = []
+
+    def record(self, operation, nanoseconds, reason=None):
+        """
+        Record one call of an operation.
+
+        :param operation: The operation name, e.g. "Account.deposit".
+        :param nanoseconds: How long the call took.
+        :param reason: None for a success, otherwise the failure reason.
+        """
+        histogram = self.histograms.get(operation)
+        if histogram is None:
+            histogram = self.histograms[operation] = LatencyHistogram()
+        histogram.record(nanoseconds)
+        key = (operation, reason)
+        self.outcomes[key] = self.outcomes.get(key, 0) + 1
+
+    def enable(self):
+        """
+        Install the instrumentation.
+
+        >>> metrics = Metrics()
+        >>> metrics.enable()
+        >>> bank = Bank()
+        >>> account = Account("John", "Doe", "999123456", accountNumber=11111111)
+        >>> _ = bank.addAccountToBank(account)
+        >>> bank.findAccount(11111111).deposit(1000)
+        1000
+        >>> account.withdraw(5000)
+        Insufficient funds in account 11111111
+        1000
+        >>> account.atmWithdraw(500)
+        250
+        >>> limits = VelocityLimits(bank, maxAmount=None, maxCount=0)
+        >>> account.withdraw(100)
+        Withdrawal count limit reached for account 11111111
+        250
+        >>> limits.close()
+        >>> bank.findAccount(22222222) is None
+        True
+        >>> metrics.disable()
+        >>> account.deposit(1)  # No longer recorded
+        251
+        >>> snapshot = metrics.snapshot()
+        >>> snapshot["outcomes"]["Account.withdraw"], snapshot["outcomes"]["Bank.findAccount"]
+        ({'insufficientFunds': 1, 'velocityLimit': 1}, {'success': 1, 'notFound': 1})
+        >>> snapshot["moved"]
+        {'deposited': 1000, 'withdrawn': 500, 'atmFees': 250}
+        >>> 'bank_operations_total{operation="Account.withdraw",outcome="failure",reason="insufficientFunds"} 1' in metrics.toPrometheus()
+        True
+        """
+        if Metrics.active is not None:
+            raise RuntimeError("Another Metrics instance is already enabled.")
+        Metrics.active = self
+        for cls in self._classesDefining(Account, self.ACCOUNT_METHODS) + self._classesDefining(CompactAccount, self.ACCOUNT_METHODS):
+            for name in self.ACCOUNT_METHODS:
+                if name in cls.__dict__:
+                    wrapper = self._wrapPIN(cls.__dict__[name]) if name == "isValidPIN" else self._wrapMoney(name, cls.__dict__[name])
+                    self._install(cls, name, wrapper)
+        for cls in self._classesDefining(Bank, ("findAccount",)):
+            self._install(cls, "findAccount", self._wrapFind(cls.__dict__["findAccount"]))
+        for name in self.MENU_ACTIONS:
+            self._install(BankManager, name, self._wrapAction(name, BankManager.__dict__[name]))
+
+    def disable(self):
+        """
+        Remove the instrumentation, restoring the original methods. Recorded metrics are kept.
+        """
+        for cls, name, original in reversed(self.originals):
+            setattr(cls, name, original)
+        self.originals = []
+        if Metrics.active is self:
+            Metrics.active = None
+
+    @staticmethod
+    def _classesDefining(base, names):
+        """
+        List base and its subclasses that define any of the given methods themselves.
+        """
+        classes = []
+        pending = [base]
+        while pending:
+            cls = pending.pop()
+            if any(name in cls.__dict__ for name in names):
+                classes.append(cls)
+            pending.extend(cls.__subclasses__())
+        return classes
+
+    def _install(self, cls, name, wrapper):
+        """
+        Replace a method, remembering the original.
+        """
+        self.originals.append((cls, name, cls.__dict__[name]))
+        setattr(cls, name, wrapper)
+
+    def _wrapMoney(self, name, function):
+        """
+        Wrap deposit, withdraw or atmWithdraw. A call that leaves the balance unchanged failed: because the amount
+        was not positive, because the bank's VelocityLimits refused it, or because the funds were insufficient.
+        """
+        metrics = self
+        operation = "Account." + name
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def wrapper(account, amount, *kind):
+            before = account.balance
+            limits = account.bank.velocityLimits if account.bank is not None else None
+            refusals = limits.refusals if limits is not None else 0
+            start = clock()
+            balance = function(account, amount, *kind)
+            elapsed = clock() - start
+            if balance == before:
+                if amount <= 0:
+                    reason = "nonPositiveAmount"
+                elif limits is not None and limits.refusals != refusals:
+                    reason = "velocityLimit"
+                else:
+                    reason = "insufficientFunds"
+                metrics.record(operation, elapsed, reason)
+            else:
+                metrics.record(operation, elapsed)
+                if name == "deposit":
+                    metrics.moved["deposited"] += amount
+                else:
+                    metrics.moved["withdrawn"] += amount
+                    if name == "atmWithdraw":
+                        metrics.moved["atmFees"] += before - balance - amount
+            return balance
+        return wrapper
+
+    def _wrapPIN(self, function):
+        """
+        Wrap isValidPIN, counting rejected PINs as failures.
+        """
+        metrics = self
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def wrapper(account, pin):
+            start = clock()
+            valid = function(account, pin)
+            metrics.record("Account.isValidPIN", clock() - start, None if valid else "invalidPIN")
+            return valid
+        return wrapper
+
+    def _wrapFind(self, function):
+        """
+        Wrap findAccount, counting unknown account numbers as failures.
+        """
+        metrics = self
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def wrapper(bank, accountNumber):
+            start = clock()
+            account = function(bank, accountNumber)
+            metrics.record("Bank.findAccount", clock() - start, None if account is not None else "notFound")
+            return account
+        return wrapper
+
+    def _wrapAction(self, name, function):
+        """
+        Wrap a BankManager menu action. The time includes waiting for the user's input.
+        """
+        metrics = self
+        operation = "BankManager." + name
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def wrapper(manager):
+            start = clock()
+            try:
+                return function(manager)
+            finally:
+                metrics.record(operation, clock() - start)
+        return wrapper
+
+    def snapshot(self):
+        """
+        Get every metric as JSON-serializable data.
+
+        :return: A dict with "latencyNs" (count, min, mean, p50, p90, p99, p99.9 and max per operation),
+                 "outcomes" (count per operation and outcome, "success" or the failure reason) and "moved"
+                 (cents deposited, withdrawn and collected in ATM fees).
+        """
+        latency = {}
+        for operation, histogram in sorted(self.histograms.items()):
+            latency[operation] = {"count": histogram.count, "min": histogram.min,
+                                  "mean": histogram.total / histogram.count, "p50": histogram.percentile(50),
+                                  "p90": histogram.percentile(90), "p99": histogram.percentile(99),
+                                  "p99.9": histogram.percentile(99.9), "max": histogram.max}
+        outcomes = {}
+        for (operation, reason), count in self.outcomes.items():
+            outcomes.setdefault(operation, {})[reason or "success"] = count
+        return {"latencyNs": latency, "outcomes": outcomes, "moved": dict(self.moved)}
+
+    def toPrometheus(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        :return: The exposition text.
+        """
+        lines = ["# HELP bank_operation_duration_seconds Latency of bank operations.",
+                 "# TYPE bank_operation_duration_seconds histogram"]
+        boundsNs = [bound * 1e9 for bound in self.PROMETHEUS_BOUNDS]
+        for operation, histogram in sorted(self.histograms.items()):
+            for bound, count in zip(self.PROMETHEUS_BOUNDS, histogram.cumulativeCounts(boundsNs)):
+                lines.append(f'bank_operation_duration_seconds_bucket{{operation="{operation}",le="{bound:g}"}} {count}')
+            lines.append(f'bank_operation_duration_seconds_bucket{{operation="{operation}",le="+Inf"}} {histogram.count}')
+            lines.append(f'bank_operation_duration_seconds_sum{{operation="{operation}"}} {histogram.total / 1e9:.9f}')
+            lines.append(f'bank_operation_duration_seconds_count{{operation="{operation}"}} {histogram.count}')
+        lines += ["# HELP bank_operations_total Bank operations by outcome and failure reason.",
+                  "# TYPE bank_operations_total counter"]
+        for (operation, reason), count in sorted(self.outcomes.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+            outcome = "success" if reason is None else "failure"
+            lines.append(f'bank_operations_total{{operation="{operation}",outcome="{outcome}",reason="{reason or ""}"}} {count}')
+        lines += ["# HELP bank_money_moved_cents_total Money moved by successful account operations, in cents.",
+                  "# TYPE bank_money_moved_cents_total counter"]
+        for direction, cents in self.moved.items():
+            lines.append(f'bank_money_moved_cents_total{{direction="{direction}"}} {cents}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Write the metrics to a file, atomically: JSON if the path ends in .json, Prometheus text otherwise (e.g. a
+        .prom file for the node exporter's textfile collector).
+
+        :param path: The file to write.
+        """
+        with open(path + ".tmp", "w") as output:
+            if path.endswith(".json"):
+                json.dump(self.snapshot(), output, indent=2)
+            else:
+                output.write(self.toPrometheus())
+        os.replace(path + ".tmp", path)
+
+class ReportWriter:
+    """
+    A class that streams interest postings and account listings to a file or pipe as CSV, JSONL or a summary
+    only. Amounts are written in cents. Rows are collected into blocks of bufferRows rows, each written with a
+    single write() call, so a month-end run over millions of accounts is not bound by console output. SSNs are
+    masked as in Account.__str__.
+    """
+
+    FORMATS = ("csv", "jsonl", "summary")
+    INTEREST_HEADER = "accountNumber,interest,balance\n"
+    ACCOUNT_HEADER = "accountNumber,firstName,lastName,ssn,balance\n"
+
+    def __init__(self, output, format="csv", bufferRows=8192):
+        """
+        Initialize a writer.
+
+        :param output: A text file to write to. The caller keeps ownership of it; close() only flushes it.
+        :param format: "csv", "jsonl" or "summary". A summary report holds only the totals written by close().
+        :param bufferRows: The number of rows collected before each write.
+        """
+        if format not in self.FORMATS:
+            raise ValueError(f"Unknown report format: {format}.")
+        self.output = output
+        self.format = format
+        self.bufferRows = bufferRows
+        self.rows = []
+        self.header = None
+        self.interestCount = 0
+        self.interestTotal = 0
+        self.accountCount = 0
+        self.balanceTotal = 0
+
+    @staticmethod
+    def dollars(cents):
+        """
+        Format cents as dollars without going through a float.
+
+        >>> ReportWriter.dollars(123456789), ReportWriter.dollars(-5)
+        ('1234567.89', '-0.05')
+        """
+        whole, fraction = divmod(abs(cents), 100)
+        return f"{'-' if cents < 0 else ''}{whole}.{fraction:02d}"
+
+    def _write(self, header, row):
+        """
+        Buffer one row, starting a new CSV section with a header line when the kind of row changes.
+        """
+        if self.format == "csv" and self.header is not header:
+            self.rows.append(header)
+            self.header = header
+        self.rows.append(row)
+        if len(self.rows) >= self.bufferRows:
+            self.flush()
+
+    @staticmethod
+    def _csvField(text):
+        """
+        Quote a CSV field if it contains a separator, quote or line break.
+        """
+        if any(character in text for character in ',"\n\r'):
+            return '"' + text.replace('"', '""') + '"'
+        return text
+
+    def interestPosting(self, account, interest):
+        """
+        Report an interest posting.
+
+        :param account: The account credited, after the posting.
+        :param interest: The interest credited in cents.
+        """
+        self.interestCount += 1
+        self.interestTotal += interest
+        if self.format == "csv":
+            self._write(self.INTEREST_HEADER, f"{account.accountNumber},{interest},{account.getBalance()}\n")
+        elif self.format == "jsonl":
+            self._write(None, f'{{"accountNumber":{account.accountNumber},"interest":{interest},"balance":{account.getBalance()}}}\n')
+
+    def account(self, account):
+        """
+        Report an account's details, with the SSN masked.
+
+        :param account: The account.
+        """
+        balance = account.getBalance()
+        self.accountCount += 1
+        self.balanceTotal += balance
+        ssn = f"XXX-XX-{account.getSocialSecurityNumber()[-4:]}"
+        if self.format == "csv":
+            self._write(self.ACCOUNT_HEADER, f"{account.accountNumber},{self._csvField(account.getOwnerFirstName())},"
+                                             f"{self._csvField(account.getOwnerLastName())},{ssn},{balance}\n")
+        elif self.format == "jsonl":
+            self._write(None, json.dumps({"accountNumber": account.accountNumber, "firstName": account.getOwnerFirstName(),
+                                          "lastName": account.getOwnerLastName(), "ssn": ssn, "balance": balance},
+                                         separators=(",", ":")) + "\n")
+
+    def accounts(self, bank):
+        """
+        Report every account of a bank.
+
+        :param bank: The bank.
+
+        >>> import io
+        >>> bank = Bank()
+        >>> _ = bank.addAccountToBank(Account("John", "Doe, Jr.", "999123456", accountNumber=11111111))
+        >>> bank.findAccount(11111111).deposit(123456)
+        123456
+        >>> output = io.StringIO()
+        >>> report = ReportWriter(output)
+        >>> report.accounts(bank)
+        >>> report.interestPosting(bank.findAccount(11111111), 1235)
+        >>> report.close()
+        >>> print(output.getvalue().strip())
+        accountNumber,firstName,lastName,ssn,balance
+        11111111,John,"Doe, Jr.",XXX-XX-3456,123456
+        accountNumber,interest,balance
+        11111111,1235,123456
+        >>> output = io.StringIO()
+        >>> report = ReportWriter(output, "jsonl")
+        >>> report.accounts(bank)
+        >>> report.close()
+        >>> print(output.getvalue().strip())
+        {"accountNumber":11111111,"firstName":"John","lastName":"Doe, Jr.","ssn":"XXX-XX-3456","balance":123456}
+        """
+        for account in bank:
+            self.account(account)
+
+    def flush(self):
+        """
+        Write the buffered rows.
+        """
+        if self.rows:
+            self.output.write("".join(self.rows))
+            self.rows.clear()
+
+    def close(self):
+        """
+        Write the buffered rows and, for a summary report, the totals, then flush the output.
+
+        >>> import io
+        >>> output = io.StringIO()
+        >>> report = ReportWriter(output, "summary")
+        >>> report.interestPosting(Account("John", "Doe", "999123456", accountNumber=11111111), 1235)
+        >>> report.close()
+        >>> output.getvalue()
+        'interestPostings=1 interestTotal=12.35\\n'
+        """
+        if self.format == "summary":
+            totals = []
+            if self.interestCount:
+                totals.append(f"interestPostings={self.interestCount} interestTotal={self.dollars(self.interestTotal)}")
+            if self.accountCount:
+                totals.append(f"accounts={self.accountCount} balanceTotal={self.dollars(self.balanceTotal)}")
+            self.rows.append(" ".join(totals) + "\n")
+        self.flush()
+        self.output.flush()
 
 class BankManager:
     """
     A class to manage the interaction between the user and the bank system.
     """
 
-    def __init__(self):
+    def __init__(self, bank=None, accountClass=Account, dispenser=None, report=None):
         """
-        Initialize the BankManager with a new Bank instance.
+        Initialize the BankManager with a Bank instance.
+
+        :param bank: Optional bank to manage (e.g. a ColumnarBank). If not provided, a new Bank is created.
+        :param accountClass: The class used for newly opened accounts (Account or CompactAccount).
+        :param dispenser: Optional CashDispenser for ATM withdrawals. Defaults to unlimited $20, $10 and $5 notes.
+        :param report: Optional ReportWriter. If set, interest postings are written to it instead of printed.
         """
-        self.bank = Bank()
+        self.bank = bank if bank is not None else Bank()
+        self.accountClass = accountClass
+        self.dispenser = dispenser if dispenser is not None else CashDispenser()
+        self.report = report
 
     def main(self):
         """
@@ -587,10 +4876,10 @@ class BankManager:
             else:
                 print("Social Security Number must be 9 digits. Please try again.")
 
-        newAccount = Account(firstName, lastName, ssn)
+        newAccount = self.accountClass(firstName, lastName, ssn, accountNumber=self.bank.newAccountNumber())
         
         if not self.bank.addAccountToBank(newAccount):
-            print("No more accounts can be added. Please try again later.")
+            print("Account could not be opened. Please try again.")
             return
         
         print(newAccount)
@@ -629,12 +4918,11 @@ class BankManager:
         account = self.promptForAccountNumberAndPIN(self.bank)
         if account:
             while True:
-                amount = BankUtility.promptUserForPositiveNumber("Enter amount to deposit in dollars and cents (e.g. 2.57): ")
-                cents = BankUtility.convertFromDollarsToCents(amount)
+                cents = BankUtility.promptUserForPositiveCents("Enter amount to deposit in dollars and cents (e.g. 2.57): ")
                 if cents <= 0:
                     print("Deposit amount must be positive. Please try again.")
                 else:
-                    newBalance = account.deposit(cents)
+                    newBalance = self.bank.deposit(account, cents)
                     print(f"New balance: ${newBalance / 100:.2f}")
                     break
 
@@ -653,18 +4941,16 @@ class BankManager:
                 toAccount = self.bank.findAccount(toAccountNumber)
                 if toAccount:
                     while True:
-                        amount = BankUtility.promptUserForPositiveNumber("Enter amount to transfer in dollars and cents (e.g. 2.57): ")
-                        cents = BankUtility.convertFromDollarsToCents(amount)
+                        cents = BankUtility.promptUserForPositiveCents("Enter amount to transfer in dollars and cents (e.g. 2.57): ")
                         if cents <= 0:
                             print("Transfer amount must be positive. Please try again.")
                         else:
-                            fromBalanceBefore = fromAccount.getBalance()
-                            fromBalanceAfter = fromAccount.withdraw(cents)
-                            if fromBalanceBefore == fromBalanceAfter:
+                            balances = self.bank.transfer(fromAccount, toAccount, cents)
+                            if balances is None:
                                 # Already handled by withdraw method
                                 break
                             else:
-                                toBalance = toAccount.deposit(cents)
+                                fromBalanceAfter, toBalance = balances
                                 print(f"Transfer Complete\nNew balance in account {fromAccount.accountNumber} is: ${fromBalanceAfter / 100:.2f}\nNew balance in account {toAccount.accountNumber} is: ${toBalance / 100:.2f}")
                             break
                     break
@@ -678,18 +4964,17 @@ class BankManager:
         account = self.promptForAccountNumberAndPIN(self.bank)
         if account:
             while True:
-                amount = BankUtility.promptUserForPositiveNumber("Enter amount to withdraw in dollars and cents (e.g. 2.57): ")
-                cents = BankUtility.convertFromDollarsToCents(amount)
+                cents = BankUtility.promptUserForPositiveCents("Enter amount to withdraw in dollars and cents (e.g. 2.57): ")
                 if cents <= 0:
                     print("Withdrawal amount must be positive. Please try again.")
                 else:
                     balance_before = account.getBalance()
-                    account.withdraw(cents)
-                    if balance_before == account.getBalance():
+                    new_balance = self.bank.withdraw(account, cents)
+                    if balance_before == new_balance:
                         # Insufficient funds, no need to print the new balance
                         break
                     else:
-                        print(f"New balance: ${account.getBalance() / 100:.2f}")
+                        print(f"New balance: ${new_balance / 100:.2f}")
                         break
 
     def atmWithdrawal(self):
@@ -699,8 +4984,8 @@ class BankManager:
         account = self.promptForAccountNumberAndPIN(self.bank)
         if account:
             while True:
-                amount = BankUtility.promptUserForPositiveNumber("Enter amount to withdraw in dollars (no cents) in multiples of $5 (limit $1000): ")
-                if amount < 5 or amount > 1000 or amount % 5 != 0:
+                amount = BankUtility.promptUserForPositiveNumber(f"Enter amount to withdraw in dollars (no cents) in multiples of ${self.dispenser.unit} (limit ${self.dispenser.limit}): ")
+                if amount < self.dispenser.unit or amount > self.dispenser.limit or amount % self.dispenser.unit != 0:
                     print("Invalid amount. Try again.")
                 else:
                     # Calculate the total amount in cents
@@ -712,20 +4997,24 @@ class BankManager:
                         print(f"Insufficient funds in account {account.accountNumber}")
                         break
 
-                    # Calculate the number of bills
-                    num_20_bills = amount // 20
-                    remainder = amount % 20
-                    num_10_bills = remainder // 10
-                    remainder = remainder % 10
-                    num_5_bills = remainder // 5
+                    # Choose the bills from what the machine holds
+                    bills = self.dispenser.plan(int(amount))
+                    if bills is None:
+                        print("This ATM cannot dispense that amount right now. Please try a different amount.")
+                        break
 
                     # Perform the withdrawal
-                    new_balance = account.withdraw(total_amount_in_cents)
+                    balance_before = account.getBalance()
+                    new_balance = self.bank.atmWithdraw(account, amount_in_cents)
+                    if new_balance == balance_before:
+                        # Refused by atmWithdraw (e.g. another session withdrew first)
+                        break
+
+                    self.dispenser.take(bills)
 
                     # Output the details
-                    print(f"Number of 20-dollar bills: {num_20_bills}")
-                    print(f"Number of 10-dollar bills: {num_10_bills}")
-                    print(f"Number of 5-dollar bills: {num_5_bills}")
+                    for denomination, count in bills.items():
+                        print(f"Number of {denomination}-dollar bills: {count}")
                     print(f"New balance: ${new_balance / 100:.2f}")
                     break
 
@@ -738,7 +5027,7 @@ class BankManager:
             coins = BankUtility.promptUserForString("Enter coin change to deposit (e.g. QPDNNDXHW): ")
             cents = CoinCollector.parseChange(coins)
             if cents > 0:
-                newBalance = account.deposit(cents)
+                newBalance = self.bank.deposit(account, cents, "coinDeposit")
                 print(f"${cents / 100:.2f} in coins deposited into account {account.accountNumber}")
                 print(f"New balance: ${newBalance / 100:.2f}")
             else:
@@ -758,15 +5047,99 @@ class BankManager:
         Add monthly interest to all accounts in the bank based on an annual interest rate provided by the user.
         """
         annualRate = BankUtility.promptUserForPositiveNumber("Enter annual interest rate (e.g. 2.75): ")
-        monthlyRate = annualRate / 12 / 100
-        for account in self.bank.accounts:
-            if account:
-                interest = int(account.getBalance() * monthlyRate)
-                account.deposit(interest)
-                print(f"Deposited interest: ${interest / 100:.2f} into account number: {account.accountNumber}, new balance: ${account.getBalance() / 100:.2f}")
+        count = 0
 
-if __name__ == "__main__":
+        def posted(kind, account, amount):
+            # The bank reports each account it credits; other changes cannot happen during the posting.
+            nonlocal count
+            if kind != "interest":
+                return
+            count += 1
+            if self.report is not None:
+                self.report.interestPosting(account, amount)
+            else:
+                print(f"Deposited interest: ${amount / 100:.2f} into account number: {account.accountNumber}, new balance: ${account.getBalance() / 100:.2f}")
+
+        self.bank.addListener(posted)
+        try:
+            total = self.bank.addMonthlyInterest(annualRate)
+        finally:
+            self.bank.removeListener(posted)
+        if self.report is not None:
+            self.report.flush()
+        if total is None:
+            print("Interest posted; each account is credited the next time it is used.")
+        elif self.report is not None:
+            print(f"Deposited interest: ${ReportWriter.dollars(total)} into {count} accounts (see the report for details).")
+
+def main(argv=None):
+    """
+    Run the console bank management system, replay a request script with --script, or run the doctests with
+    --self-test.
+
+    :param argv: The command-line arguments. If not provided, sys.argv is used.
+    :return: The exit status of --self-test (1 if a doctest failed), otherwise None.
+    """
+    import argparse
     import doctest
-    doctest.testmod()
-    manager = BankManager()
-    manager.main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Console bank management system.")
+    parser.add_argument("--data-dir", help="Directory for the durable journal and snapshots. If omitted, accounts are kept in memory only.")
+    parser.add_argument("--sqlite", help="Keep accounts in this SQLite database instead of in memory (for books larger than memory).")
+    parser.add_argument("--script", help="Run the requests in this file ('-' for stdin) instead of the menu, writing one JSON result per line (see bank_server.py for the request format).")
+    parser.add_argument("--output", help="File for the --script results. Defaults to stdout.")
+    parser.add_argument("--report", help="Write interest postings to this file ('-' for stdout) instead of printing a line per account.")
+    parser.add_argument("--report-format", choices=ReportWriter.FORMATS, default="csv", help="Format of the --report file.")
+    parser.add_argument("--metrics", help="Record latency and outcome metrics and write them to this file on exit (JSON if it ends in .json, Prometheus text otherwise).")
+    parser.add_argument("--self-test", action="store_true", help="Run the doctests and exit instead of starting the menu.")
+    args = parser.parse_args(argv)
+    if args.self_test:
+        failed, _ = doctest.testmod(sys.modules[__name__])
+        return 1 if failed else 0
+    metrics = None
+    if args.metrics:
+        metrics = Metrics()
+        metrics.enable()
+    journal = None
+    if args.sqlite:
+        bank = SQLiteBank(args.sqlite)
+    elif args.data_dir:
+        bank, journal = BankJournal.open(args.data_dir)
+        bank.allocator = AccountNumberAllocator(os.path.join(args.data_dir, "allocator.json"))
+    else:
+        bank = Bank()
+    try:
+        if args.script:
+            from bank_server import BankServer
+            script = sys.stdin if args.script == "-" else open(args.script)
+            output = sys.stdout if args.output is None else open(args.output, "w", buffering=1 << 20)
+            succeeded, failed = BankServer(bank).replay(script, output)
+            if script is not sys.stdin:
+                script.close()
+            if output is not sys.stdout:
+                output.close()
+            print(f"{succeeded} requests succeeded, {failed} failed.", file=sys.stderr)
+        else:
+            report = None
+            if args.report:
+                reportFile = sys.stdout if args.report == "-" else open(args.report, "w", buffering=1 << 20)
+                report = ReportWriter(reportFile, args.report_format)
+            try:
+                BankManager(bank, report=report).main()
+            finally:
+                if report:
+                    report.close()
+                    if reportFile is not sys.stdout:
+                        reportFile.close()
+    finally:
+        if journal:
+            journal.close()
+        if args.sqlite:
+            bank.close()
+        if metrics:
+            metrics.write(args.metrics)
+
+if __name__ == "__main__":
+    # Run against the importable module rather than __main__, so that bank_server (imported for --script) and
+    # the metrics wrappers share one copy of every class.
+    import bank_management_system
+    sys.exit(bank_management_system.main())
@@ -0,0 +1,501 @@
+"""
+An asyncio TCP front-end that serves the BankManager operations to many concurrent ATM/teller sessions.
+
+The protocol is line-delimited JSON over TCP. Each request is one JSON object on one line with an "op" field and
+an optional "id" that is echoed back; each response is one JSON object on one line with "ok" set to true or
+false, and "error" set on failure. Amounts are whole cents, except "dollars" for ATM withdrawals.
+
+    {"id": 1, "op": "open", "firstName": "John", "lastName": "Doe", "ssn": "999123456"}
+    {"id": 1, "ok": true, "account": 12345678, "pin": "0421"}
+    {"id": 2, "op": "deposit", "account": 12345678, "pin": "0421", "amount": 2500}
+    {"id": 2, "ok": true, "balance": 2500}
+
+Operations: open, info, changePIN, deposit, transfer, withdraw, atmWithdraw, depositChange, close and
+monthlyInterest. Money movements may carry an idempotency "key": a retry with the same key and account gets the
+first response (marked "replayed") instead of moving the money again. Requests on one connection are answered in order. The event loop runs every operation to
+completion before taking the next, so the bank needs no locks.
+
+The same requests can be replayed from a file without a network, one per line, either as JSON or as text such
+as "deposit account=12345678 pin=0421 amount=2500" (see BankServer.replay and the --script option of
+bank_management_system.py).
+
+Usage:
+    python bank_server.py [--host 127.0.0.1] [--port 8765] [--data-dir DIR]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+
+from bank_management_system import (Account, AccountNumberAllocator, Bank, BankJournal, CashDispenser, CoinCollector,
+                                     IdempotencyCache)
+
+class BankServer:
+    """
+    A class that serves a Bank over line-delimited JSON. Concurrent sessions are capped by maxSessions; sessions
+    over the cap wait for a free one. Every response is written with drain(), so a slow client stops being read
+    until it catches up. A session is dropped if it sends nothing for idleTimeout seconds or cannot finish a
+    request (read, handle and write the response) within requestTimeout seconds.
+    """
+
+    MAX_LINE = 64 * 1024  # Longest request line accepted, in bytes.
+    IDEMPOTENT_OPS = ("deposit", "transfer", "withdraw", "atmWithdraw", "depositChange")
+
+    def __init__(self, bank, host="127.0.0.1", port=8765, maxSessions=10000, requestTimeout=5.0, idleTimeout=300.0,
+                 dispenser=None, idempotencyCache=None, journal=None):
+        """
+        Initialize the server.
+
+        :param bank: The bank to serve.
+        :param host: The address to listen on.
+        :param port: The port to listen on. 0 picks a free port.
+        :param maxSessions: The maximum number of sessions served at once.
+        :param requestTimeout: Seconds allowed for one request, from its first byte to its response.
+        :param idleTimeout: Seconds a session may wait between requests.
+        :param dispenser: Optional CashDispenser for ATM withdrawals. Defaults to unlimited $20, $10 and $5 notes.
+        :param idempotencyCache: Optional IdempotencyCache for requests that carry a "key". Defaults to one
+                                 remembering 100000 keys for an hour.
+        :param journal: Optional BankJournal of the bank, opened with inlineCommit=False. Full groups of records
+                        are then synced, and automatic snapshots written, in an executor, so the event loop never
+                        waits on fsync.
+        """
+        self.bank = bank
+        self.journal = journal
+        self.idempotencyCache = idempotencyCache if idempotencyCache is not None else IdempotencyCache()
+        self.dispenser = dispenser if dispenser is not None else CashDispenser()
+        self.host = host
+        self.port = port
+        self.requestTimeout = requestTimeout
+        self.idleTimeout = idleTimeout
+        self.sessions = asyncio.Semaphore(maxSessions)
+        self.server = None
+        self.handlers = {
+            "open": self.openAccount,
+            "info": self.getAccountInformation,
+            "changePIN": self.changePIN,
+            "deposit": self.depositMoney,
+            "transfer": self.transferMoney,
+            "withdraw": self.withdrawMoney,
+            "atmWithdraw": self.atmWithdrawal,
+            "depositChange": self.depositChange,
+            "close": self.closeAccount,
+            "monthlyInterest": self.addMonthlyInterest,
+        }
+
+    async def start(self):
+        """
+        Start listening. The bound port is stored in self.port.
+        """
+        self.server = await asyncio.start_server(self.serveSession, self.host, self.port, limit=self.MAX_LINE,
+                                                 backlog=4096)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """
+        Stop listening and wait for the listening socket to close.
+        """
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def serveSession(self, reader, writer):
+        """
+        Serve one connection until the client disconnects or times out.
+        """
+        async with self.sessions:
+            try:
+                while True:
+                    first = await asyncio.wait_for(reader.read(1), self.idleTimeout)
+                    if not first:
+                        break
+                    await asyncio.wait_for(self.serveRequest(first, reader, writer), self.requestTimeout)
+            except (asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+    async def serveRequest(self, first, reader, writer):
+        """
+        Read the rest of one request line, handle it and write the response.
+        """
+        line = first + await reader.readline()
+        response = self.handle(line)
+        if self.journal is not None:
+            loop = asyncio.get_running_loop()
+            if self.journal.commitDue():
+                await loop.run_in_executor(None, self.journal.sync)
+            if self.journal.snapshotDue():
+                # Only the account fields are copied here; encoding and fsync run in the executor.
+                await loop.run_in_executor(None, self.journal.writeSnapshot, self.journal.captureSnapshot())
+        writer.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+        await writer.drain()
+
+    def handle(self, line):
+        """
+        Handle one request line.
+
+        :param line: The raw request line.
+        :return: The response dict.
+
+        >>> server = BankServer(Bank())
+        >>> opened = server.handle(b'{"id": 7, "op": "open", "firstName": "John", "lastName": "Doe", "ssn": "999123456"}')
+        >>> opened["id"], opened["ok"]
+        (7, True)
+        >>> credentials = {"account": opened["account"], "pin": opened["pin"]}
+        >>> server.handle(json.dumps(dict(credentials, op="deposit", amount=5000)).encode())
+        {'ok': True, 'balance': 5000}
+        >>> server.handle(json.dumps(dict(credentials, op="atmWithdraw", dollars=35)).encode())
+        {'ok': True, 'bills': {'20': 1, '10': 1, '5': 1}, 'balance': 1250}
+        >>> server.handle(json.dumps(dict(credentials, op="withdraw", amount=5000)).encode())  # doctest: +ELLIPSIS
+        {'ok': False, 'error': 'Insufficient funds in account ...'}
+        >>> retry = json.dumps(dict(credentials, op="deposit", amount=100, key="atm-7-0001")).encode()
+        >>> server.handle(retry), server.handle(retry)
+        ({'ok': True, 'balance': 1350}, {'ok': True, 'balance': 1350, 'replayed': True})
+        >>> server.handle(b'not json')
+        {'ok': False, 'error': 'Request must be a JSON object.'}
+        >>> server.handle(b'{"op": ["deposit"]}')  # Edge case: an unhashable operation
+        {'ok': False, 'error': "Malformed request: unhashable type: 'list'."}
+        >>> server.handlers["info"] = lambda request: 1 / 0  # An unexpected failure in a handler
+        >>> server.handle(b'{"id": 8, "op": "info"}')
+        {'id': 8, 'ok': False, 'error': 'Request failed: ZeroDivisionError.'}
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "Request must be a JSON object."}
+        return self.dispatch(request)
+
+    def dispatch(self, request):
+        """
+        Handle one parsed request.
+
+        :param request: The request dict.
+        :return: The response dict.
+        """
+        try:
+            handler = self.handlers.get(request.get("op"))
+            if handler is None:
+                response = {"ok": False, "error": f"Unknown operation: {request.get('op')}."}
+            elif "key" in request and request["op"] in self.IDEMPOTENT_OPS:
+                # A retried request with the same key gets the first response instead of being applied again.
+                fingerprint = sorted((field, str(value)) for field, value in request.items() if field != "id")
+                response, replayed = self.idempotencyCache.run((request.get("account"), request["key"]), fingerprint,
+                                                               handler, request)
+                if replayed:
+                    response = {**response, "replayed": True}
+            else:
+                response = handler(request)
+        except (KeyError, TypeError, ValueError) as error:
+            response = {"ok": False, "error": f"Malformed request: {error}."}
+        except Exception as error:  # Any other failure is answered too, so the session survives it.
+            response = {"ok": False, "error": f"Request failed: {type(error).__name__}."}
+        if "id" in request:
+            response = {"id": request["id"], **response}
+        return response
+
+    TEXT_STRING_FIELDS = ("pin", "newPin", "ssn", "firstName", "lastName", "coins")
+
+    def parseTextRequest(self, line):
+        """
+        Parse a request written as text: the operation followed by field=value pairs. Values of numeric fields
+        are read as integers, except "rate", which may have a fraction.
+
+        :param line: The request line, e.g. "deposit account=12345678 pin=0421 amount=2500".
+        :return: The request dict.
+
+        >>> BankServer(Bank()).parseTextRequest("transfer account=12345678 pin=0421 to=87654321 amount=100")
+        {'op': 'transfer', 'account': 12345678, 'pin': '0421', 'to': 87654321, 'amount': 100}
+        """
+        op, *fields = line.split()
+        request = {"op": op}
+        for field in fields:
+            name, _, value = field.partition("=")
+            if name == "rate":
+                request[name] = float(value)
+            elif name in self.TEXT_STRING_FIELDS or not value.lstrip("-").isdigit():
+                request[name] = value
+            else:
+                request[name] = int(value)
+        return request
+
+    def replay(self, lines, output, bufferLines=1024):
+        """
+        Run a script of requests without a network, menu or prompts, writing one JSON response per request.
+        Each line is a JSON request, as on the wire, or the same request as text (see parseTextRequest). Blank
+        lines and lines starting with "#" are skipped. Responses are written in blocks of bufferLines lines.
+
+        :param lines: An iterable of request lines, e.g. an open file.
+        :param output: A text file to write the responses to.
+        :param bufferLines: The number of responses buffered between writes.
+        :return: A (succeeded, failed) tuple of request counts.
+
+        >>> import io
+        >>> output = io.StringIO()
+        >>> server = BankServer(Bank())
+        >>> server.replay(["# Replay", '{"op": "open", "firstName": "John", "lastName": "Doe", "ssn": "999123456"}',
+        ...                "deposit account=1 pin=0000 amount=5"], output)
+        (1, 1)
+        >>> print(output.getvalue().split("\\n")[1])
+        {"ok":false,"error":"Account not found for account number: 1."}
+        """
+        succeeded = failed = 0
+        buffer = []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                response = self.handle(line)
+            else:
+                try:
+                    response = self.dispatch(self.parseTextRequest(line))
+                except ValueError as error:
+                    response = {"ok": False, "error": f"Malformed request: {error}."}
+            if response["ok"]:
+                succeeded += 1
+            else:
+                failed += 1
+            buffer.append(json.dumps(response, separators=(",", ":")) + "\n")
+            if len(buffer) >= bufferLines:
+                output.writelines(buffer)
+                buffer.clear()
+        output.writelines(buffer)
+        output.flush()
+        return succeeded, failed
+
+    def authenticate(self, request):
+        """
+        Find the account named by a request and check its PIN.
+
+        :return: The account, or an error response dict.
+        """
+        account = self.bank.findAccount(int(request["account"]))
+        if account is None:
+            return {"ok": False, "error": f"Account not found for account number: {request['account']}."}
+        if not account.isValidPIN(str(request["pin"])):
+            return {"ok": False, "error": "Invalid PIN."}
+        return account
+
+    @staticmethod
+    def positiveCents(request, field="amount"):
+        """
+        Read a positive whole number of cents from a request.
+        """
+        amount = request[field]
+        if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+            raise ValueError(f"{field} must be a positive whole number of cents")
+        return amount
+
+    def openAccount(self, request):
+        """
+        Handle an "open" request: open an account and return its number and PIN.
+        """
+        ssn = str(request["ssn"])
+        if len(ssn) != 9 or not ssn.isdigit():
+            return {"ok": False, "error": "Social Security Number must be 9 digits."}
+        account = Account(str(request["firstName"]), str(request["lastName"]), ssn,
+                          accountNumber=self.bank.newAccountNumber())
+        self.bank.addAccountToBank(account)
+        return {"ok": True, "account": account.accountNumber, "pin": account.getPIN()}
+
+    def getAccountInformation(self, request):
+        """
+        Handle an "info" request: return the account details with the SSN masked.
+        """
+        account = self.authenticate(request)
+        if isinstance(account, dict):
+            return account
+        return {"ok": True, "account": account.accountNumber, "firstName": account.getOwnerFirstName(),
+                "lastName": account.getOwnerLastName(), "ssn": f"XXX-XX-{account.getSocialSecurityNumber()[-4:]}",
+                "balance": account.getBalance()}
+
+    def changePIN(self, request):
+        """
+        Handle a "changePIN" request.
+        """
+        account = self.authenticate(request)
+        if isinstance(account, dict):
+            return account
+        newPin = str(request["newPin"])
+        if len(newPin) != 4 or not newPin.isdigit():
+            return {"ok": False, "error": "PIN must be 4 digits."}
+        account.setPIN(newPin)
+        return {"ok": True}
+
+    def depositMoney(self, request):
+        """
+        Handle a "deposit" request.
+        """
+        account = self.authenticate(request)
+        if isinstance(account, dict):
+            return account
+        return {"ok": True, "balance": self.bank.deposit(account, self.positiveCents(request))}
+
+    def transferMoney(self, request):
+        """
+        Handle a "transfer" request to the account number in "to".
+        """
+        account = self.authenticate(request)
+        if isinstance(account, dict):
+            return account
+        amount = self.positiveCents(request)
+        toAccount = self.bank.findAccount(int(request["to"]))
+        if toAccount is None:
+            return {"ok": False, "error": f"Account not found for account number: {request['to']}."}
+        if account.getBalance() < amount:
+            return {"ok": False, "error": f"Insufficient funds in account {account.accountNumber}"}
+        balances = self.bank.transfer(account, toAccount, amount)
+        if balances is None:
+            return {"ok": False, "error": f"Insufficient funds in account {account.accountNumber}"}
+        fromBalance, toBalance = balances
+        return {"ok": True, "balance": fromBalance, "toBalance": toBalance}
+
+    def withdrawMoney(self, request):
+        """
+        Handle a "withdraw" request.
+        """
+        account = self.authenticate(request)
+        if isinstance(account, dict):
+            return account
+        amount = self.positiveCents(request)
+        if account.getBalance() < amount:
+            return {"ok": False, "error": f"Insufficient funds in account {account.accountNumber}"}
+        refusal = self.bank.velocityLimits.check(account, amount) if self.bank.velocityLimits is not None else None
+        if refusal is not None:
+            return {"ok": False, "error": refusal}
+        return {"ok": True, "balance": self.bank.withdraw(account, amount)}
+
+    def atmWithdrawal(self, request):
+        """
+        Handle an "atmWithdraw" request for whole dollars up to the dispenser's limit, returning the bills dispensed.
+        """
+        account = self.authenticate(request)
+        if isinstance(account, dict):
+            return account
+        dollars = request["dollars"]
+        if not isinstance(dollars, int) or isinstance(dollars, bool) or dollars <= 0 or dollars > self.dispenser.limit or dollars % self.dispenser.unit:
+            return {"ok": False, "error": "Invalid amount."}
+        if account.getBalance() < dollars * 100 + account.ATM_WITHDRAWAL_FEE:
+            return {"ok": False, "error": f"Insufficient funds in account {account.accountNumber}"}
+        refusal = self.bank.velocityLimits.check(account, dollars * 100) if self.bank.velocityLimits is not None else None
+        if refusal is not None:
+            return {"ok": False, "error": refusal}
+        bills = self.dispenser.plan(dollars)
+        if bills is None:
+            return {"ok": False, "error": "This ATM cannot dispense that amount right now."}
+        balance = self.bank.atmWithdraw(account, dollars * 100)
+        self.dispenser.take(bills)
+        return {"ok": True, "bills": {str(denomination): count for denomination, count in bills.items()}, "balance": balance}
+
+    def depositChange(self, request):
+        """
+        Handle a "depositChange" request for a coin string such as "QPDNNDHW".
+        """
+        account = self.authenticate(request)
+        if isinstance(account, dict):
+            return account
+        coins = str(request["coins"])
+        valid = sum(coins.upper().count(coin) for coin in "PNDQHW")
+        if valid != len(coins):
+            return {"ok": False, "error": "Invalid coin in deposit."}
+        cents = CoinCollector.parseChange(coins)
+        if cents <= 0:
+            return {"ok": False, "error": "No valid coins were entered."}
+        return {"ok": True, "deposited": cents, "balance": self.bank.deposit(account, cents, "coinDeposit")}
+
+    def closeAccount(self, request):
+        """
+        Handle a "close" request.
+        """
+        account = self.authenticate(request)
+        if isinstance(account, dict):
+            return account
+        self.bank.removeAccountFromBank(account)
+        return {"ok": True}
+
+    def addMonthlyInterest(self, request):
+        """
+        Handle a "monthlyInterest" request for an annual rate in percent.
+        """
+        rate = float(request["rate"])
+        if rate <= 0:
+            return {"ok": False, "error": "Rate must be positive."}
+        return {"ok": True, "interest": self.bank.addMonthlyInterest(rate)}
+
+class BankClient:
+    """
+    A minimal asyncio client for BankServer. Requests are sent one at a time and matched to responses in order.
+    """
+
+    def __init__(self, reader, writer):
+        """
+        Initialize a client over an open connection. Use BankClient.connect to open one.
+        """
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765):
+        """
+        Open a session with a server.
+
+        :return: The connected client.
+        """
+        reader, writer = await asyncio.open_connection(host, port, limit=BankServer.MAX_LINE)
+        return cls(reader, writer)
+
+    async def request(self, op, **fields):
+        """
+        Send one request and wait for its response.
+
+        :param op: The operation name.
+        :param fields: The request fields.
+        :return: The response dict.
+        """
+        self.writer.write(json.dumps({"op": op, **fields}, separators=(",", ":")).encode() + b"\n")
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Server closed the session.")
+        return json.loads(line)
+
+    async def close(self):
+        """
+        End the session.
+        """
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def serve(args):
+    """
+    Run a server until interrupted.
+    """
+    journal = None
+    if args.data_dir:
+        bank, journal = BankJournal.open(args.data_dir, inlineCommit=False)
+        bank.allocator = AccountNumberAllocator(os.path.join(args.data_dir, "allocator.json"))
+    else:
+        bank = Bank()
+    server = BankServer(bank, args.host, args.port, maxSessions=args.max_sessions, requestTimeout=args.request_timeout,
+                        journal=journal)
+    await server.start()
+    print(f"Serving on {server.host}:{server.port}")
+    try:
+        await server.server.serve_forever()
+    finally:
+        if journal:
+            journal.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the bank over line-delimited JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--request-timeout", type=float, default=5.0)
+    parser.add_argument("--data-dir", help="Directory for the durable journal and snapshots.")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
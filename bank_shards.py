@@ -0,0 +1,379 @@
+"""
+A sharded deployment of the bank across worker processes, so transaction throughput scales with cores.
+
+Accounts are partitioned by account number: account n lives on shard n % shardCount. Each shard is a worker
+process that owns an ordinary Bank. A ShardedBank router in the calling process sends each operation to the
+shard that owns the account. Operations are submitted in batches: the router splits a batch by shard, sends every
+shard its part at once and collects the replies, so all shards work in parallel.
+
+Transfers between accounts on different shards use two-phase commit. In the prepare phase the source shard
+debits the amount into a hold (so it cannot be spent twice) and the target shard checks that the account
+exists. If both shards vote yes, the commit phase releases the hold and credits the target; otherwise the
+abort phase returns the hold to the source. Money is never created or lost, whichever shard votes no.
+"""
+
+import multiprocessing
+import os
+
+from bank_management_system import Account, AccountNumberAllocator, Bank
+
+class Shard:
+    """
+    A class that applies operations to one shard's Bank inside a worker process. Every operation returns a
+    result dict instead of printing.
+    """
+
+    OPERATIONS = ("open", "commit", "abort", "balance", "info", "close", "deposit", "withdraw", "atmWithdraw",
+                  "transfer", "prepareDebit", "prepareCredit")
+
+    def __init__(self):
+        """
+        Initialize an empty shard.
+        """
+        self.bank = Bank()
+        self.holds = {}  # Prepared cross-shard transfer legs: transaction id -> (kind, account number, amount).
+        self.heldAccounts = {}  # Account number -> number of prepared legs on it; such accounts cannot be closed.
+
+    def apply(self, operation):
+        """
+        Apply one operation.
+
+        :param operation: An operation tuple whose first item names the operation.
+        :return: A result dict {"ok": bool, "reason": str or None, "balance": int or None, ...}.
+
+        >>> shard = Shard()
+        >>> shard.apply(("open", 11111111, "John", "Doe", "999123456", "1234"))["ok"]
+        True
+        >>> shard.apply(("deposit", 11111111, 1000))
+        {'ok': True, 'reason': None, 'balance': 1000}
+        >>> shard.apply(("prepareDebit", 1, 11111111, 400))
+        {'ok': True, 'reason': None, 'balance': 600}
+        >>> shard.apply(("abort", 1))
+        {'ok': True, 'reason': None, 'balance': 1000}
+        >>> shard.apply(("prepareCredit", 2, 11111111, 400))
+        {'ok': True, 'reason': None, 'balance': 1000}
+        >>> shard.apply(("close", 11111111))  # The credit still has to land on the account
+        {'ok': False, 'reason': 'Account has a pending transfer', 'balance': 1000}
+        >>> shard.apply(("commit", 2))
+        {'ok': True, 'reason': None, 'balance': 1400}
+        >>> shard.apply(("withdraw", 11111111, 5000))
+        {'ok': False, 'reason': 'Insufficient funds', 'balance': 1400}
+        >>> shard.apply(("depositt", 11111111, 400))  # A misspelt operation moves no money
+        {'ok': False, 'reason': 'Unknown operation', 'balance': None}
+        >>> shard.apply(("balance", 11111111))
+        {'ok': True, 'reason': None, 'balance': 1400}
+        """
+        kind = operation[0]
+        if kind not in self.OPERATIONS:
+            return self.failure("Unknown operation")
+        if kind == "open":
+            _, number, firstName, lastName, ssn, pin = operation
+            if self.bank.findAccount(number) is not None:
+                return self.failure("Account number in use")
+            account = Account(firstName, lastName, ssn, accountNumber=number)
+            account.setPIN(pin)
+            self.bank.addAccountToBank(account)
+            return self.success(account)
+        if kind in ("commit", "abort"):
+            return self.finish(kind, operation[1])
+        if kind in ("prepareDebit", "prepareCredit"):
+            _, transaction, number, amount = operation
+        else:
+            number = operation[1]
+        account = self.bank.findAccount(number)
+        if account is None:
+            return self.failure("Account not found")
+        if kind == "balance":
+            return self.success(account)
+        if kind == "info":
+            result = self.success(account)
+            result.update(firstName=account.getOwnerFirstName(), lastName=account.getOwnerLastName(),
+                          ssn=account.getSocialSecurityNumber(), pin=account.getPIN())
+            return result
+        if kind == "close":
+            if number in self.heldAccounts:
+                return self.failure("Account has a pending transfer", account)
+            self.bank.removeAccountFromBank(account)
+            return self.success(account)
+        if kind == "transfer":
+            amount = operation[3]
+        elif kind not in ("prepareDebit", "prepareCredit"):
+            amount = operation[2]
+        if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+            return self.failure("Amount must be a positive number of cents", account)
+        if kind == "deposit":
+            self.bank.deposit(account, amount)
+        elif kind == "prepareCredit":
+            self._hold(transaction, "credit", number, amount)
+        else:
+            charge = amount + account.ATM_WITHDRAWAL_FEE if kind == "atmWithdraw" else amount
+            if account.getBalance() < charge:
+                return self.failure("Insufficient funds", account)
+            if kind == "atmWithdraw":
+                self.bank.atmWithdraw(account, amount)
+            elif kind == "transfer":
+                toAccount = self.bank.findAccount(operation[2])
+                if toAccount is None:
+                    return self.failure("Account not found", account)
+                self.bank.transfer(account, toAccount, amount)
+            else:
+                self.bank.withdraw(account, amount)
+                if kind == "prepareDebit":
+                    self._hold(transaction, "debit", number, amount)
+        return self.success(account)
+
+    def _hold(self, transaction, leg, number, amount):
+        """
+        Record a prepared transfer leg on an account.
+        """
+        self.holds[transaction] = (leg, number, amount)
+        self.heldAccounts[number] = self.heldAccounts.get(number, 0) + 1
+
+    def finish(self, kind, transaction):
+        """
+        Commit or abort a prepared transfer leg.
+
+        :param kind: "commit" or "abort".
+        :param transaction: The transaction id given at prepare time.
+        :return: A result dict.
+        """
+        hold = self.holds.pop(transaction, None)
+        if hold is None:
+            return self.failure("Unknown transaction")
+        leg, number, amount = hold
+        if self.heldAccounts[number] == 1:
+            del self.heldAccounts[number]
+        else:
+            self.heldAccounts[number] -= 1
+        account = self.bank.findAccount(number)  # Cannot be closed while held; looked up again to be safe.
+        if account is None:
+            return self.failure("Account not found")
+        if (leg == "credit") == (kind == "commit"):
+            # A committed credit lands on the target; an aborted debit returns to the source.
+            self.bank.deposit(account, amount)
+        return self.success(account)
+
+    @staticmethod
+    def success(account):
+        """
+        Build the result of a successful operation.
+        """
+        return {"ok": True, "reason": None, "balance": account.getBalance()}
+
+    @staticmethod
+    def failure(reason, account=None):
+        """
+        Build the result of a refused operation.
+        """
+        return {"ok": False, "reason": reason, "balance": account.getBalance() if account is not None else None}
+
+    def serve(self, connection):
+        """
+        Answer requests from the router until it sends None. Requests are ("batch", operations),
+        ("interest", annualRate) and ("summary",).
+        """
+        while True:
+            request = connection.recv()
+            if request is None:
+                break
+            if request[0] == "batch":
+                replies = []
+                for operation in request[1]:
+                    try:
+                        replies.append(self.apply(operation))
+                    except Exception as error:  # A bad operation must not kill the worker the router waits on.
+                        replies.append(self.failure(f"Operation failed: {type(error).__name__}"))
+                connection.send(replies)
+            elif request[0] == "interest":
+                connection.send(self.bank.addMonthlyInterest(request[1]))
+            else:
+                connection.send((len(self.bank), sum(account.getBalance() for account in self.bank), len(self.holds)))
+
+def _runShard(connection):
+    """
+    Entry point of a shard worker process.
+    """
+    Shard().serve(connection)
+
+class ShardedBank:
+    """
+    A router that spreads accounts across shard worker processes by account number.
+
+    >>> bank = ShardedBank(shards=3)
+    >>> numbers = [bank.openAccount("John", "Doe", "999123456")[0] for _ in range(6)]
+    >>> [result["ok"] for result in bank.applyMany([("deposit", number, 10000) for number in numbers])]
+    [True, True, True, True, True, True]
+    >>> results = bank.applyMany([("transfer", numbers[0], numbers[1], 2500),
+    ...                           ("transfer", numbers[2], numbers[3], 20000),
+    ...                           ("transfer", numbers[4], 99999999, 100)])
+    >>> [(result["ok"], result["reason"]) for result in results]
+    [(True, None), (False, 'Insufficient funds'), (False, 'Account not found')]
+    >>> bank.getBalance(numbers[0]), bank.getBalance(numbers[1]), bank.getBalance(numbers[4])
+    (7500, 12500, 10000)
+    >>> bank.addMonthlyInterest(12)
+    600
+    >>> bank.summary()  # (accounts, total balance, open holds): money is neither created nor lost
+    (6, 60600, 0)
+    >>> other = next(number for number in numbers if bank.shardOf(number) != bank.shardOf(numbers[0]))
+    >>> results = bank.applyMany([("transfer", numbers[0], other, 500), ("close", other)])
+    >>> [result["reason"] for result in results]  # The credit is still pending when the close is applied
+    [None, 'Account has a pending transfer']
+    >>> bank.summary()
+    (6, 60600, 0)
+    >>> bank.close()
+    """
+
+    def __init__(self, shards=None, allocator=None):
+        """
+        Start the shard worker processes.
+
+        :param shards: The number of shards. Defaults to the number of CPUs.
+        :param allocator: Optional AccountNumberAllocator for openAccount. If not provided, an in-memory one is used.
+        """
+        self.allocator = allocator if allocator is not None else AccountNumberAllocator()
+        self.shardCount = shards or os.cpu_count() or 1
+        self.connections = []
+        self.processes = []
+        for _ in range(self.shardCount):
+            parentEnd, childEnd = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_runShard, args=(childEnd,), daemon=True)
+            process.start()
+            childEnd.close()
+            self.connections.append(parentEnd)
+            self.processes.append(process)
+        self.nextTransaction = 0
+
+    def shardOf(self, accountNumber):
+        """
+        Get the shard that owns an account number.
+        """
+        return accountNumber % self.shardCount
+
+    def _broadcast(self, requests):
+        """
+        Send one request to each shard (None to skip a shard), then collect the replies.
+
+        :param requests: A list with one request per shard.
+        :return: A list with one reply per shard (None for skipped shards).
+        """
+        for connection, request in zip(self.connections, requests):
+            if request is not None:
+                connection.send(request)
+        return [connection.recv() if request is not None else None
+                for connection, request in zip(self.connections, requests)]
+
+    def applyMany(self, operations):
+        """
+        Apply a list of operations, each independently, in parallel across shards. Operations on the same shard
+        are applied in the order given. A transfer between shards only credits its target after the whole batch
+        has been applied, so later operations in the same batch do not see the credit, and closing the target in
+        the same batch is refused.
+
+        Supported operations: ("deposit" | "withdraw" | "atmWithdraw", accountNumber, amount),
+        ("transfer", fromAccountNumber, toAccountNumber, amount), ("balance" | "info" | "close", accountNumber) and
+        ("open", accountNumber, firstName, lastName, ssn, pin).
+
+        :param operations: The operations to apply.
+        :return: A list with one result dict per operation: {"ok": bool, "reason": str or None, "balance": the
+                 account's (or transfer source's) resulting balance, or None}.
+        """
+        batches = [[] for _ in range(self.shardCount)]
+        routes = [[] for _ in range(self.shardCount)]  # Which operation each batch entry answers, and how.
+        transactions = {}
+        for index, operation in enumerate(operations):
+            shard = self.shardOf(operation[1])
+            if operation[0] == "transfer" and self.shardOf(operation[2]) != shard:
+                _, fromNumber, toNumber, amount = operation
+                self.nextTransaction += 1
+                transaction = self.nextTransaction
+                transactions[transaction] = [index, fromNumber, toNumber, None, None]
+                batches[shard].append(("prepareDebit", transaction, fromNumber, amount))
+                routes[shard].append((transaction, 3))
+                target = self.shardOf(toNumber)
+                batches[target].append(("prepareCredit", transaction, toNumber, amount))
+                routes[target].append((transaction, 4))
+            else:
+                batches[shard].append(operation)
+                routes[shard].append((index, None))
+
+        results = [None] * len(operations)
+        replies = self._broadcast([("batch", batch) if batch else None for batch in batches])
+        for shard, shardReplies in enumerate(replies):
+            for (key, vote), reply in zip(routes[shard], shardReplies or ()):
+                if vote is None:
+                    results[key] = reply
+                else:
+                    transactions[key][vote] = reply
+        if not transactions:
+            return results
+
+        # Phase two: commit the transfers both shards voted for, abort the legs of the others.
+        batches = [[] for _ in range(self.shardCount)]
+        for transaction, (index, fromNumber, toNumber, debit, credit) in transactions.items():
+            decision = "commit" if debit["ok"] and credit["ok"] else "abort"
+            if debit["ok"]:
+                batches[self.shardOf(fromNumber)].append((decision, transaction))
+            if credit["ok"]:
+                batches[self.shardOf(toNumber)].append((decision, transaction))
+            if decision == "commit":
+                results[index] = debit
+            else:
+                failed = debit if not debit["ok"] else credit
+                results[index] = {"ok": False, "reason": failed["reason"], "balance": None}
+        self._broadcast([("batch", batch) if batch else None for batch in batches])
+        return results
+
+    def apply(self, operation):
+        """
+        Apply a single operation. See applyMany.
+
+        :return: The result dict.
+        """
+        return self.applyMany([operation])[0]
+
+    def openAccount(self, firstName, lastName, ssn):
+        """
+        Open an account with a fresh account number and PIN on the shard that owns the number.
+
+        :return: An (accountNumber, pin) tuple.
+        """
+        while True:
+            number = self.allocator.allocate()
+            pin = Account.generate_pin()
+            if self.apply(("open", number, firstName, lastName, ssn, pin))["ok"]:
+                return number, pin
+
+    def getBalance(self, accountNumber):
+        """
+        Get the balance of an account.
+
+        :return: The balance in cents, or None if the account does not exist.
+        """
+        return self.apply(("balance", accountNumber))["balance"]
+
+    def addMonthlyInterest(self, annualInterestRate):
+        """
+        Add monthly interest on every shard in parallel.
+
+        :return: The total interest credited in cents.
+        """
+        return sum(self._broadcast([("interest", annualInterestRate)] * self.shardCount))
+
+    def summary(self):
+        """
+        Get bank-wide figures from every shard.
+
+        :return: An (accounts, total balance in cents, open two-phase holds) tuple.
+        """
+        counts, totals, holds = zip(*self._broadcast([("summary",)] * self.shardCount))
+        return sum(counts), sum(totals), sum(holds)
+
+    def close(self):
+        """
+        Stop the shard worker processes.
+        """
+        for connection in self.connections:
+            connection.send(None)
+            connection.close()
+        for process in self.processes:
+            process.join()
@@ -0,0 +1,91 @@
+"""
+Measure transfer throughput of a ConcurrentBank against the number of threads.
+
+Usage:
+    python benchmarks/contention_benchmark.py [--accounts 10000] [--threads 1,2,4,8,16] [--seconds 2] [--stripes 256]
+
+Each thread performs random transfers between random accounts for the given time. The run is repeated with a
+single stripe (equivalent to one global lock) for comparison, and every run checks that the total balance of
+the bank is unchanged.
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank_management_system import Account, ConcurrentBank
+
+def buildBank(accountCount, stripes):
+    """
+    Build a concurrent bank of accountCount accounts holding $1000 each.
+
+    :param accountCount: The number of accounts.
+    :param stripes: The number of stripe locks.
+    :return: A (bank, accounts) tuple.
+    """
+    bank = ConcurrentBank(stripes=stripes)
+    accounts = []
+    for i in range(accountCount):
+        account = Account("John", "Doe", "999123456", accountNumber=10000000 + i)
+        account.setBalance(100000)
+        bank.addAccountToBank(account)
+        accounts.append(account)
+    return bank, accounts
+
+def run(bank, accounts, threadCount, seconds):
+    """
+    Run random transfers from threadCount threads for the given time.
+
+    :return: The number of transfers completed per second.
+    """
+    stop = threading.Event()
+    counts = [0] * threadCount
+
+    def worker(slot):
+        rng = random.Random(slot)
+        count = 0
+        while not stop.is_set():
+            for _ in range(100):
+                bank.transfer(rng.choice(accounts), rng.choice(accounts), rng.randint(1, 500))
+            count += 100
+        counts[slot] = count
+
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(threadCount)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=10000, help="Number of accounts.")
+    parser.add_argument("--threads", default="1,2,4,8,16", help="Comma-separated thread counts.")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Duration of each run.")
+    parser.add_argument("--stripes", type=int, default=256, help="Number of stripe locks.")
+    args = parser.parse_args()
+
+    print(f"{'stripes':>8}{'threads':>9}{'transfers/s':>14}{'balanced':>10}")
+    for stripes in (args.stripes, 1):
+        for threadCount in (int(count) for count in args.threads.split(",")):
+            bank, accounts = buildBank(args.accounts, stripes)
+            # Silence the "Insufficient funds" lines printed by refused transfers.
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                rate = run(bank, accounts, threadCount, args.seconds)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            balanced = sum(account.getBalance() for account in accounts) == 100000 * args.accounts
+            print(f"{stripes:>8}{threadCount:>9}{rate:>14,.0f}{str(balanced):>10}")
+
+if __name__ == "__main__":
+    main()
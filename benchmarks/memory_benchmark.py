@@ -0,0 +1,104 @@
+"""
+Measure how many bytes each account costs when held in a Bank, for Account and CompactAccount.
+
+Usage:
+    python benchmarks/memory_benchmark.py [--sizes 10000,1000000,10000000] [--classes Account,CompactAccount]
+
+Each measurement runs in a fresh interpreter so that memory freed by an earlier run cannot be reused.
+On Linux the figure is the growth of the resident set size (what a host has to provide); elsewhere it falls
+back to tracemalloc, which only counts Python allocations and is much slower.
+"""
+
+import argparse
+import gc
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank_management_system import Account, Bank, CompactAccount
+
+ACCOUNT_CLASSES = {"Account": Account, "CompactAccount": CompactAccount}
+FIRST_NAMES = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez"]
+
+def residentBytes():
+    """
+    Get the resident set size of this process.
+
+    :return: The RSS in bytes, or None if /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+def buildBank(accountClass, count):
+    """
+    Build a bank holding count accounts of the given class.
+
+    :param accountClass: Account or CompactAccount.
+    :param count: The number of accounts to open.
+    :return: The populated Bank.
+    """
+    bank = Bank()
+    for i in range(count):
+        # Decode the names afresh for every record, as a parser would, so that interning is measured.
+        firstName = FIRST_NAMES[i % len(FIRST_NAMES)].encode().decode()
+        lastName = LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)].encode().decode()
+        account = accountClass(firstName, lastName, f"{random.randint(0, 999999999):09}", accountNumber=10000000 + i)
+        account.setBalance(random.randint(0, 10000000))
+        bank.addAccountToBank(account)
+    return bank
+
+def measure(className, count):
+    """
+    Measure the bytes per account of a bank of count accounts in this process.
+
+    :param className: "Account" or "CompactAccount".
+    :param count: The number of accounts to open.
+    :return: A (bytes per account, build seconds) tuple.
+    """
+    gc.collect()
+    before = residentBytes()
+    if before is None:
+        tracemalloc.start()
+    start = time.perf_counter()
+    bank = buildBank(ACCOUNT_CLASSES[className], count)
+    elapsed = time.perf_counter() - start
+    if before is None:
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    else:
+        gc.collect()
+        used = residentBytes() - before
+    del bank
+    return used / count, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,1000000,10000000", help="Comma-separated book sizes.")
+    parser.add_argument("--classes", default="Account,CompactAccount", help="Comma-separated account classes.")
+    parser.add_argument("--child", nargs=2, metavar=("CLASS", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        bytesPerAccount, elapsed = measure(args.child[0], int(args.child[1]))
+        print(f"{bytesPerAccount} {elapsed}")
+        return
+
+    print(f"{'class':<16}{'accounts':>12}{'bytes/account':>16}{'build s':>10}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        for name in args.classes.split(","):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, str(size)],
+                                    capture_output=True, text=True, check=True).stdout
+            bytesPerAccount, elapsed = (float(value) for value in output.split())
+            print(f"{name:<16}{size:>12,}{bytesPerAccount:>16.1f}{elapsed:>10.2f}")
+
+if __name__ == "__main__":
+    main()
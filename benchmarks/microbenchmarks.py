@@ -0,0 +1,162 @@
+"""
+Microbenchmarks for the hot paths of Bank, Account and CoinCollector at several book sizes.
+
+Usage:
+    python benchmarks/microbenchmarks.py [--sizes 100,10000,1000000] [--output results.json]
+    python benchmarks/microbenchmarks.py --compare baseline.json [--threshold 10] [--output current.json]
+
+Each benchmark is repeated and the fastest repetition is kept, to reduce scheduler noise. Results are written as
+JSON (nanoseconds per operation). With --compare, the run is checked against a saved baseline and every
+benchmark that got slower by more than the threshold is flagged; the exit status is 1 if any was.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank_management_system import Account, Bank, CoinCollector
+
+FIRST_NUMBER = 10000000
+
+def buildBank(size):
+    """
+    Build a bank of size accounts numbered from FIRST_NUMBER, each holding $10,000.
+
+    :return: The bank.
+    """
+    bank = Bank()
+    for i in range(size):
+        account = Account("John", "Doe", "999123456", accountNumber=FIRST_NUMBER + i)
+        account.balance = 1000000
+        bank.addAccountToBank(account)
+    return bank
+
+def timeIt(function, operations, repeat, setup=None):
+    """
+    Time a function that performs a number of operations, keeping the fastest repetition.
+
+    :param setup: Optional untimed function run before each repetition, e.g. to undo the previous one.
+    :return: Nanoseconds per operation.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter_ns()
+        function()
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / operations
+
+def benchmarkSize(size, operations, repeat, rng):
+    """
+    Run every benchmark against a bank of the given size.
+
+    :return: A dict mapping benchmark name to nanoseconds per operation.
+    """
+    bank = buildBank(size)
+    numbers = [FIRST_NUMBER + rng.randrange(size) for _ in range(operations)]
+    accounts = [bank.findAccount(number) for number in numbers]
+    pairs = list(zip(accounts, accounts[1:] + accounts[:1]))
+    newAccounts = [Account("Jane", "Doe", "999123457", accountNumber=FIRST_NUMBER + size + i) for i in range(operations)]
+    results = {}
+
+    def findAccounts():
+        for number in numbers:
+            bank.findAccount(number)
+
+    def addAccounts():
+        for account in newAccounts:
+            bank.addAccountToBank(account)
+
+    def removeAccounts():
+        for account in newAccounts:
+            bank.removeAccountFromBank(account)
+
+    results["Bank.findAccount"] = timeIt(findAccounts, operations, repeat)
+    # Each phase is timed on its own; the other one runs untimed between repetitions to reset the bank.
+    removeTime = timeIt(removeAccounts, operations, repeat, setup=addAccounts)
+    results["Bank.addAccountToBank"] = timeIt(addAccounts, operations, repeat, setup=removeAccounts)
+    results["Bank.removeAccountFromBank"] = removeTime
+    removeAccounts()
+    results["Bank.addMonthlyInterest (per account)"] = timeIt(lambda: bank.addMonthlyInterest(0.01), size, repeat)
+    results["Account.deposit"] = timeIt(lambda: [account.deposit(1) for account in accounts], operations, repeat)
+    results["Account.withdraw"] = timeIt(lambda: [account.withdraw(1) for account in accounts], operations, repeat)
+    results["Account.atmWithdraw"] = timeIt(lambda: [account.atmWithdraw(5) for account in accounts], operations, repeat)
+    results["Bank.transfer"] = timeIt(lambda: [bank.transfer(source, target, 1) for source, target in pairs], operations, repeat)
+    return results
+
+def benchmarkCoins(operations, repeat, rng):
+    """
+    Time CoinCollector.parseChange on 40-coin strings, with one invalid coin each so the print path is included.
+
+    :return: A dict mapping benchmark name to nanoseconds per operation.
+    """
+    coins = ["".join(rng.choice("PNDQHW") for _ in range(39)) + "X" for _ in range(operations)]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return {"CoinCollector.parseChange": timeIt(lambda: [CoinCollector.parseChange(c) for c in coins], operations, repeat)}
+
+def compare(results, baseline, threshold):
+    """
+    Print each benchmark next to its baseline and flag regressions.
+
+    :return: True if any benchmark regressed by more than threshold percent.
+    """
+    previous = {(entry["name"], entry["size"]): entry["nsPerOp"] for entry in baseline["results"]}
+    regressed = False
+    print(f"{'benchmark':<48}{'size':>10}{'baseline ns':>13}{'current ns':>12}{'change':>9}")
+    for entry in results:
+        before = previous.get((entry["name"], entry["size"]))
+        if before is None:
+            print(f"{entry['name']:<48}{entry['size']:>10}{'-':>13}{entry['nsPerOp']:>12.1f}{'new':>9}")
+            continue
+        change = (entry["nsPerOp"] - before) / before * 100
+        flag = "  REGRESSION" if change > threshold else ""
+        regressed = regressed or bool(flag)
+        print(f"{entry['name']:<48}{entry['size']:>10}{before:>13.1f}{entry['nsPerOp']:>12.1f}{change:>+8.1f}%{flag}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,10000,1000000",
+                        help="Comma-separated book sizes, e.g. 100,1000,10000,100000,1000000,10000000.")
+    parser.add_argument("--operations", type=int, default=10000, help="Operations per benchmark.")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per benchmark; the fastest is kept.")
+    parser.add_argument("--output", help="File to write the JSON results to. Defaults to stdout without --compare.")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against.")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent.")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    results = []
+    for size in (int(size) for size in args.sizes.split(",")):
+        for name, nsPerOp in benchmarkSize(size, args.operations, args.repeat, rng).items():
+            results.append({"name": name, "size": size, "nsPerOp": nsPerOp})
+    for name, nsPerOp in benchmarkCoins(args.operations, args.repeat, rng).items():
+        results.append({"name": name, "size": 0, "nsPerOp": nsPerOp})
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as baseline:
+            sys.exit(1 if compare(results, json.load(baseline), args.threshold) else 0)
+
+if __name__ == "__main__":
+    main()
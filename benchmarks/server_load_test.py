@@ -0,0 +1,85 @@
+"""
+Load-test BankServer with many concurrent sessions.
+
+Usage:
+    python benchmarks/server_load_test.py [--sessions 1000] [--requests 50] [--host HOST --port PORT]
+
+Without --port an in-process server on a free port is started. Each session opens an account, then sends a
+mix of deposits, withdrawals, transfers, ATM withdrawals and info requests one at a time. The test reports
+requests per second, latency percentiles and error responses.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank_management_system import Bank
+from bank_server import BankClient, BankServer
+
+async def session(host, port, requestCount, accountNumbers, latencies, errors, rng):
+    """
+    Run one client session.
+    """
+    client = await BankClient.connect(host, port)
+    try:
+        opened = await client.request("open", firstName="Load", lastName="Test", ssn="999123456")
+        credentials = {"account": opened["account"], "pin": opened["pin"]}
+        accountNumbers.append(opened["account"])
+        await client.request("deposit", amount=1000000, **credentials)
+        for _ in range(requestCount):
+            choice = rng.random()
+            if choice < 0.3:
+                op, fields = "deposit", {"amount": rng.randint(1, 10000)}
+            elif choice < 0.5:
+                op, fields = "withdraw", {"amount": rng.randint(1, 10000)}
+            elif choice < 0.7:
+                op, fields = "transfer", {"to": rng.choice(accountNumbers), "amount": rng.randint(1, 10000)}
+            elif choice < 0.85:
+                op, fields = "atmWithdraw", {"dollars": 5 * rng.randint(1, 20)}
+            else:
+                op, fields = "info", {}
+            start = time.perf_counter()
+            response = await client.request(op, **credentials, **fields)
+            latencies.append(time.perf_counter() - start)
+            if not response["ok"]:
+                reason = response["error"].split(" in account")[0]
+                errors[reason] = errors.get(reason, 0) + 1
+    finally:
+        await client.close()
+
+async def main(args):
+    server = None
+    host, port = args.host, args.port
+    if port is None:
+        server = BankServer(Bank(), host, 0)
+        await server.start()
+        port = server.port
+    latencies = []
+    errors = {}
+    accountNumbers = []
+    rng = random.Random(1)
+    start = time.perf_counter()
+    await asyncio.gather(*(session(host, port, args.requests, accountNumbers, latencies, errors, random.Random(rng.random()))
+                           for _ in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    if server:
+        await server.close()
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    print(f"sessions: {args.sessions}, requests: {len(latencies):,}, elapsed: {elapsed:.2f} s")
+    print(f"requests/s: {len(latencies) / elapsed:,.0f}")
+    print(f"latency ms: p50 {percentile(0.5):.2f}  p99 {percentile(0.99):.2f}  max {latencies[-1] * 1000:.2f}")
+    print(f"error responses: {errors or 'none'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000, help="Number of concurrent sessions.")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per session.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Port of a running server. If omitted, one is started in-process.")
+    asyncio.run(main(parser.parse_args()))
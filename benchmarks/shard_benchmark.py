@@ -0,0 +1,64 @@
+"""
+Measure the throughput of ShardedBank against the number of shard processes.
+
+Usage:
+    python benchmarks/shard_benchmark.py [--shards 1,2,4,8] [--accounts 100000] [--operations 1000000] [--batch 50000]
+
+The workload is a mix of deposits, withdrawals and transfers between random accounts, so most transfers cross
+shards and go through two-phase commit. Each run checks that no money was created or lost.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank_shards import ShardedBank
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", default="1,2,4,8", help="Comma-separated shard counts.")
+    parser.add_argument("--accounts", type=int, default=100000, help="Number of accounts.")
+    parser.add_argument("--operations", type=int, default=1000000, help="Number of operations per run.")
+    parser.add_argument("--batch", type=int, default=50000, help="Operations per applyMany call.")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    numbers = list(range(10000000, 10000000 + args.accounts))
+    workload = []
+    for _ in range(args.operations):
+        choice = rng.random()
+        if choice < 0.25:
+            workload.append(("deposit", rng.choice(numbers), rng.randint(1, 10000)))
+        elif choice < 0.5:
+            workload.append(("withdraw", rng.choice(numbers), rng.randint(1, 10000)))
+        else:
+            workload.append(("transfer", rng.choice(numbers), rng.choice(numbers), rng.randint(1, 10000)))
+
+    print(f"{'shards':>7}{'ops/s':>12}{'balanced':>10}")
+    for shardCount in (int(count) for count in args.shards.split(",")):
+        bank = ShardedBank(shards=shardCount)
+        bank.applyMany([("open", number, "John", "Doe", "999123456", "1234") for number in numbers])
+        bank.applyMany([("deposit", number, 1000000) for number in numbers])
+        _, before, _ = bank.summary()
+        results = []
+        start = time.perf_counter()
+        for offset in range(0, len(workload), args.batch):
+            results.extend(bank.applyMany(workload[offset:offset + args.batch]))
+        elapsed = time.perf_counter() - start
+        _, after, holds = bank.summary()
+        bank.close()
+        # Transfers must not change the total; only successful deposits and withdrawals may.
+        expected = before
+        for operation, result in zip(workload, results):
+            if result["ok"] and operation[0] == "deposit":
+                expected += operation[2]
+            elif result["ok"] and operation[0] == "withdraw":
+                expected -= operation[2]
+        print(f"{shardCount:>7}{len(workload) / elapsed:>12,.0f}{str(after == expected and holds == 0):>10}")
+
+if __name__ == "__main__":
+    main()